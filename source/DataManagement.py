@@ -45,17 +45,19 @@ class FileDataManager(DataManager):
 
 class DBDataManager(DataManager):
     def create_user(self, user_data: dict):
+        from src.persistence import repo
         new_user = User(**user_data)
-        db.session.add(new_user)
-        db.session.commit()
+        # Through the repository, so its cache and identity map see the write
+        repo.save(new_user)
         return new_user
 
     def update_user(self, user_id: int, data: dict):
+        from src.persistence import repo
         user = User.query.get(user_id)
         if not user:
             return None
         for key, value in data.items():
             setattr(user, key, value)
-        db.session.commit()
+        repo.update(user)
         return user
 
@@ -1,5 +1,6 @@
 from flask import jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import get_jwt_identity, get_jwt
+from src.controllers.login import jwt_required
 
 @jwt_required()
 def admin_data():
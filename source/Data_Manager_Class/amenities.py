@@ -3,19 +3,24 @@ Amenity controller module
 """
 
 from flask import abort, request, jsonify
-from flask_jwt_extended import jwt_required
-from src.controllers.login import check_admin
+from src.controllers.login import check_admin, jwt_required
 from src.models.amenity import Amenity
+from src.controllers.conditional import (
+    conditional_collection, conditional_entity,
+)
+from src.controllers.listing import entity_response, list_response
 import logging
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
 @jwt_required()  # Ensure all routes are protected with JWT
+@conditional_collection(Amenity)
 def get_amenities():
-    """Returns all amenities."""
-    amenities = Amenity.get_all()
-    return jsonify([amenity.to_dict() for amenity in amenities]), 200
+    """
+    Returns all amenities, paged by ?limit= and ?cursor= or sliced by ?offset=
+    """
+    return list_response(Amenity, ())
 
 @jwt_required()
 def create_amenity():
@@ -36,13 +41,14 @@ def create_amenity():
         abort(400, str(e))
 
 @jwt_required()
+@conditional_entity(Amenity, 'amenity_id')
 def get_amenity_by_id(amenity_id: str):
     """Returns a specific amenity by ID."""
     amenity = Amenity.get(amenity_id)
     if not amenity:
         logger.info(f"Amenity with ID {amenity_id} not found")
         abort(404, f"Amenity with ID {amenity_id} not found")
-    return jsonify(amenity.to_dict()), 200
+    return entity_response(amenity)
 
 @jwt_required()
 def update_amenity(amenity_id: str):
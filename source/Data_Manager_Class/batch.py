@@ -0,0 +1,241 @@
+"""
+Batch controller module
+
+POST /batch runs an ordered list of API operations in one request:
+
+    {"atomic": false, "operations": [
+        {"method": "POST", "path": "/places", "body": {...}},
+        {"method": "POST", "path": "/reviews",
+         "body": {"place_id": "$0.id", ...}},
+        {"method": "GET", "path": "/places/$0.id/rating"}
+    ]}
+
+Each operation is dispatched to the existing views, with the Authorization
+header of the batch, inside one repository transaction: one commit on the
+database, one flush on the file and pickle repositories. The token is
+verified once for the batch, the views reuse it. A string
+"$<n>.<key>" in a path or body is replaced by the key of the JSON body
+returned by operation n, so later operations can use the ids created by
+earlier ones.
+
+Every operation runs under a savepoint, and the result of a failed one
+reports with "rolled_back" whether its writes were undone. On the database
+they are, alone, and without "atomic" the other operations are committed.
+The memory, file and pickle repositories have no savepoints: they keep the
+writes a failed operation made before failing, and report "rolled_back":
+false. With "atomic", the first failure stops the batch and, on the
+database, rolls every operation back; the other repositories keep the
+operations that ran before it, which the response reports with
+"rolled_back": false.
+"""
+
+import logging
+import re
+from urllib.parse import urlsplit
+from flask import abort, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+from werkzeug.test import EnvironBuilder
+from src.controllers.login import jwt_required, jwt_verified
+from src.persistence.repository import RolledBack
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("GET", "POST", "PUT", "DELETE")
+# A whole string naming a key of the body returned by an earlier operation
+REFERENCE = re.compile(r"^\$(\d+)\.(\w+)$")
+# Request headers passed on to the operations
+FORWARDED_HEADERS = ("Authorization", "Accept-Language")
+
+
+class OperationFailed(Exception):
+    """Raised to undo the writes of an operation whose response is an error."""
+
+    def __init__(self, result: dict) -> None:
+        """Keep the result reported for the operation."""
+        super().__init__(result["status"])
+        self.result = result
+
+
+def batch_operations() -> "tuple[list, bool]":
+    """
+    Returns the validated operations of the batch and its atomic flag, aborting
+    with 400 if malformed
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(
+        data.get("operations"), list
+    ):
+        abort(400, "operations must be a list")
+    operations = data["operations"]
+    if not operations:
+        abort(400, "operations must not be empty")
+    limit = current_app.config.get("BATCH_MAX_OPERATIONS", 100)
+    if len(operations) > limit:
+        abort(400, f"A batch holds at most {limit} operations")
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            abort(400, f"Operation {index} must be an object")
+        if operation.get("method", "").upper() not in METHODS:
+            abort(400, f"Operation {index}: method must be one of "
+                       f"{', '.join(METHODS)}")
+        path = operation.get("path")
+        if not isinstance(path, str) or not path.startswith("/"):
+            abort(400, f"Operation {index}: path must be an absolute path")
+        if is_batch(operation["method"].upper(), path):
+            abort(400, f"Operation {index}: batches cannot be nested")
+    return operations, bool(data.get("atomic", False))
+
+
+def is_batch(method: str, path: str) -> bool:
+    """
+    Checks whether an operation routes to the batch endpoint, matched against
+    the URL map so extra slashes or a query string do not hide it
+    """
+    adapter = current_app.url_map.bind_to_environ(request.environ)
+    path = path.partition("?")[0]
+    # Followed redirects are bounded: a merged or appended slash needs one
+    for _ in range(3):
+        try:
+            endpoint, _ = adapter.match(path, method=method)
+        except RequestRedirect as e:
+            path = urlsplit(e.new_url).path[len(request.script_root):]
+            continue
+        except HTTPException:
+            return False
+        return endpoint == request.endpoint
+    return False
+
+
+def resolve(value, results: list):
+    """
+    Replaces the "$<n>.<key>" references held by a value with the results of
+    earlier operations
+    """
+    if isinstance(value, dict):
+        return {key: resolve(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, results) for item in value]
+    if isinstance(value, str):
+        match = REFERENCE.match(value)
+        if match:
+            index, key = int(match.group(1)), match.group(2)
+            body = results[index]["body"] if index < len(results) else None
+            if not isinstance(body, dict) or key not in body:
+                raise ValueError(f"Unresolved reference {value}")
+            return body[key]
+    return value
+
+
+def resolve_path(path: str, results: list) -> str:
+    """
+    Replaces the "$<n>.<key>" segments of a path, as in /places/$0.id/reviews
+    """
+    path, separator, query_string = path.partition("?")
+    segments = [str(resolve(segment, results)) for segment in path.split("/")]
+    return "/".join(segments) + separator + query_string
+
+
+def dispatch(method: str, path: str, body) -> dict:
+    """
+    Runs one operation through the app's views and returns its status and JSON
+    body
+    """
+    headers = {
+        name: request.headers[name]
+        for name in FORWARDED_HEADERS if name in request.headers
+    }
+    path, _, query_string = path.partition("?")
+    builder = EnvironBuilder(path=path, method=method,
+                             query_string=query_string, json=body,
+                             headers=headers, base_url=request.host_url)
+    try:
+        # The app context, and with it the session and the identity map, is
+        # shared with the batch
+        with current_app.request_context(builder.get_environ()):
+            response = current_app.full_dispatch_request()
+            return {"status": response.status_code,
+                    "body": response.get_json(silent=True)}
+    finally:
+        builder.close()
+
+
+def run_operation(operation: dict, results: list) -> dict:
+    """
+    Runs one operation under a savepoint, raising OperationFailed once its
+    writes are undone
+    """
+    from src.persistence import repo
+    try:
+        path = resolve_path(operation["path"], results)
+        body = resolve(operation.get("body"), results)
+    except ValueError as e:
+        raise OperationFailed({"status": 400, "body": {
+            "error": "Bad request", "message": str(e),
+        }})
+    if is_batch(operation["method"].upper(), path):
+        # A reference resolved into a path reaching the batch endpoint
+        raise OperationFailed({"status": 400, "body": {
+            "error": "Bad request", "message": "Batches cannot be nested",
+        }})
+    try:
+        with repo.savepoint():
+            result = dispatch(operation["method"].upper(), path, body)
+            if result["status"] >= 400:
+                raise OperationFailed(result)
+    except RolledBack as e:
+        raise OperationFailed({"status": 409, "body": {
+            "error": "Conflict", "message": str(e),
+        }})
+    except OperationFailed:
+        raise
+    except Exception as e:
+        logger.error(f"Batch operation {operation['method']} {path} "
+                     f"failed: {e}", exc_info=True)
+        raise OperationFailed({"status": 500, "body": {
+            "error": "Internal server error", "message": str(e),
+        }})
+    return result
+
+
+def skipped(index: int) -> dict:
+    """
+    Returns the result of an operation not run because operation index failed
+    """
+    return {"status": 424, "body": {
+        "error": "Failed dependency", "message": f"Operation {index} failed",
+    }}
+
+
+@jwt_required()
+def run_batch():
+    """
+    Runs the operations of the request in order, in one transaction, and
+    returns their results with whether a failure rolled the batch back
+    """
+    from src.persistence import repo
+    operations, atomic = batch_operations()
+    results = []
+    failed_at = None
+    try:
+        with jwt_verified(), repo.transaction():
+            for index, operation in enumerate(operations):
+                try:
+                    results.append(run_operation(operation, results))
+                except OperationFailed as e:
+                    # Only a transactional repository undoes the writes of
+                    # the savepoint
+                    e.result["rolled_back"] = repo.transactional
+                    results.append(e.result)
+                    if atomic:
+                        failed_at = index
+                        raise
+    except OperationFailed:
+        results.extend(skipped(failed_at) for _ in operations[len(results):])
+    rolled_back = failed_at is not None and repo.transactional
+    succeeded = sum(1 for result in results if result['status'] < 400)
+    logger.info(f"Batch of {len(operations)} operations run, "
+                f"{succeeded} succeeded")
+    return jsonify({
+        "atomic": atomic, "rolled_back": rolled_back, "results": results,
+    }), 200
@@ -5,12 +5,17 @@ Cities controller module
 
 from flask import request, abort
 from your_app.models import City
+from src.controllers.conditional import conditional_collection
+from src.controllers.listing import list_response
 
 
+@conditional_collection(City)
 def get_cities():
-    """Returns all cities"""
-    cities: list[City] = City.get_all()
-    return [city.to_dict() for city in cities]
+    """
+    Returns the cities matching ?country_code=, paged by ?limit= and ?cursor=
+    or sliced by ?offset=
+    """
+    return list_response(City, ('country_code',))
 
 
 def create_city():
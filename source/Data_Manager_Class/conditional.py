@@ -0,0 +1,120 @@
+"""
+Conditional GET support for the entity and collection controllers
+
+Entities carry a weak ETag derived from (id, updated_at), the path and the
+requested fields, and a Last-Modified header; collections carry a weak ETag
+derived from the per-model version of the repository, the path and the query
+string. A matching If-None-Match (or, for entities, If-Modified-Since) is
+answered with 304 before the view runs, so nothing is serialized and, on
+backends that support it, no row is loaded.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import make_response, request
+
+
+def weak_etag(*parts) -> str:
+    """Returns the opaque value of a weak ETag derived from the given parts"""
+    joined = "|".join(str(part) for part in parts)
+    return hashlib.sha1(joined.encode()).hexdigest()[:20]
+
+
+def http_datetime(value):
+    """
+    Returns a timestamp as an aware UTC datetime truncated to seconds, or None
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def is_fresh(etag: str, last_modified=None) -> bool:
+    """
+    Checks the request validators; If-None-Match takes precedence over
+    If-Modified-Since
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag: str, last_modified=None):
+    """Sets the ETag and Last-Modified headers of a response"""
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def not_modified(etag: str, last_modified=None):
+    """Returns an empty 304 response carrying the validators"""
+    return with_validators(make_response("", 304), etag, last_modified)
+
+
+def conditional_entity(model, id_argument: str):
+    """
+    Decorates a view returning one entity: the entity's updated_at is fetched
+    on its own and a fresh client copy is answered with 304 without calling the
+    view
+    """
+    def decorator(view):
+        """Wraps a view with the entity validation"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            """Answers 304 for a fresh copy, otherwise calls the view"""
+            obj_id = kwargs[id_argument] if id_argument in kwargs else args[0]
+            updated_at = model.get_updated_at(obj_id)
+            if updated_at is None:
+                # Unknown id, or no timestamp to validate against
+                return view(*args, **kwargs)
+            # ?fields= projects the body, so each projection is its own
+            # representation
+            etag = weak_etag(model.__name__, obj_id, updated_at, request.path,
+                             request.args.get("fields", ""))
+            last_modified = http_datetime(updated_at)
+            if is_fresh(etag, last_modified):
+                return not_modified(etag, last_modified)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                with_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_collection(model, *dependencies):
+    """
+    Decorates a view listing a model: the ETag changes whenever the collection
+    version of the model or of a model it filters on, the path or the query
+    string changes
+    """
+    def decorator(view):
+        """Wraps a view with the collection validation"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            """Answers 304 for a fresh copy, otherwise calls the view"""
+            versions = [
+                other.collection_version()
+                for other in (model, *dependencies)
+            ]
+            etag = weak_etag(model.__name__, *versions, request.path,
+                             request.query_string.decode())
+            if is_fresh(etag):
+                return not_modified(etag)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                with_validators(response, etag)
+            return response
+        return wrapper
+    return decorator
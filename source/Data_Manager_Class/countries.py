@@ -53,8 +53,9 @@ class DBCountryDataManager(CountryDataManager):
         return Country.query.get(code)
 
     def create_country(self, name: str, code: str) -> Country:
+        from src.persistence import repo
         new_country = Country(name=name, code=code)
-        db.session.add(new_country)
-        db.session.commit()
+        # Through the repository, so its cache and identity map see the write
+        repo.save(new_country)
         return new_country
 
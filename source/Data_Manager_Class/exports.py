@@ -0,0 +1,42 @@
+"""
+Export controller module
+"""
+
+import logging
+from flask import (
+    Response, abort, current_app, jsonify, request, stream_with_context,
+)
+from src.controllers.login import check_admin, jwt_required
+from src.exporter import EXPORT_MODELS, export_lines
+from src.routes.streaming import NDJSON_MIMETYPE
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+
+@jwt_required()
+def export_data():
+    """
+    Streams the NDJSON export of ?models=user,place (all by default) from one
+    consistent snapshot, compressed when the client accepts it. Only accessible
+    by admins.
+    """
+    if not check_admin():
+        logger.warning("Unauthorized attempt to export data")
+        return jsonify({"msg": "Administration rights required"}), 403
+    model_names = [
+        name for name in request.args.get("models", "").split(",") if name
+    ] or None
+    unknown = [name for name in model_names or () if name not in EXPORT_MODELS]
+    if unknown:
+        abort(400, f"Unknown models: {', '.join(unknown)}")
+
+    from src.persistence import repo
+
+    chunk_size = current_app.config.get("STREAM_CHUNK_SIZE", 500)
+    # The snapshot, and on the database its transaction, lasts as long as the
+    # stream
+    lines = export_lines(repo, model_names, chunk_size)
+    return Response(stream_with_context(lines), mimetype=NDJSON_MIMETYPE,
+                    headers={"Content-Disposition":
+                             "attachment; filename=export.ndjson"})
@@ -0,0 +1,60 @@
+"""
+Import controller module
+"""
+
+import io
+import logging
+from flask import abort, current_app, jsonify, request
+from src.controllers.listing import int_argument
+from src.controllers.login import check_admin, jwt_required
+from src.importer import IMPORT_SPECS, Importer
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Rejected records returned in the response, the others are only counted
+MAX_REPORTED_REJECTS = 100
+
+
+@jwt_required()
+def import_records(model_name: str):
+    """
+    Imports the users, places or reviews of the request body, NDJSON or CSV
+    (Content-Type: text/csv), in chunks of ?chunk_size=. Only accessible by
+    admins.
+    """
+    if not check_admin():
+        logger.warning("Unauthorized attempt to import records")
+        return jsonify({"msg": "Administration rights required"}), 403
+    if model_name not in IMPORT_SPECS:
+        abort(404, f"Cannot import {model_name}, expected one of "
+                   f"{', '.join(IMPORT_SPECS)}")
+
+    from src.persistence import repo
+
+    rejects = []
+
+    def reject(rejected):
+        """Keep the first rejected records for the response."""
+        if len(rejects) < MAX_REPORTED_REJECTS:
+            rejects.append(rejected)
+
+    def progress(report):
+        """Log the counters of the import."""
+        logger.debug(f"Import progress: {report.to_dict()}")
+
+    config = current_app.config
+    importer = Importer(
+        model_name, repo,
+        chunk_size=(int_argument("chunk_size")
+                    or config.get("IMPORT_CHUNK_SIZE", 1000)),
+        workers=config.get("IMPORT_WORKERS", 0),
+        rounds=config.get("BCRYPT_LOG_ROUNDS", 12),
+        reject=reject,
+        progress=progress,
+    )
+    fmt = "csv" if request.mimetype == "text/csv" else "ndjson"
+    # The body is read as it arrives, never as a whole
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    report = importer.run(stream, fmt)
+    return jsonify({**report.to_dict(), "rejects": rejects}), 200
@@ -0,0 +1,157 @@
+"""
+Helpers shared by the collection controllers
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from flask import abort, jsonify, request
+from src.serializers import dump, serializers
+
+# Page size used when ?cursor= is given without ?limit=, and the largest page
+# served
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def int_argument(name: str) -> "int | None":
+    """Returns a non-negative integer query argument, or None if absent"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        abort(400, f"{name} must be an integer")
+    if number < 0:
+        abort(400, f"{name} must not be negative")
+    return number
+
+
+def float_argument(name: str, minimum: float, maximum: float,
+                   default: "float | None" = None) -> float:
+    """
+    Returns a float query argument within bounds, aborting with 400 if it is
+    missing or invalid
+    """
+    value = request.args.get(name)
+    if value is None:
+        if default is None:
+            abort(400, f"{name} is required")
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        abort(400, f"{name} must be a number")
+    if not minimum <= number <= maximum:
+        abort(400, f"{name} must be between {minimum} and {maximum}")
+    return number
+
+
+def fields_argument(model) -> "list | None":
+    """
+    Returns the fields listed in ?fields=id,name, in order and without
+    duplicates, or None if absent, aborting with 400 on a field the model does
+    not serialize
+    """
+    value = request.args.get("fields")
+    if value is None:
+        return None
+    fields = list(dict.fromkeys(field for field in value.split(",") if field))
+    known = serializers.serializer(model).fields
+    unknown = [field for field in fields if field not in known]
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}")
+    if not fields:
+        abort(400, "fields must list at least one field")
+    return fields
+
+
+def entity_response(obj):
+    """
+    Returns an object as JSON, restricted to the fields listed in ?fields= if
+    any
+    """
+    fields = fields_argument(type(obj))
+    if fields is None:
+        return jsonify(obj.to_dict()), 200
+    return jsonify(dump(obj, fields=fields)), 200
+
+
+def list_arguments(filters: tuple) -> dict:
+    """
+    Builds repository query arguments from the request:
+    equality filters on the given fields, ?limit= and ?offset=
+    """
+    return {
+        "where": {
+            field: request.args[field]
+            for field in filters if field in request.args
+        },
+        "limit": int_argument("limit"),
+        "offset": int_argument("offset"),
+    }
+
+
+def encode_cursor(obj) -> str:
+    """
+    Returns the opaque cursor pointing after an object: its (created_at, id),
+    base64url-encoded
+    """
+    created_at = obj.created_at
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, obj.id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Returns the (created_at, id) key held by a cursor, aborting with 400 if it
+    is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, obj_id = json.loads(raw)
+        if created_at is not None:
+            created_at = datetime.fromisoformat(created_at)
+    except (binascii.Error, ValueError, TypeError):
+        abort(400, "Invalid cursor")
+    return created_at, obj_id
+
+
+def list_response(model, filters: tuple, where: "dict | None" = None):
+    """
+    Lists a collection filtered on the given fields and the extra conditions in
+    where. With ?limit= or ?cursor= (and no ?offset=) the result is one keyset
+    page ordered by (created_at, id): {"results": [...], "next_cursor": str |
+    null}. Otherwise the whole matching collection is returned as a list, as
+    before. With ?fields= only the listed fields are returned, and only the
+    columns they need are loaded.
+    """
+    fields = fields_argument(model)
+    columns = serializers.columns(model, fields) if fields else None
+    arguments = list_arguments(filters)
+    arguments["where"].update(where or {})
+    cursor = request.args.get("cursor")
+    if cursor is not None and arguments["offset"] is not None:
+        abort(400, "cursor and offset cannot be combined")
+    if arguments["offset"] is not None or (
+        cursor is None and arguments["limit"] is None
+    ):
+        objs = model.select(**arguments, fields=columns)
+        return jsonify(dump(objs, many=True, fields=fields)), 200
+
+    limit = min(arguments["limit"] or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    after = decode_cursor(cursor) if cursor else None
+    # One extra object tells whether another page follows
+    objs = model.page(
+        limit + 1, after=after, where=arguments["where"], fields=columns
+    )
+    results = objs[:limit]
+    next_cursor = encode_cursor(results[-1]) if len(objs) > limit else None
+    return jsonify({
+        "results": dump(results, many=True, fields=fields),
+        "next_cursor": next_cursor,
+    }), 200
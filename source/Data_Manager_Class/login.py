@@ -1,9 +1,11 @@
-from flask import request, jsonify, abort
+from flask import request, jsonify, abort, current_app, g
 from src.models.user import User
-from src import bcrypt
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt
+from flask_jwt_extended import create_access_token, get_jwt
+from flask_jwt_extended import jwt_required as verify_jwt_required
 import logging
+from contextlib import contextmanager
 from datetime import timedelta
+from functools import wraps
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -22,7 +24,7 @@ def login():
         logger.warning(f"Failed login attempt for nonexistent user: {email}")
         abort(401, 'User not found.')
 
-    if not bcrypt.check_password_hash(user.password_hash, password):
+    if not user.check_password(password):
         logger.warning(f"Failed login attempt for {email}: Incorrect password")
         abort(401, 'Wrong username or password.')
 
@@ -34,6 +36,44 @@ def login():
     )
     return jsonify(access_token=access_token), 200
 
+
+# Set on g while the operations of a batch run, once its token is verified
+JWT_VERIFIED = "batch_jwt_verified"
+
+
+def jwt_required(**options):
+    """
+    Flask-JWT-Extended's jwt_required, except that the views run by a batch
+    reuse the token the batch verified instead of decoding it again. Views
+    asking for options, such as a fresh or optional token, still verify it.
+    """
+    def decorator(view):
+        """Wraps a view so it verifies the token unless a batch did"""
+        verified_view = verify_jwt_required(**options)(view)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            """Calls the view, verifying the token first outside a batch"""
+            if not options and g.get(JWT_VERIFIED):
+                return current_app.ensure_sync(view)(*args, **kwargs)
+            return verified_view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def jwt_verified():
+    """
+    Lets the views dispatched in the block reuse the token verified for the
+    current request, which they share through the app context's g
+    """
+    g.setdefault(JWT_VERIFIED, True)
+    try:
+        yield
+    finally:
+        g.pop(JWT_VERIFIED, None)
+
+
 @jwt_required()
 def protected():
     current_user = get_jwt_identity()
@@ -3,9 +3,17 @@ Places controller module
 """
 
 from flask import request, jsonify, abort, Blueprint
+from src.models.amenity import Amenity, PlaceAmenity
 from src.models.place import Place
-from flask_jwt_extended import jwt_required
-from src.controllers.login import check_admin
+from src.controllers.login import check_admin, jwt_required
+from src.controllers.conditional import (
+    conditional_collection, conditional_entity,
+)
+from src.controllers.listing import (
+    MAX_PAGE_SIZE, entity_response, fields_argument, float_argument,
+    int_argument, list_response,
+)
+from src.serializers import dump, serializers
 import logging
 from marshmallow import Schema, fields, validate, ValidationError
 
@@ -15,6 +23,24 @@ logger = logging.getLogger(__name__)
 # Blueprint for places
 bp = Blueprint('places', __name__)
 
+# Largest radius accepted by /places/nearby
+MAX_NEARBY_RADIUS_KM = 500
+
+# /places/search arguments and the query conditions and sort fields they map to
+SEARCH_FILTERS = {
+    'min_price': 'price_per_night__gte',
+    'max_price': 'price_per_night__lte',
+    'min_guests': 'max_guests__gte',
+    'rooms': 'number_of_rooms__gte',
+    'min_bathrooms': 'number_of_bathrooms__gte',
+}
+SEARCH_SORTS = {
+    'price': 'price_per_night',
+    'guests': 'max_guests',
+    'rooms': 'number_of_rooms',
+    'bathrooms': 'number_of_bathrooms',
+}
+
 class PlaceSchema(Schema):
     name = fields.String(required=True, validate=validate.Length(min=1))
     description = fields.String(required=True)
@@ -31,11 +57,40 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+
+def amenity_conditions() -> dict:
+    """
+    Returns the query condition keeping the places having every amenity
+    listed by id or name in ?amenities=, aborting with 400 on an unknown one
+    """
+    references = [
+        reference
+        for reference in request.args.get('amenities', '').split(',')
+        if reference
+    ]
+    if not references:
+        return {}
+    amenity_ids, unknown = Amenity.resolve(references)
+    if unknown:
+        abort(400, f"Unknown amenities: {', '.join(unknown)}")
+    return {'id__in': PlaceAmenity.places_with_all(amenity_ids)}
+
 @bp.route('/places', methods=['GET'])
+@conditional_collection(Place, PlaceAmenity, Amenity)
 def get_places():
-    """Returns all places"""
-    places = Place.get_all()
-    return jsonify([place.to_dict() for place in places]), 200
+    """
+    Returns the places listed in ?ids=a,b,c, or the places matching
+    ?city_id= and ?host_id= and having all of ?amenities=wifi,pool,
+    paged by ?limit= and ?cursor= or sliced by ?offset=
+    """
+    ids = request.args.get('ids')
+    if ids:
+        places = Place.get_many(
+            [place_id for place_id in ids.split(',') if place_id]
+        )
+        fields = fields_argument(Place)
+        return jsonify(dump(places, many=True, fields=fields)), 200
+    return list_response(Place, ('city_id', 'host_id'), amenity_conditions())
 
 @bp.route('/places', methods=['POST'])
 @admin_required
@@ -49,14 +104,78 @@ def create_place():
     except ValidationError as err:
         return jsonify(err.messages), 422
 
+
+@conditional_collection(Place)
+def search_places():
+    """
+    Returns the places matching ?city_id=, ?min_price=, ?max_price=,
+    ?min_guests=, ?rooms= (minimum rooms) and ?min_bathrooms=, ordered by
+    ?sort= (price, guests, rooms or bathrooms, prefixed with '-' for
+    descending), sliced by ?limit= and ?offset=, restricted to the fields
+    listed in ?fields=
+    """
+    fields = fields_argument(Place)
+    where = {}
+    if 'city_id' in request.args:
+        where['city_id'] = request.args['city_id']
+    for argument, condition in SEARCH_FILTERS.items():
+        value = int_argument(argument)
+        if value is not None:
+            where[condition] = value
+    sort = request.args.get('sort')
+    order_by = None
+    if sort:
+        field = SEARCH_SORTS.get(sort.lstrip('-'))
+        if field is None:
+            abort(400, f"sort must be one of {', '.join(SEARCH_SORTS)}")
+        order_by = '-' + field if sort.startswith('-') else field
+    limit = int_argument('limit')
+    if limit is not None:
+        limit = min(limit, MAX_PAGE_SIZE)
+    places = Place.select(where=where, order_by=order_by, limit=limit,
+                          offset=int_argument('offset'),
+                          fields=(serializers.columns(Place, fields)
+                                  if fields else None))
+    return jsonify(dump(places, many=True, fields=fields)), 200
+
+
+def get_places_nearby():
+    """
+    Returns the places within ?radius_km= (default 5) of ?lat= and ?lon=,
+    nearest first, each with its distance_km, at most ?limit= (default 20),
+    restricted to the fields listed in ?fields=
+    """
+    fields = fields_argument(Place)
+    lat = float_argument('lat', -90, 90)
+    lon = float_argument('lon', -180, 180)
+    radius_km = float_argument('radius_km', 0, MAX_NEARBY_RADIUS_KM, default=5)
+    limit = min(int_argument('limit') or 20, MAX_PAGE_SIZE)
+    places = Place.nearby(lat, lon, radius_km, limit)
+    results = dump([place for place, _ in places], many=True, fields=fields)
+    for result, (_, distance) in zip(results, places):
+        result["distance_km"] = round(distance, 3)
+    return jsonify(results), 200
+
 @bp.route('/places/<place_id>', methods=['GET'])
+@conditional_entity(Place, 'place_id')
 def get_place_by_id(place_id):
     """Returns a place by ID"""
     place = Place.get(place_id)
     if not place:
         logger.info(f"Place with ID {place_id} not found")
         abort(404, f"Place with ID {place_id} not found")
-    return jsonify(place.to_dict()), 200
+    return entity_response(place)
+
+
+@conditional_entity(Place, 'place_id')
+def get_place_rating(place_id):
+    """
+    Returns the review count, average rating and rating histogram of a place
+    """
+    place = Place.get(place_id)
+    if not place:
+        abort(404, f"Place with ID {place_id} not found")
+    return jsonify(place.rating_summary()), 200
 
 @bp.route('/places/<place_id>', methods=['PUT'])
 @admin_required
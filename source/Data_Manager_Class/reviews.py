@@ -4,7 +4,12 @@ Reviews controller module
 
 from flask import Blueprint, request, jsonify, abort
 from src.models.review import Review
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.controllers.conditional import (
+    conditional_collection, conditional_entity,
+)
+from src.controllers.listing import entity_response, list_response
+from flask_jwt_extended import get_jwt_identity
+from src.controllers.login import jwt_required
 from marshmallow import Schema, fields, ValidationError
 import logging
 
@@ -35,10 +40,31 @@ def handle_403_error(e):
     return jsonify(error='Forbidden', message=str(e)), 403
 
 @bp.route('/reviews', methods=['GET'])
+@conditional_collection(Review)
 def get_reviews():
-    """Returns all reviews"""
-    reviews = Review.get_all()
-    return jsonify([review.to_dict() for review in reviews]), 200
+    """
+    Returns the reviews matching ?place_id= and ?user_id=, paged by ?limit= and
+    ?cursor= or sliced by ?offset=
+    """
+    return list_response(Review, ('place_id', 'user_id'))
+
+
+@conditional_collection(Review)
+def get_reviews_from_place(place_id):
+    """
+    Returns the reviews of a place, paged by ?limit= and ?cursor= or sliced by
+    ?offset=
+    """
+    return list_response(Review, (), {'place_id': place_id})
+
+
+@conditional_collection(Review)
+def get_reviews_from_user(user_id):
+    """
+    Returns the reviews written by a user, paged by ?limit= and ?cursor= or
+    sliced by ?offset=
+    """
+    return list_response(Review, (), {'user_id': user_id})
 
 @bp.route('/reviews', methods=['POST'])
 @jwt_required()
@@ -55,12 +81,13 @@ def create_review():
         abort(422, str(err.messages))
 
 @bp.route('/reviews/<int:review_id>', methods=['GET'])
+@conditional_entity(Review, 'review_id')
 def get_review_by_id(review_id):
     """Returns a review by ID"""
     review = Review.get(review_id)
     if not review:
         abort(404, f'Review with ID {review_id} not found')
-    return jsonify(review.to_dict()), 200
+    return entity_response(review)
 
 @bp.route('/reviews/<int:review_id>', methods=['PUT'])
 @jwt_required()
@@ -2,6 +2,8 @@
 import json
 from your_app import db
 from your_app.models import User
+from src.controllers.conditional import conditional_collection
+from src.controllers.listing import list_response
 
 class DataManager:
     def create_user(self, user_data: dict):
@@ -42,17 +44,27 @@ class FileDataManager(DataManager):
 
 class DBDataManager(DataManager):
     def create_user(self, user_data: dict):
+        from src.persistence import repo
         new_user = User(**user_data)
-        db.session.add(new_user)
-        db.session.commit()
+        # Through the repository, so its cache and identity map see the write
+        repo.save(new_user)
         return new_user
 
     def update_user(self, user_id: int, data: dict):
+        from src.persistence import repo
         user = User.query.get(user_id)
         if not user:
             return None
         for key, value in data.items():
             setattr(user, key, value)
-        db.session.commit()
+        repo.update(user)
         return user
 
+
+@conditional_collection(User)
+def get_users():
+    """
+    Returns the users matching ?email=, paged by ?limit= and ?cursor= or sliced
+    by ?offset=
+    """
+    return list_response(User, ('email',))
@@ -6,34 +6,60 @@ environment variable REPOSITORY_ENV_VAR.
 import os
 import logging
 from src.persistence.repository import Repository
-from utils.constants import REPOSITORY_ENV_VAR
+from utils.constants import (
+    REPOSITORY_ENV_VAR,
+    REPOSITORY_CACHE,
+    REPOSITORY_CACHE_SIZE,
+    REPOSITORY_CACHE_TTL,
+    REPOSITORY_CACHE_POLICIES,
+    REPOSITORY_IDENTITY_MAP,
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 def get_repository() -> Repository:
-    """Factory function to get the appropriate repository based on the environment setting."""
+    """
+    Factory function to get the appropriate repository based on the environment
+    setting, wrapped in a read-through cache when REPOSITORY_CACHE is 'on', and
+    in the request-scoped identity map when REPOSITORY_IDENTITY_MAP is 'on'.
+    """
     repo_type = os.getenv(REPOSITORY_ENV_VAR, 'memory')  # Default to 'memory' if unset
     logger.debug(f"Selected repository type: {repo_type}")
 
     try:
         if repo_type == "db":
             from src.persistence.db import DBRepository
-            return DBRepository()
+            repository = DBRepository()
         elif repo_type == "file":
             from src.persistence.file import FileRepository
-            return FileRepository()
+            repository = FileRepository()
         elif repo_type == "pickle":
             from src.persistence.pickled import PickleRepository
-            return PickleRepository()
+            repository = PickleRepository()
         else:
             from src.persistence.memory import MemoryRepository
-            return MemoryRepository()
+            repository = MemoryRepository()
     except ImportError as e:
         error_msg = f"Repository type '{repo_type}' is not implemented: {str(e)}"
         logger.error(error_msg)
         raise ImportError(error_msg)
 
+    if REPOSITORY_CACHE == "on":
+        from src.persistence.cached import (
+            CachedRepository, parse_cache_policies,
+        )
+        repository = CachedRepository(
+            repository,
+            max_size=REPOSITORY_CACHE_SIZE,
+            ttl=REPOSITORY_CACHE_TTL,
+            policies=parse_cache_policies(REPOSITORY_CACHE_POLICIES),
+        )
+    if REPOSITORY_IDENTITY_MAP == "on":
+        from src.persistence.identity import IdentityMapRepository
+        repository = IdentityMapRepository(repository)
+    return repository
+
 # Repository instance for use throughout the application
 repo = get_repository()
 logger.info(f"Using {repo.__class__.__name__} as repository")
@@ -0,0 +1,51 @@
+"""
+This module exports helpers to write repository files in a crash-safe way.
+"""
+
+import os
+import tempfile
+import logging
+from pathlib import Path
+from typing import Callable, IO
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write(path, write: Callable[[IO], None],
+                 binary: bool = False) -> None:
+    """
+    Write a file through a temporary sibling and an atomic rename.
+
+    The callback receives the open temporary file. Readers either see the
+    previous content or the complete new content, never a partial write.
+    """
+    path = Path(path)
+    directory = path.parent if str(path.parent) else Path('.')
+    fd, tmp_name = tempfile.mkstemp(
+        dir=directory, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, 'wb' if binary else 'w') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    fsync_directory(directory)
+
+
+def fsync_directory(directory) -> None:
+    """Flush a directory entry so a completed rename survives a crash."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        logger.debug(f"Directory fsync not supported for {directory}: {e}")
+    finally:
+        os.close(fd)
@@ -0,0 +1,411 @@
+"""
+This module exports a read-through cache that wraps any Repository.
+
+Lookups by id are served from a bounded LRU cache per model, with an
+optional time to live. Writes go to the wrapped repository first and then
+invalidate the ids they touched.
+
+Per-model policies use the REPOSITORY_CACHE_POLICIES syntax:
+    place=2048:600,amenity=256:0,user=off
+that is <model>=<max entries>:<ttl seconds> (ttl 0 never expires) or
+<model>=off. Models without a policy use the default size and ttl.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+from src.metrics import metrics
+from src.persistence.indexes import model_key, object_key
+from src.persistence.repository import Repository
+
+logger = logging.getLogger(__name__)
+
+# Returned by LRUCache.get when a key is absent or expired
+MISSING = object()
+
+
+def parse_cache_policies(
+    setting: str
+) -> Dict[str, Optional[Tuple[int, float]]]:
+    """
+    Parse per-model policies into {model: (max_size, ttl)}, None meaning not
+    cached.
+    """
+    policies = {}
+    for entry in filter(None, (part.strip() for part in setting.split(','))):
+        model, _, policy = entry.partition('=')
+        model, policy = model.strip().lower(), policy.strip()
+        if policy == 'off':
+            policies[model] = None
+            continue
+        size, _, ttl = policy.partition(':')
+        try:
+            policies[model] = (int(size), float(ttl or 0))
+        except ValueError:
+            raise ValueError(
+                f"Invalid cache policy '{entry}', expected "
+                "<model>=<size>:<ttl> or <model>=off"
+            )
+    return policies
+
+
+class LRUCache:
+    """
+    Bounded mapping evicting the least recently used entry, with an optional
+    time to live.
+    """
+
+    def __init__(self, max_size: int, ttl: float = 0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Initialize an empty cache. A ttl of 0 keeps entries until they are
+        evicted.
+        """
+        self.__max_size = max(1, max_size)
+        self.__ttl = ttl
+        self.__clock = clock
+        self.__entries: "OrderedDict[object, Tuple[float, object]]" = (
+            OrderedDict()
+        )
+        self.__lock = threading.Lock()
+        self.__generation = 0
+        self.__counters = {
+            "hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @property
+    def generation(self) -> int:
+        """
+        Number of invalidations so far, captured before a fetch to detect a
+        concurrent write.
+        """
+        return self.__generation
+
+    def get(self, key):
+        """Return the cached value of a key, or MISSING."""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__counters["misses"] += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at and expires_at <= self.__clock():
+                del self.__entries[key]
+                self.__counters["expirations"] += 1
+                self.__counters["misses"] += 1
+                return MISSING
+            self.__entries.move_to_end(key)
+            self.__counters["hits"] += 1
+            return value
+
+    def put(self, key, value, generation: Optional[int] = None) -> None:
+        """
+        Cache a value. When the generation read before fetching it is given and
+        an invalidation happened since, the value may be stale and is dropped.
+        """
+        with self.__lock:
+            if generation is not None and generation != self.__generation:
+                return
+            expires_at = self.__clock() + self.__ttl if self.__ttl else 0
+            self.__entries[key] = (expires_at, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+                self.__counters["evictions"] += 1
+
+    def invalidate(self, key) -> None:
+        """Drop a key so the next read goes to the repository."""
+        with self.__lock:
+            self.__generation += 1
+            if self.__entries.pop(key, None) is not None:
+                self.__counters["invalidations"] += 1
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+
+    def stats(self) -> dict:
+        """Return the size, limits and counters of the cache."""
+        with self.__lock:
+            return {"size": len(self.__entries), "max_size": self.__max_size,
+                    "ttl": self.__ttl, **self.__counters}
+
+
+class CachedRepository(Repository):
+    """
+    Repository decorator caching lookups by id in front of another repository.
+    Every other read is delegated unchanged; writes invalidate the cached ids.
+    """
+
+    def __init__(
+        self, repository: Repository, max_size: int = 1024, ttl: float = 0,
+        policies: Optional[Dict[str, Optional[Tuple[int, float]]]] = None,
+    ) -> None:
+        """
+        Wrap a repository with the default size and ttl, overridden by
+        per-model policies.
+        """
+        self.__repository = repository
+        self.__default = (max_size, ttl)
+        self.__policies = policies or {}
+        self.__caches: Dict[str, Optional[LRUCache]] = {}
+        self.__lock = threading.Lock()
+        metrics.register("repository_cache", self.stats)
+
+    @property
+    def repository(self) -> Repository:
+        """The wrapped repository."""
+        return self.__repository
+
+    def __getattr__(self, name):
+        """Expose the backend specific methods of the wrapped repository."""
+        if name.startswith('_CachedRepository__'):
+            raise AttributeError(name)
+        return getattr(self.__repository, name)
+
+    def cache(self, model) -> Optional[LRUCache]:
+        """
+        Return the cache of a model, created on first use, or None if the model
+        is not cached.
+        """
+        model = model_key(model)
+        if model not in self.__caches:
+            with self.__lock:
+                if model not in self.__caches:
+                    policy = self.__policies.get(model, self.__default)
+                    self.__caches[model] = (
+                        LRUCache(*policy) if policy is not None else None
+                    )
+        return self.__caches[model]
+
+    def invalidate(self, obj) -> None:
+        """Drop the cached copy of an object."""
+        cache = self.cache(obj)
+        if cache is not None:
+            cache.invalidate(object_key(obj))
+
+    def stats(self) -> dict:
+        """Return the counters of every model cache."""
+        return {
+            model: cache.stats()
+            for model, cache in list(self.__caches.items())
+            if cache is not None
+        }
+
+    def get(self, model_name, obj_id):
+        """Serve an object from the cache, loading and caching it on a miss."""
+        cache = self.cache(model_name)
+        if cache is None:
+            return self.__repository.get(model_name, obj_id)
+        cached = cache.get(obj_id)
+        if cached is not MISSING:
+            return self.__repository.attach(cached)
+        generation = cache.generation
+        obj = self.__repository.get(model_name, obj_id)
+        if obj is not None:
+            cache.put(obj_id, self.__repository.detach(obj), generation)
+        return obj
+
+    def get_many(self, model_name, ids: list) -> list:
+        """Serve cached objects and load only the missing ids in one batch."""
+        cache = self.cache(model_name)
+        if cache is None:
+            return self.__repository.get_many(model_name, ids)
+        found, missing = {}, []
+        for obj_id in ids:
+            cached = cache.get(obj_id)
+            if cached is MISSING:
+                missing.append(obj_id)
+            else:
+                found[obj_id] = self.__repository.attach(cached)
+        if missing:
+            generation = cache.generation
+            for obj in self.__repository.get_many(model_name, missing):
+                found[obj.id] = obj
+                cache.put(obj.id, self.__repository.detach(obj), generation)
+        return [found[obj_id] for obj_id in ids if obj_id in found]
+
+    def get_all(self, model_name):
+        """Delegate to the wrapped repository."""
+        return self.__repository.get_all(model_name)
+
+    def find_by(self, model_name, **criteria):
+        """Delegate to the wrapped repository."""
+        return self.__repository.find_by(model_name, **criteria)
+
+    def query(self, model_name, where=None, order_by=None, limit=None,
+              offset=None, fields=None):
+        """Delegate to the wrapped repository."""
+        return self.__repository.query(
+            model_name, where=where, order_by=order_by, limit=limit,
+            offset=offset, fields=fields,
+        )
+
+    def page(self, model_name, limit, after=None, where=None, fields=None):
+        """Delegate to the wrapped repository."""
+        return self.__repository.page(
+            model_name, limit, after=after, where=where, fields=fields
+        )
+
+    def iter_all(self, model_name, chunk_size=500, where=None, fields=None):
+        """Delegate to the wrapped repository."""
+        return self.__repository.iter_all(
+            model_name, chunk_size=chunk_size, where=where, fields=fields
+        )
+
+    def distinct_values(self, model_name, field):
+        """Delegate to the wrapped repository."""
+        return self.__repository.distinct_values(model_name, field)
+
+    def get_seed_fingerprint(self, data_set):
+        """Delegate to the wrapped repository."""
+        return self.__repository.get_seed_fingerprint(data_set)
+
+    def set_seed_fingerprint(self, data_set, fingerprint):
+        """Delegate to the wrapped repository."""
+        self.__repository.set_seed_fingerprint(data_set, fingerprint)
+
+    def get_updated_at(self, model_name, obj_id):
+        """
+        Answer from the cached copy when there is one, which writes keep
+        current.
+        """
+        cache = self.cache(model_name)
+        cached = cache.get(obj_id) if cache is not None else MISSING
+        if cached is not MISSING:
+            return getattr(cached, "updated_at", None)
+        return self.__repository.get_updated_at(model_name, obj_id)
+
+    def collection_version(self, model_name):
+        """Delegate to the wrapped repository."""
+        return self.__repository.collection_version(model_name)
+
+    def nearby(self, model_name, lat, lon, radius_km, limit):
+        """Delegate to the wrapped repository."""
+        return self.__repository.nearby(model_name, lat, lon, radius_km, limit)
+
+    def owners_with_all(self, model_name, owner_field, member_field, members):
+        """Delegate to the wrapped repository."""
+        return self.__repository.owners_with_all(
+            model_name, owner_field, member_field, members
+        )
+
+    def increment(self, model_name, obj_id, deltas):
+        """Increment through the wrapped repository, then invalidate the id."""
+        self.__repository.increment(model_name, obj_id, deltas)
+        cache = self.cache(model_name)
+        if cache is not None:
+            cache.invalidate(obj_id)
+
+    def reload(self):
+        """Reload the wrapped repository and drop every cached object."""
+        self.__repository.reload()
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop every cached object."""
+        for cache in list(self.__caches.values()):
+            if cache is not None:
+                cache.clear()
+
+    @property
+    def transactional(self) -> bool:
+        """
+        Whether a transaction of the wrapped repository can undo its writes.
+        """
+        return self.__repository.transactional
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a transaction of the wrapped repository. Objects read in it may
+        have been cached with writes it undoes, so a failure drops every cached
+        object.
+        """
+        try:
+            with self.__repository.transaction():
+                yield
+        except BaseException:
+            self.clear()
+            raise
+
+    def read_snapshot(self, model_names):
+        """
+        Delegate to the wrapped repository: a snapshot must not be served from
+        the cache.
+        """
+        return self.__repository.read_snapshot(model_names)
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Run a savepoint of the wrapped repository, dropping every cached object
+        if it fails.
+        """
+        try:
+            with self.__repository.savepoint():
+                yield
+        except BaseException:
+            self.clear()
+            raise
+
+    def save(self, obj, *args, **kwargs):
+        """Save through the wrapped repository, then invalidate the id."""
+        result = self.__repository.save(obj, *args, **kwargs)
+        self.invalidate(obj)
+        return result
+
+    def update(self, obj):
+        """Update through the wrapped repository, then invalidate the id."""
+        result = self.__repository.update(obj)
+        self.invalidate(obj)
+        return result
+
+    def delete(self, obj):
+        """Delete through the wrapped repository, then invalidate the id."""
+        result = self.__repository.delete(obj)
+        self.invalidate(obj)
+        return result
+
+    def save_all(self, objs):
+        """
+        Save many objects through the wrapped repository, then invalidate their
+        ids.
+        """
+        result = self.__repository.save_all(objs)
+        for obj in objs:
+            self.invalidate(obj)
+        return result
+
+    def insert_many(self, model_name, rows, build=None):
+        """
+        Delegate to the wrapped repository: new objects have no cached copy to
+        invalidate.
+        """
+        return self.__repository.insert_many(model_name, rows, build)
+
+    def update_many(self, objs):
+        """
+        Update many objects through the wrapped repository, then invalidate
+        their ids.
+        """
+        result = self.__repository.update_many(objs)
+        for obj in objs:
+            self.invalidate(obj)
+        return result
+
+    def delete_many(self, objs):
+        """
+        Delete many objects through the wrapped repository, then invalidate
+        their ids.
+        """
+        result = self.__repository.delete_many(objs)
+        for obj in objs:
+            self.invalidate(obj)
+        return result
@@ -4,18 +4,33 @@ environment variable REPOSITORY_ENV_VAR.
 """
 
 import os
+import heapq
 import logging
+import pickle
+from contextlib import contextmanager
+from sqlalchemy import and_, func, insert, or_
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError, NoResultFound
+from sqlalchemy.orm import Session, load_only
 from src.models.base import Base
-from src.persistence.repository import Repository
+from src.persistence.repository import (
+    KEYSET_FIELDS, Repository, RolledBack, parse_order_by, parse_where,
+)
 from src.models import db
+from utils.geo import bounding_box, haversine_km
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Keys of session.info: set while a transaction block runs, and counting the
+# statements of the block that failed and were rolled back
+IN_TRANSACTION = "repository_transaction"
+FAILED_STATEMENTS = "repository_failed_statements"
+
 class DBRepository(Repository):
     """A database repository implementing the Repository interface for SQLAlchemy ORM."""
 
+    transactional = True
+
     def __init__(self) -> None:
         """Initialize the DBRepository with a database session."""
         self.session = db.session
@@ -27,7 +42,7 @@ class DBRepository(Repository):
             return self.session.query(model_name).all()
         except SQLAlchemyError as e:
             logger.error(f"Error fetching all objects for {model_name}: {str(e)}")
-            self.session.rollback()
+            self.rollback()
             return []
 
     def get(self, model_name: str, obj_id: str) -> Base | None:
@@ -39,12 +54,13 @@ class DBRepository(Repository):
             return None
         except IntegrityError as e:
             logger.error(f"Integrity error while accessing {model_name}: {str(e)}")
-            self.session.rollback()
+            self.rollback()
             return None
 
     def reload(self) -> None:
         """Optionally repopulate the database with initial data."""
         try:
+            import src.models.seed  # noqa: F401 - registers the seed_fingerprints table
             db.create_all()
             from utils.populate import populate_db
             populate_db(self)
@@ -54,40 +70,511 @@ class DBRepository(Repository):
     def save(self, obj: Base) -> None:
         """Save an object to the database."""
         try:
-            self.session.add(obj)
-            self.session.commit()
+            with self.writing():
+                self.session.add(obj)
         except SQLAlchemyError as e:
             logger.error(f"Failed to save object: {str(e)}")
-            self.session.rollback()
 
     def update(self, obj: Base) -> Base | None:
         """Commit changes to the database to update an object."""
         try:
-            self.session.commit()
+            with self.writing():
+                self.session.flush()
             return obj
         except SQLAlchemyError as e:
             logger.error(f"Failed to update object {obj.id}: {str(e)}")
-            self.session.rollback()
             return None
 
     def delete(self, obj: Base) -> bool:
         """Delete an object from the database."""
         try:
-            self.session.delete(obj)
-            self.session.commit()
+            with self.writing():
+                self.session.delete(obj)
             return True
         except SQLAlchemyError as e:
             logger.error(f"Failed to delete object {obj.id}: {str(e)}")
-            self.session.rollback()
             return False
 
+    def save_all(self, objs: list) -> None:
+        """Insert many objects in a single transaction."""
+        try:
+            # Pending inserts of one mapper are flushed as a batched
+            # executemany
+            with self.writing():
+                self.session.add_all(objs)
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to save {len(objs)} objects: {str(e)}")
+
+    def insert_many(self, model_name, rows: list, build=None) -> int:
+        """
+        Insert the rows with batched executemany INSERTs in one transaction,
+        without building ORM objects. The column defaults fill in the rest.
+        """
+        if not rows:
+            return 0
+        try:
+            with self.writing():
+                self.session.execute(
+                    insert(self.model_class(model_name)), rows
+                )
+            return len(rows)
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Failed to insert {len(rows)} rows of {model_name}: {str(e)}"
+            )
+            return 0
+
+    def get_many(self, model_name, ids: list) -> list:
+        """Retrieve many objects by ID with a single IN query."""
+        if not ids:
+            return []
+        try:
+            model = self.model_class(model_name)
+            rows = self.session.query(model).filter(model.id.in_(ids)).all()
+            found = {obj.id: obj for obj in rows}
+            return [found[obj_id] for obj_id in ids if obj_id in found]
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Error fetching {len(ids)} objects for {model_name}: {str(e)}"
+            )
+            self.rollback()
+            return []
+
+    def update_many(self, objs: list) -> None:
+        """Commit changes to many objects in a single transaction."""
+        try:
+            with self.writing():
+                self.session.flush()
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to update {len(objs)} objects: {str(e)}")
+
+    def delete_many(self, objs: list) -> int:
+        """Delete many objects in a single transaction."""
+        try:
+            with self.writing():
+                for obj in objs:
+                    self.session.delete(obj)
+            return len(objs)
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to delete {len(objs)} objects: {str(e)}")
+            return 0
+
+    def distinct_values(self, model_name, field: str) -> set:
+        """Retrieve the distinct values of one column with a single query."""
+        try:
+            column = getattr(self.model_class(model_name), field)
+            return {
+                value for (value,) in self.session.query(column).distinct()
+            }
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Error fetching distinct {field} values of {model_name}: "
+                f"{str(e)}"
+            )
+            self.rollback()
+            return set()
+
+    def get_seed_fingerprint(self, data_set: str):
+        """Fetch the fingerprint recorded when a data set was last seeded."""
+        from src.models.seed import SeedFingerprint
+        try:
+            seed = self.session.query(SeedFingerprint).filter_by(
+                data_set=data_set
+            ).first()
+            return seed.fingerprint if seed else None
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Error fetching seed fingerprint of {data_set}: {str(e)}"
+            )
+            self.rollback()
+            return None
+
+    def set_seed_fingerprint(self, data_set: str, fingerprint: str) -> None:
+        """Record the fingerprint of a seeded data set."""
+        from src.models.seed import SeedFingerprint
+        try:
+            with self.writing():
+                seed = self.session.query(SeedFingerprint).filter_by(
+                    data_set=data_set
+                ).first()
+                if seed:
+                    seed.fingerprint = fingerprint
+                else:
+                    self.session.add(SeedFingerprint(data_set, fingerprint))
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Failed to record seed fingerprint of {data_set}: {str(e)}"
+            )
+
+    def query(self, model_name, where=None, order_by=None, limit=None,
+              offset=None, fields=None) -> list:
+        """
+        Translate conditions, ordering and slicing to WHERE, ORDER BY, LIMIT
+        and OFFSET, and the fields to the only columns selected.
+        """
+        model = self.model_class(model_name)
+        statement = self.with_fields(model, self.session.query(model), fields)
+        statement = statement.filter(*self.where_clauses(model, where))
+        for field, descending in parse_order_by(order_by):
+            column = getattr(model, field)
+            statement = statement.order_by(
+                column.desc() if descending else column.asc()
+            )
+        if offset:
+            statement = statement.offset(offset)
+        if limit is not None:
+            statement = statement.limit(limit)
+        try:
+            return statement.all()
+        except SQLAlchemyError as e:
+            logger.error(f"Error querying {model_name} with {where}: {str(e)}")
+            self.rollback()
+            return []
+
+    def where_clauses(self, model, where) -> list:
+        """
+        Translate query conditions to SQL expressions on the columns of a
+        model.
+        """
+        clauses = []
+        for field, op, value in parse_where(where):
+            column = getattr(model, field)
+            clauses.append({
+                "eq": lambda: column == value,
+                "ne": lambda: column != value,
+                "lt": lambda: column < value,
+                "lte": lambda: column <= value,
+                "gt": lambda: column > value,
+                "gte": lambda: column >= value,
+                "in": lambda: column.in_(list(value)),
+            }[op]())
+        return clauses
+
+    def with_fields(self, model, statement, fields, required=()):
+        """
+        Load only the columns of the given fields, plus the required ones: the
+        others, typically large text columns, are deferred and never read
+        unless an attribute is accessed later.
+        """
+        if not fields:
+            return statement
+        columns = [
+            getattr(model, field)
+            for field in dict.fromkeys((*required, *fields))
+        ]
+        return statement.options(load_only(*columns))
+
+    def page(self, model_name, limit, after=None, where=None,
+             fields=None) -> list:
+        """
+        Seek past the (created_at, id) key of the previous page, so the
+        database walks the (created_at, id) index instead of skipping rows.
+        """
+        model = self.model_class(model_name)
+        # The key of the last row is the cursor of the next page
+        statement = self.with_fields(
+            model, self.session.query(model), fields, required=KEYSET_FIELDS
+        )
+        statement = statement.filter(*self.where_clauses(model, where))
+        if after is not None:
+            created_at, obj_id = after
+            statement = statement.filter(or_(
+                model.created_at > created_at,
+                and_(model.created_at == created_at, model.id > obj_id),
+            ))
+        statement = statement.order_by(
+            model.created_at.asc(), model.id.asc()
+        ).limit(limit)
+        try:
+            return statement.all()
+        except SQLAlchemyError as e:
+            logger.error(f"Error paging {model_name} after {after}: {str(e)}")
+            self.rollback()
+            return []
+
+    def iter_all(self, model_name, chunk_size=500, where=None, fields=None):
+        """
+        Stream rows through a server-side cursor, buffering chunk_size rows at
+        a time. An error mid-stream is raised, not swallowed: the rows already
+        sent are only part of the collection and the response must not end as
+        if complete.
+        """
+        model = self.model_class(model_name)
+        statement = self.with_fields(model, self.session.query(model), fields)
+        statement = statement.filter(*self.where_clauses(model, where))
+        try:
+            yield from statement.yield_per(chunk_size)
+        except SQLAlchemyError as e:
+            logger.error(f"Error streaming {model_name}: {str(e)}")
+            self.rollback()
+            raise
+
+    def get_updated_at(self, model_name, obj_id):
+        """Read the updated_at column of one row without loading the object."""
+        model = self.model_class(model_name)
+        try:
+            return self.session.query(model.updated_at).filter(
+                model.id == obj_id
+            ).scalar()
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Error fetching updated_at of {model_name} {obj_id}: {str(e)}"
+            )
+            self.rollback()
+            return None
+
+    def collection_version(self, model_name):
+        """
+        Derive the version from the row count and the latest updated_at:
+        inserts and deletes change the count, updates move the latest timestamp
+        forward.
+        """
+        model = self.model_class(model_name)
+        try:
+            count, latest = self.session.query(
+                func.count(model.id), func.max(model.updated_at)
+            ).one()
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Error fetching the version of {model_name}: {str(e)}"
+            )
+            self.rollback()
+            return ""
+        return f"{count}.{latest.isoformat() if latest else ''}"
+
+    def nearby(self, model_name, lat, lon, radius_km, limit):
+        """
+        Prefilter on the bounding box of the circle, which the (latitude,
+        longitude) index serves, then keep the rows within the exact haversine
+        distance.
+        """
+        model = self.model_class(model_name)
+        min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+        statement = self.session.query(model).filter(
+            model.latitude.between(min_lat, max_lat),
+            or_(*(
+                model.longitude.between(low, high) for low, high in lon_ranges
+            )),
+        )
+        try:
+            found = []
+            for obj in statement.yield_per(1000):
+                distance = haversine_km(lat, lon, obj.latitude, obj.longitude)
+                if distance <= radius_km:
+                    found.append((obj, distance))
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Error searching {model_name} near ({lat}, {lon}): {str(e)}"
+            )
+            self.rollback()
+            return []
+        return heapq.nsmallest(limit, found, key=lambda pair: pair[1])
+
+    def increment(self, model_name, obj_id, deltas):
+        """
+        Issue one UPDATE adding the deltas in SQL, so concurrent writers cannot
+        lose each other's increments. The statement runs in the session's
+        transaction and is committed by the write that follows it.
+        """
+        model = self.model_class(model_name)
+        values = {
+            getattr(model, field):
+                func.coalesce(getattr(model, field), 0) + delta
+            for field, delta in deltas.items()
+        }
+        try:
+            self.session.query(model).filter(model.id == obj_id).update(
+                values, synchronize_session=False
+            )
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Failed to increment {model_name} {obj_id}: {str(e)}"
+            )
+            self.rollback()
+
+    def owners_with_all(self, model_name, owner_field, member_field, members):
+        """
+        Group the links to the given members by owner and keep the owners
+        having all of them, in one query served by the link table's indexes.
+        """
+        members = list(set(members))
+        if not members:
+            return set()
+        model = self.model_class(model_name)
+        owner = getattr(model, owner_field)
+        member = getattr(model, member_field)
+        statement = (
+            self.session.query(owner)
+            .filter(member.in_(members))
+            .group_by(owner)
+            .having(func.count(func.distinct(member)) == len(members))
+        )
+        try:
+            return {value for (value,) in statement}
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Error fetching {model_name} owners linked to {members}: "
+                f"{str(e)}"
+            )
+            self.rollback()
+            return set()
+
+    def detach(self, obj):
+        """
+        Return a session-independent copy of a loaded object, for caching.
+        """
+        return pickle.loads(
+            pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+
+    def attach(self, obj):
+        """
+        Merge a cached copy into the current session without querying the
+        database.
+        """
+        return self.session.merge(obj, load=False)
+
+    @contextmanager
+    def writing(self):
+        """
+        Run the statements of one write. Outside a transaction block they are
+        committed at once, or rolled back if they fail. Inside one they run in
+        a nested transaction of their own, so a failure rolls back that write
+        alone and the block commits the rest. Errors are re-raised.
+        """
+        session = self.session()
+        if not session.info.get(IN_TRANSACTION):
+            try:
+                yield
+                session.commit()
+            except SQLAlchemyError:
+                session.rollback()
+                raise
+            return
+        try:
+            with session.begin_nested():
+                yield
+        except SQLAlchemyError:
+            session.info[FAILED_STATEMENTS] = (
+                session.info.get(FAILED_STATEMENTS, 0) + 1
+            )
+            raise
+
+    def rollback(self) -> None:
+        """
+        Recover from a failed read. Inside a savepoint only the innermost
+        nested transaction is rolled back, which fails the savepoint;
+        otherwise the session's transaction is.
+        """
+        session = self.session()
+        nested = session.get_nested_transaction()
+        if session.info.get(IN_TRANSACTION) and nested is not None:
+            session.info[FAILED_STATEMENTS] = (
+                session.info.get(FAILED_STATEMENTS, 0) + 1
+            )
+            nested.rollback()
+            return
+        session.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block in one database transaction, begun with session.begin().
+        The write methods only flush inside it, and the block commits once, or
+        rolls back if it raises.
+        """
+        session = self.session()
+        if session.info.get(IN_TRANSACTION):
+            # Already inside a transaction block: the outer one commits
+            yield
+            return
+        if session.in_transaction():
+            # Reads made earlier in the request began a transaction, which
+            # holds no writes since every write outside a block commits
+            session.commit()
+        session.info[IN_TRANSACTION] = True
+        try:
+            with session.begin():
+                yield
+        except SQLAlchemyError as e:
+            logger.error(f"Transaction rolled back: {str(e)}")
+            raise
+        finally:
+            del session.info[IN_TRANSACTION]
+            session.info.pop(FAILED_STATEMENTS, None)
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Run a block under a SAVEPOINT, begun with session.begin_nested(). The
+        block is rolled back alone when it raises, or when one of its
+        statements failed, in which case RolledBack is raised.
+        """
+        session = self.session()
+        failed = session.info.get(FAILED_STATEMENTS, 0)
+        with session.begin_nested():
+            yield
+            if session.info.get(FAILED_STATEMENTS, 0) > failed:
+                raise RolledBack(
+                    "A write of the savepoint failed and was rolled back"
+                )
+
+    @contextmanager
+    def read_snapshot(self, model_names):
+        """
+        Read every model in one REPEATABLE READ transaction, SERIALIZABLE on
+        SQLite which has no such level, streaming the rows with yield_per. The
+        transaction runs on a connection and session of its own, so the
+        request's session is left as it was, and is rolled back when the block
+        exits.
+        """
+        engine = self.session.get_bind()
+        isolation_level = "REPEATABLE READ"
+        if engine.dialect.name == "sqlite":
+            isolation_level = "SERIALIZABLE"
+        with engine.connect() as connection:
+            connection = connection.execution_options(
+                isolation_level=isolation_level
+            )
+            # Closing the session rolls back its read transaction, which
+            # releases the snapshot
+            with Session(bind=connection) as snapshot:
+
+                def read(model_name, chunk_size=500):
+                    """Stream the objects of a model from the snapshot."""
+                    model = self.model_class(model_name)
+                    yield from snapshot.query(model).yield_per(chunk_size)
+
+                yield read
+
+    def model_class(self, model):
+        """Resolve a model given by its lowercase name to its mapped class."""
+        if not isinstance(model, str):
+            return model
+        for mapper in db.Model.registry.mappers:
+            if mapper.class_.__name__.lower() == model:
+                return mapper.class_
+        raise ValueError(f"Unknown model {model}")
+
+    def find_by(self, model_name, **criteria) -> list:
+        """Retrieve the objects whose columns equal the given values."""
+        try:
+            model = self.model_class(model_name)
+            return self.session.query(model).filter_by(**criteria).all()
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Error filtering {model_name} by {criteria}: {str(e)}"
+            )
+            self.rollback()
+            return []
+
     def get_by_code(self, model, code):
         """Retrieve an object by its unique code."""
         try:
             return self.session.query(model).filter(model.code == code).first()
         except SQLAlchemyError as e:
             logger.error(f"Error retrieving object by code {code}: {str(e)}")
-            self.session.rollback()
+            self.rollback()
             return None
 
 
@@ -1,14 +1,40 @@
 """
 This module exports a Repository that persists data in a JSON file.
+
+In 'journal' mode mutations are appended as compact JSON lines to a journal
+next to the snapshot, and the journal is folded into the snapshot once it
+grows past FILE_JOURNAL_COMPACT_THRESHOLD entries.
+
+When writes happen is governed by STORAGE_DURABILITY (see flusher.py).
+
+With FILE_STORAGE_FORMAT set to 'binary' the snapshot is the mmap-backed
+format of snapshot.py instead of JSON: startup only maps the file, and
+objects are built on first get/get_all. Every snapshot rewrite builds all
+objects, so the binary format is meant to be combined with journal mode.
 """
 
 import json
 import logging
+import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from src.models.base import Base
+from src.persistence.atomic import atomic_write
+from src.persistence.flusher import Flusher
+from src.persistence.indexes import (
+    IndexedStore, key_fields, model_key, object_key, row_key,
+)
 from src.persistence.repository import Repository
-from utils.constants import FILE_STORAGE_FILENAME
+from src.persistence.snapshot import (
+    SnapshotError, SnapshotReader, write_snapshot,
+)
+from utils.populate import populate_db
+from utils.constants import (
+    FILE_STORAGE_FILENAME, FILE_STORAGE_FORMAT, FILE_STORAGE_MODE,
+    FILE_JOURNAL_COMPACT_THRESHOLD, STORAGE_DURABILITY
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,85 +44,442 @@ class FileRepository(Repository):
     def __init__(self) -> None:
         """Initialize the FileRepository and load or populate data."""
         self.__filename = Path(FILE_STORAGE_FILENAME)
-        self.__data = {}
+        self.__journal = self.__filename.with_suffix('.journal')
+        self.__journal_mode = FILE_STORAGE_MODE == 'journal'
+        self.__binary = FILE_STORAGE_FORMAT == 'binary'
+        self.__snapshot_path = self.__filename.with_suffix('.snap')
+        self.__snapshot = None
+        self.__materialized = set()
+        self.__tombstones = {}
+        self.__journal_entries = 0
+        self.__pending_lines = []
+        self.__lock = threading.RLock()
+        self.__data = IndexedStore()
         self.load_data()
+        self.__flusher = Flusher(self.flush, STORAGE_DURABILITY, name="file")
+        self.reload()
 
     def load_data(self):
         """Load data from a file or initialize with default data."""
-        if self.__filename.exists():
+        if self.__binary and self.__snapshot_path.exists():
+            try:
+                self.open_snapshot()
+            except SnapshotError as e:
+                logger.error(f"Failed to open binary snapshot: {e}")
+                raise
+        elif self.__filename.exists():
             with self.__filename.open('r') as file:
                 file_data = json.load(file)
                 self.deserialize_data(file_data)
+            if self.__binary:
+                logger.info(
+                    "Converting the JSON data file to a binary snapshot."
+                )
+                self.save_to_file()
         else:
             logger.info("Data file not found, initializing with default data.")
-            self.__data = self.initialize_data()
+            self.__data.load(self.initialize_data())
             self.save_to_file()
 
+        if self.__journal.exists():
+            self.replay_journal()
+            if not self.__journal_mode and self.__journal_entries:
+                # A journal left behind by a previous run in journal mode
+                self.compact()
+
     def save_to_file(self):
-        """Save the serialized data to a JSON file."""
-        with self.__filename.open('w') as file:
-            json.dump(self.serialize_data(), file, indent=4)
+        """Save the serialized data to a JSON file, or to a binary snapshot."""
+        if self.__binary:
+            write_snapshot(self.__snapshot_path, self.serialize_data())
+            self.open_snapshot()
+            # Every object is in memory and the new snapshot holds no deleted
+            # rows
+            self.__materialized = (
+                set(self.__data.models()) | set(self.__snapshot.models())
+            )
+        else:
+            atomic_write(
+                self.__filename,
+                lambda file: json.dump(self.serialize_data(), file, indent=4),
+            )
         logger.debug("Data successfully saved to file.")
 
+    def open_snapshot(self):
+        """Map the binary snapshot, leaving its rows to be built on demand."""
+        if self.__snapshot is not None:
+            self.__snapshot.close()
+        self.__snapshot = SnapshotReader(self.__snapshot_path)
+        self.__materialized = set()
+        self.__tombstones = {}
+        for model in self.__snapshot.models():
+            self.__data.declare(model)
+        logger.info(
+            f"Mapped binary snapshot with {len(self.__snapshot.models())} "
+            "models."
+        )
+
+    def materialize(self, model: str):
+        """
+        Build every object of a model still only present in the binary
+        snapshot.
+        """
+        if self.__snapshot is None or model in self.__materialized:
+            return
+        with self.__lock:
+            if model in self.__materialized:
+                return
+            model_class = self.model_classes()[model]
+            deleted = self.__tombstones.get(model, set())
+            for row in self.__snapshot.rows(model):
+                key = row_key(model, row)
+                if key not in deleted and self.__data.get(model, key) is None:
+                    self.__data.add(model, model_class(**row))
+            self.__materialized.add(model)
+
+    def lookup(self, model: str, obj_id):
+        """
+        Return an object by key, building it from the binary snapshot if
+        needed.
+        """
+        if self.__snapshot is not None and key_fields(model) != ("id",):
+            # The snapshot only indexes rows by id
+            self.materialize(model)
+        obj = self.__data.get(model, obj_id)
+        if (obj is not None or self.__snapshot is None
+                or model in self.__materialized
+                or obj_id in self.__tombstones.get(model, ())):
+            return obj
+        # open_snapshot closes the mapping it replaces: it is only read under
+        # the lock
+        with self.__lock:
+            obj = self.__data.get(model, obj_id)
+            if (obj is not None or model in self.__materialized
+                    or obj_id in self.__tombstones.get(model, ())):
+                return obj
+            row = self.__snapshot.get(model, obj_id)
+            if row is None:
+                return None
+            obj = self.model_classes()[model](**row)
+            self.__data.add(model, obj)
+        return obj
+
+    def forget(self, model: str, obj_id):
+        """
+        Remove an object, hiding its binary snapshot row until the next
+        snapshot.
+        """
+        if self.__snapshot is not None:
+            self.__tombstones.setdefault(model, set()).add(obj_id)
+        return self.__data.discard(model, obj_id)
+
     def serialize_data(self):
         """Serialize the data for saving to JSON."""
+        if self.__snapshot is not None:
+            for model in self.__snapshot.models():
+                self.materialize(model)
         return {
-            model: [obj.to_dict() for obj in objects]
-            for model, objects in self.__data.items()
+            model: [obj.to_dict() for obj in self.__data.all(model)]
+            for model in self.__data.models()
         }
 
     def deserialize_data(self, file_data):
         """Deserialize the JSON data into the repository data structure."""
+        model_classes = self.model_classes()
+        self.__data.load({
+            model: [model_classes[model](**item) for item in items]
+            for model, items in file_data.items()
+        })
+
+    def model_classes(self):
+        """Map the model names used as storage keys to their classes."""
         from src.models import Amenity, City, Country, Place, PlaceAmenity, Review, User
-        model_classes = {
+        from src.models.seed import SeedFingerprint
+        return {
             'amenity': Amenity,
             'city': City,
             'country': Country,
             'place': Place,
             'placeamenity': PlaceAmenity,
             'review': Review,
+            'seedfingerprint': SeedFingerprint,
             'user': User
         }
-        for model, items in file_data.items():
-            self.__data[model] = [model_classes[model](**item) for item in items]
+
+    def replay_journal(self):
+        """Apply the journaled mutations on top of the loaded snapshot."""
+        model_classes = self.model_classes()
+        torn = False
+        with self.__journal.open('r') as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only the tail can be torn by a crash mid-append
+                    logger.warning(
+                        "Ignoring unreadable journal entry at line "
+                        f"{line_number}."
+                    )
+                    torn = True
+                    break
+                data = entry["data"]
+                # Replay is idempotent: entries already folded into the
+                # snapshot by an interrupted compaction are simply reapplied.
+                if entry["op"] == "delete":
+                    self.forget(entry["model"], row_key(entry["model"], data))
+                else:
+                    model_class = model_classes[entry["model"]]
+                    self.__data.add(entry["model"], model_class(**data))
+                self.__journal_entries += 1
+        logger.info(f"Replayed {self.__journal_entries} journal entries.")
+        if torn:
+            # New appends must not land after a partial line
+            self.compact()
+
+    def journal_line(self, op: str, model: str, obj: Base) -> str:
+        """Serialize one mutation as a compact JSON line."""
+        if op == "delete":
+            data = {field: getattr(obj, field) for field in key_fields(model)}
+        else:
+            data = obj.to_dict()
+        return json.dumps(
+            {"op": op, "model": model, "data": data},
+            separators=(',', ':'), default=str,
+        ) + "\n"
+
+    def append_journal(self, lines: list):
+        """
+        Append mutations to the journal in one write and fold it once it is
+        large enough.
+        """
+        with self.__journal.open('a') as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+        self.__journal_entries += len(lines)
+        if self.__journal_entries >= FILE_JOURNAL_COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal."""
+        self.save_to_file()
+        atomic_write(self.__journal, lambda file: None)
+        logger.info(
+            f"Compacted {self.__journal_entries} journal entries into the "
+            "snapshot."
+        )
+        self.__journal_entries = 0
+
+    def persist(self, op: str, model: str, obj: Base):
+        """Record a mutation and hand it to the flusher."""
+        self.record(op, model, obj)
+        self.__flusher.mark_dirty()
+
+    def record(self, op: str, model: str, obj: Base):
+        """Queue the journal line of a mutation without flushing."""
+        if self.__journal_mode:
+            # Serialized now so the journal reflects the object as of this
+            # mutation
+            self.__pending_lines.append(self.journal_line(op, model, obj))
+
+    def flush(self):
+        """
+        Write the pending changes according to the configured storage mode.
+        """
+        with self.__lock:
+            if not self.__journal_mode:
+                self.save_to_file()
+            elif self.__pending_lines:
+                lines, self.__pending_lines = self.__pending_lines, []
+                self.append_journal(lines)
+
+    @contextmanager
+    def transaction(self):
+        """Flush the writes of a block once, when it exits."""
+        with self.__flusher.deferred():
+            yield
+
+    def close(self):
+        """Drain pending writes, used on graceful shutdown."""
+        self.__flusher.close()
 
     def get_all(self, model_name: str):
         """Return all objects of a given model."""
-        return self.__data.get(model_name, [])
+        self.materialize(model_key(model_name))
+        return self.__data.all(model_name)
 
     def get(self, model_name: str, obj_id: str):
         """Get an object by its ID from the specified model collection."""
-        for obj in self.get_all(model_name):
-            if obj.id == obj_id:
-                return obj
-        return None
+        return self.lookup(model_key(model_name), obj_id)
+
+    def find_by(self, model_name: str, **criteria):
+        """
+        Return the objects matching the criteria using the secondary indexes.
+        """
+        self.materialize(model_key(model_name))
+        return self.__data.find(model_name, **criteria)
+
+    def query(self, model_name: str, where=None, order_by=None, limit=None,
+              offset=None, fields=None):
+        """Plan the query over the hash and sorted indexes of the store."""
+        self.materialize(model_key(model_name))
+        with self.__lock:
+            return self.__data.select(
+                model_name, where, order_by, limit, offset
+            )
+
+    def page(self, model_name: str, limit: int, after=None, where=None,
+             fields=None):
+        """
+        Return one page of objects by walking the sorted (created_at, id)
+        index.
+        """
+        self.materialize(model_key(model_name))
+        with self.__lock:
+            return self.__data.page(model_name, limit, after, where)
+
+    def nearby(self, model_name: str, lat: float, lon: float,
+               radius_km: float, limit: int):
+        """Search the spatial grid index of the store."""
+        if not self.__data.has_spatial_index(model_name):
+            return super().nearby(model_name, lat, lon, radius_km, limit)
+        self.materialize(model_key(model_name))
+        with self.__lock:
+            return self.__data.nearby(model_name, lat, lon, radius_km, limit)
+
+    def owners_with_all(self, model_name: str, owner_field: str,
+                        member_field: str, members) -> set:
+        """AND the member bitmaps of the store's bitmap index."""
+        if not self.__data.has_bitmap_index(
+            model_name, owner_field, member_field
+        ):
+            return super().owners_with_all(
+                model_name, owner_field, member_field, members
+            )
+        self.materialize(model_key(model_name))
+        with self.__lock:
+            return self.__data.owners_with_all(model_name, members)
+
+    def collection_version(self, model_name: str):
+        """Return the mutation counter the store keeps per model."""
+        self.materialize(model_key(model_name))
+        return self.__data.version(model_name)
 
     def save(self, data: Base, save_to_file=True):
         """Add a new object to the repository and optionally save to file."""
-        model = data.__class__.__name__.lower()
-        self.__data.setdefault(model, []).append(data)
-        if save_to_file:
-            self.save_to_file()
+        model = model_key(data)
+        with self.__lock:
+            self.__data.add(model, data)
+            if save_to_file:
+                self.persist("save", model, data)
 
     def update(self, obj: Base):
         """Update an existing object in the repository and save changes."""
-        model = obj.__class__.__name__.lower()
-        index = next((i for i, existing_obj in enumerate(self.__data[model]) if existing_obj.id == obj.id), None)
-        if index is not None:
-            self.__data[model][index] = obj
-            self.save_to_file()
-            return obj
+        model = model_key(obj)
+        with self.__lock:
+            if self.lookup(model, object_key(obj)) is not None:
+                # A new updated_at moves the ETag and Last-Modified of the
+                # object
+                obj.updated_at = datetime.utcnow()
+                # Re-adding refreshes the index entries of an object changed in
+                # place
+                self.__data.add(model, obj)
+                self.persist("update", model, obj)
+                return obj
         return None
 
     def delete(self, obj: Base):
         """Remove an object from the repository and save changes."""
-        model = obj.__class__.__name__.lower()
-        if obj in self.__data[model]:
-            self.__data[model].remove(obj)
-            self.save_to_file()
-            return True
+        model = model_key(obj)
+        with self.__lock:
+            self.lookup(model, object_key(obj))
+            if self.forget(model, object_key(obj)):
+                self.persist("delete", model, obj)
+                return True
         return False
 
+    def increment(self, model_name: str, obj_id: str, deltas: dict):
+        """
+        Add the deltas under the repository lock, so concurrent writers
+        cannot lose each other's increments.
+        """
+        with self.__lock:
+            super().increment(model_name, obj_id, deltas)
+
+    def save_all(self, objs: list):
+        """Add many objects and flush them once."""
+        with self.__lock:
+            for obj in objs:
+                model = model_key(obj)
+                self.__data.add(model, obj)
+                self.record("save", model, obj)
+            if objs:
+                self.__flusher.mark_dirty()
+
+    def get_many(self, model_name: str, ids: list):
+        """Get many objects by ID, skipping unknown IDs."""
+        model = model_key(model_name)
+        objs = (self.lookup(model, obj_id) for obj_id in ids)
+        return [obj for obj in objs if obj is not None]
+
+    def update_many(self, objs: list):
+        """Update many existing objects and flush them once."""
+        updated = []
+        with self.__lock:
+            for obj in objs:
+                model = model_key(obj)
+                if self.lookup(model, object_key(obj)) is not None:
+                    obj.updated_at = datetime.utcnow()
+                    self.__data.add(model, obj)
+                    self.record("update", model, obj)
+                    updated.append(obj)
+            if updated:
+                self.__flusher.mark_dirty()
+        return updated
+
+    def delete_many(self, objs: list):
+        """Remove many objects and flush them once."""
+        deleted = 0
+        with self.__lock:
+            for obj in objs:
+                model = model_key(obj)
+                self.lookup(model, object_key(obj))
+                if self.forget(model, object_key(obj)):
+                    self.record("delete", model, obj)
+                    deleted += 1
+            if deleted:
+                self.__flusher.mark_dirty()
+        return deleted
+
+    def reload(self):
+        """
+        Seed the initial data sets, skipped when their fingerprints match.
+        """
+        try:
+            populate_db(self)
+        except Exception as e:
+            logger.error(f"Failed to populate data: {e}")
+
+    def get_seed_fingerprint(self, data_set: str):
+        """Fetch the fingerprint recorded when a data set was last seeded."""
+        from src.models.seed import SeedFingerprint
+        seed = self.get(SeedFingerprint, data_set)
+        return seed.fingerprint if seed else None
+
+    def set_seed_fingerprint(self, data_set: str, fingerprint: str):
+        """
+        Record the fingerprint of a seeded data set as an object of the store,
+        flushed with the seeded rows and lost with them.
+        """
+        from src.models.seed import SeedFingerprint
+        seed = self.get(SeedFingerprint, data_set)
+        if seed:
+            seed.fingerprint = fingerprint
+            self.update(seed)
+        else:
+            self.save(SeedFingerprint(data_set, fingerprint, id=data_set))
+
     def initialize_data(self):
         """Initialize default data structure."""
         return {
@@ -108,5 +491,3 @@ class FileRepository(Repository):
             "place": [],
             "placeamenity": [],
         }
-
-
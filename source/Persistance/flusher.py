@@ -0,0 +1,136 @@
+"""
+This module exports the Flusher, which decides when a file-backed repository
+writes its pending changes to disk.
+
+Durability settings:
+    always          flush synchronously on every mutation
+    interval=<ms>   a background thread flushes pending changes every <ms>
+    batch=<n>       a background thread flushes once <n> mutations are pending,
+                    or after BATCH_MAX_DELAY_MS at the latest
+
+Whatever the setting, the mutations of a deferred() block count as one,
+recorded when the block exits.
+"""
+
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_DELAY_MS = 1000
+
+
+def parse_durability(setting: str) -> Tuple[str, Optional[int]]:
+    """Parse a durability setting into its mode and its numeric argument."""
+    mode, _, value = setting.strip().partition('=')
+    if mode == 'always' and not value:
+        return mode, None
+    if mode in ('interval', 'batch') and value.isdigit() and int(value) > 0:
+        return mode, int(value)
+    raise ValueError(
+        f"Invalid durability setting '{setting}', expected always, "
+        "interval=<ms> or batch=<n>"
+    )
+
+
+class Flusher:
+    """
+    Coalesces repository mutations and runs a flush callback according to a
+    durability setting.
+    """
+
+    def __init__(self, flush: Callable[[], None], durability: str = 'always',
+                 name: str = 'repository') -> None:
+        """
+        Start the background flusher thread unless flushes are synchronous.
+        """
+        self.__flush = flush
+        self.__mode, self.__value = parse_durability(durability)
+        self.__lock = threading.Lock()
+        self.__wake = threading.Event()
+        self.__pending = 0
+        # Per thread: depth of the deferred() blocks, and whether a mutation
+        # was held back
+        self.__held = threading.local()
+        self.__closed = False
+        self.__thread = None
+        if self.__mode != 'always':
+            self.__thread = threading.Thread(
+                target=self.run, name=f"{name}-flusher", daemon=True
+            )
+            self.__thread.start()
+            atexit.register(self.close)
+        logger.info(f"{name} durability set to {durability}")
+
+    def mark_dirty(self) -> None:
+        """
+        Record a mutation, flushing now or waking the background thread as
+        configured.
+        """
+        if getattr(self.__held, "depth", 0):
+            self.__held.dirty = True
+            return
+        if self.__mode == 'always' or self.__closed:
+            self.__flush()
+            return
+        with self.__lock:
+            self.__pending += 1
+            pending = self.__pending
+        if self.__mode == 'batch' and pending >= self.__value:
+            self.__wake.set()
+
+    @contextmanager
+    def deferred(self):
+        """
+        Hold back the mutations recorded by the current thread in a block,
+        and record them as one when the block exits.
+        """
+        self.__held.depth = getattr(self.__held, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            self.__held.depth -= 1
+            if not self.__held.depth and getattr(self.__held, "dirty", False):
+                self.__held.dirty = False
+                self.mark_dirty()
+
+    def run(self) -> None:
+        """
+        Background loop flushing coalesced changes until the flusher is closed.
+        """
+        if self.__mode == 'interval':
+            timeout = self.__value / 1000
+        else:
+            timeout = BATCH_MAX_DELAY_MS / 1000
+        while not self.__closed:
+            self.__wake.wait(timeout)
+            self.__wake.clear()
+            self.drain()
+
+    def drain(self) -> None:
+        """Flush once if any mutation is pending."""
+        with self.__lock:
+            if not self.__pending:
+                return
+            pending, self.__pending = self.__pending, 0
+        try:
+            self.__flush()
+            logger.debug(f"Flushed {pending} coalesced change(s)")
+        except Exception as e:
+            logger.error(f"Background flush failed: {e}")
+            with self.__lock:
+                self.__pending += pending
+
+    def close(self) -> None:
+        """Stop the background thread and write every pending change."""
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__wake.set()
+        if (self.__thread is not None
+                and self.__thread is not threading.current_thread()):
+            self.__thread.join()
+        self.drain()
@@ -0,0 +1,386 @@
+"""
+This module exports the request-scoped identity map.
+
+Within one request every object is loaded at most once: lookups by id and
+whole-collection reads are answered from a map kept on `flask.g`, and the
+objects returned by queries are registered in it. Writes made during the
+request update the map, and it is dropped when the app context is torn
+down, so nothing outlives the request. Outside an app context, as in
+scripts and tests, every call goes straight to the wrapped repository.
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from flask import g, has_app_context
+from src.persistence.indexes import model_key, object_key
+from src.persistence.repository import Repository
+
+logger = logging.getLogger(__name__)
+
+# Returned by IdentityMap.get when an id was never looked up in the request
+MISSING = object()
+
+
+class IdentityMap:
+    """
+    Objects loaded during one request, by model and id, None recording a known
+    miss.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty map."""
+        self.__objects: Dict[str, Dict[object, object]] = {}
+        self.__collections: Dict[str, List] = {}
+        self.hits = 0
+
+    def get(self, model, obj_id):
+        """
+        Return the object loaded under an id, None if it is known not to exist,
+        or MISSING.
+        """
+        value = self.__objects.get(model_key(model), {}).get(obj_id, MISSING)
+        if value is not MISSING:
+            self.hits += 1
+        return value
+
+    def add(self, model, obj_id, obj) -> None:
+        """
+        Record the object loaded under an id, or None for an id known not to
+        exist.
+        """
+        self.__objects.setdefault(model_key(model), {})[obj_id] = obj
+
+    def register(self, model, objs: list) -> list:
+        """
+        Record objects returned by a query, keeping the instances already
+        mapped.
+        """
+        objects = self.__objects.setdefault(model_key(model), {})
+        for obj in objs:
+            key = object_key(obj, model)
+            if objects.get(key) is None:
+                objects[key] = obj
+        return objs
+
+    def forget(self, model, obj_id) -> None:
+        """
+        Drop an id, and the collection of its model, so the next read loads
+        them again.
+        """
+        self.__objects.get(model_key(model), {}).pop(obj_id, None)
+        self.__collections.pop(model_key(model), None)
+
+    def collection(self, model) -> Optional[List]:
+        """Return the whole collection of a model if it was loaded, or None."""
+        collection = self.__collections.get(model_key(model))
+        if collection is not None:
+            self.hits += 1
+        return collection
+
+    def set_collection(self, model, objs: List) -> None:
+        """Record the whole collection of a model and map its objects."""
+        self.__collections[model_key(model)] = objs
+        self.register(model, objs)
+
+    def written(self, model, obj, deleted: bool = False) -> None:
+        """
+        Map an object saved or updated in the request, or record its deletion.
+        """
+        self.add(model, object_key(obj, model), None if deleted else obj)
+        self.__collections.pop(model_key(model), None)
+
+
+def current_identity_map() -> Optional[IdentityMap]:
+    """
+    Return the identity map of the current app context, created on first use,
+    or None outside one.
+    """
+    if not has_app_context():
+        return None
+    if "identity_map" not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
+
+
+def drop_identity_map(exception=None) -> None:
+    """Discard the identity map of the app context being torn down."""
+    identity_map = g.pop("identity_map", None)
+    if identity_map is not None and identity_map.hits:
+        logger.debug(
+            f"Identity map saved {identity_map.hits} repository read(s)"
+        )
+
+
+class IdentityMapRepository(Repository):
+    """
+    Repository decorator answering repeated reads of one request from the
+    request's identity map. Writes go to the wrapped repository and update the
+    map.
+    """
+
+    def __init__(self, repository: Repository) -> None:
+        """Wrap a repository."""
+        self.__repository = repository
+
+    @property
+    def repository(self) -> Repository:
+        """The wrapped repository."""
+        return self.__repository
+
+    def __getattr__(self, name):
+        """Expose the backend specific methods of the wrapped repository."""
+        if name.startswith('_IdentityMapRepository__'):
+            raise AttributeError(name)
+        return getattr(self.__repository, name)
+
+    def get(self, model_name, obj_id):
+        """
+        Answer from the identity map, loading and mapping the object on a miss.
+        """
+        identity_map = current_identity_map()
+        if identity_map is None:
+            return self.__repository.get(model_name, obj_id)
+        obj = identity_map.get(model_name, obj_id)
+        if obj is MISSING:
+            obj = self.__repository.get(model_name, obj_id)
+            identity_map.add(model_name, obj_id, obj)
+        return obj
+
+    def get_many(self, model_name, ids: list) -> list:
+        """
+        Answer mapped ids from the identity map and load the others in one
+        batch.
+        """
+        identity_map = current_identity_map()
+        if identity_map is None:
+            return self.__repository.get_many(model_name, ids)
+        found = {
+            obj_id: identity_map.get(model_name, obj_id) for obj_id in ids
+        }
+        missing = [obj_id for obj_id, obj in found.items() if obj is MISSING]
+        if missing:
+            loaded = {
+                obj.id: obj
+                for obj in self.__repository.get_many(model_name, missing)
+            }
+            for obj_id in missing:
+                found[obj_id] = loaded.get(obj_id)
+                identity_map.add(model_name, obj_id, found[obj_id])
+        return [found[obj_id] for obj_id in ids if found[obj_id] is not None]
+
+    def get_all(self, model_name):
+        """Load a whole collection once per request."""
+        identity_map = current_identity_map()
+        if identity_map is None:
+            return self.__repository.get_all(model_name)
+        objs = identity_map.collection(model_name)
+        if objs is None:
+            objs = self.__repository.get_all(model_name)
+            identity_map.set_collection(model_name, objs)
+        return list(objs)
+
+    def find_by(self, model_name, **criteria):
+        """Delegate to the wrapped repository and map the objects found."""
+        return self.__register(
+            model_name, self.__repository.find_by(model_name, **criteria)
+        )
+
+    def query(self, model_name, where=None, order_by=None, limit=None,
+              offset=None, fields=None):
+        """Delegate to the wrapped repository and map the objects found."""
+        return self.__register(model_name, self.__repository.query(
+            model_name, where=where, order_by=order_by, limit=limit,
+            offset=offset, fields=fields,
+        ))
+
+    def page(self, model_name, limit, after=None, where=None, fields=None):
+        """Delegate to the wrapped repository and map the objects found."""
+        return self.__register(model_name, self.__repository.page(
+            model_name, limit, after=after, where=where, fields=fields
+        ))
+
+    def iter_all(self, model_name, chunk_size=500, where=None, fields=None):
+        """
+        Delegate to the wrapped repository, without mapping: streams must not
+        pile up in memory.
+        """
+        return self.__repository.iter_all(
+            model_name, chunk_size=chunk_size, where=where, fields=fields
+        )
+
+    def distinct_values(self, model_name, field):
+        """Delegate to the wrapped repository."""
+        return self.__repository.distinct_values(model_name, field)
+
+    def get_seed_fingerprint(self, data_set):
+        """Delegate to the wrapped repository."""
+        return self.__repository.get_seed_fingerprint(data_set)
+
+    def set_seed_fingerprint(self, data_set, fingerprint):
+        """Delegate to the wrapped repository."""
+        self.__repository.set_seed_fingerprint(data_set, fingerprint)
+
+    def get_updated_at(self, model_name, obj_id):
+        """Answer from the mapped object when there is one."""
+        identity_map = current_identity_map()
+        obj = MISSING
+        if identity_map is not None:
+            obj = identity_map.get(model_name, obj_id)
+        if obj is not MISSING:
+            return getattr(obj, "updated_at", None)
+        return self.__repository.get_updated_at(model_name, obj_id)
+
+    def collection_version(self, model_name):
+        """Delegate to the wrapped repository."""
+        return self.__repository.collection_version(model_name)
+
+    def nearby(self, model_name, lat, lon, radius_km, limit):
+        """Delegate to the wrapped repository."""
+        return self.__repository.nearby(model_name, lat, lon, radius_km, limit)
+
+    def owners_with_all(self, model_name, owner_field, member_field, members):
+        """Delegate to the wrapped repository."""
+        return self.__repository.owners_with_all(
+            model_name, owner_field, member_field, members
+        )
+
+    def increment(self, model_name, obj_id, deltas):
+        """
+        Increment through the wrapped repository, then forget the id whose
+        mapped copy may be stale.
+        """
+        self.__repository.increment(model_name, obj_id, deltas)
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.forget(model_name, obj_id)
+
+    def detach(self, obj):
+        """Delegate to the wrapped repository."""
+        return self.__repository.detach(obj)
+
+    def attach(self, obj):
+        """Delegate to the wrapped repository."""
+        return self.__repository.attach(obj)
+
+    @property
+    def transactional(self) -> bool:
+        """
+        Whether a transaction of the wrapped repository can undo its writes.
+        """
+        return self.__repository.transactional
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a transaction of the wrapped repository, dropping the identity map
+        if it fails.
+        """
+        try:
+            with self.__repository.transaction():
+                yield
+        except BaseException:
+            self.__drop()
+            raise
+
+    def read_snapshot(self, model_names):
+        """
+        Delegate to the wrapped repository, without mapping: exports must not
+        pile up in memory.
+        """
+        return self.__repository.read_snapshot(model_names)
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Run a savepoint of the wrapped repository, dropping the identity map if
+        it fails.
+        """
+        try:
+            with self.__repository.savepoint():
+                yield
+        except BaseException:
+            self.__drop()
+            raise
+
+    def reload(self):
+        """Reload the wrapped repository and drop the current identity map."""
+        self.__repository.reload()
+        self.__drop()
+
+    def save(self, obj, *args, **kwargs):
+        """Save through the wrapped repository, then map the object."""
+        result = self.__repository.save(obj, *args, **kwargs)
+        self.__written([obj])
+        return result
+
+    def update(self, obj):
+        """Update through the wrapped repository, then map the object."""
+        result = self.__repository.update(obj)
+        self.__written([obj])
+        return result
+
+    def delete(self, obj):
+        """
+        Delete through the wrapped repository, then record the id as deleted.
+        """
+        result = self.__repository.delete(obj)
+        if result is not False:
+            self.__written([obj], deleted=True)
+        return result
+
+    def save_all(self, objs):
+        """Save many objects through the wrapped repository, then map them."""
+        result = self.__repository.save_all(objs)
+        self.__written(objs)
+        return result
+
+    def insert_many(self, model_name, rows, build=None):
+        """
+        Insert through the wrapped repository, then forget the collection the
+        new objects belong to.
+        """
+        result = self.__repository.insert_many(model_name, rows, build)
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.forget(model_name, None)
+        return result
+
+    def update_many(self, objs):
+        """
+        Update many objects through the wrapped repository, then map them.
+        """
+        result = self.__repository.update_many(objs)
+        self.__written(objs)
+        return result
+
+    def delete_many(self, objs):
+        """
+        Delete many objects through the wrapped repository, then record their
+        ids as deleted.
+        """
+        result = self.__repository.delete_many(objs)
+        self.__written(objs, deleted=True)
+        return result
+
+    def __drop(self) -> None:
+        """
+        Drop the identity map of the current app context, whose objects may be
+        stale.
+        """
+        if has_app_context():
+            g.pop("identity_map", None)
+
+    def __register(self, model_name, objs):
+        """Map the objects returned by a query, if a request is active."""
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            identity_map.register(model_name, objs)
+        return objs
+
+    def __written(self, objs, deleted: bool = False) -> None:
+        """Update the identity map after a write, if a request is active."""
+        identity_map = current_identity_map()
+        if identity_map is not None:
+            for obj in objs:
+                identity_map.written(model_key(obj), obj, deleted)
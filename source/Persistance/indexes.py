@@ -0,0 +1,734 @@
+"""
+This module exports the in-process storage used by the in-memory and
+file-backed repositories: per-model `key -> object` dicts plus secondary hash
+indexes, sorted indexes, spatial grids and membership bitmaps that are kept
+up to date on every mutation. Objects are keyed by id, link models without
+an id of their own by the tuple of their composite primary key.
+"""
+
+import heapq
+import logging
+import math
+import uuid
+from itertools import islice
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from src.models.base import Base
+from src.persistence.repository import (
+    KEYSET_FIELDS, TOP, matches, parse_order_by, parse_where, sort_objects,
+    sortable,
+)
+from utils.geo import bounding_box, haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Secondary indexes declared per model, as tuples of attribute names
+SECONDARY_INDEXES: Dict[str, List[Tuple[str, ...]]] = {
+    "country": [("code",)],
+    "user": [("email",)],
+    "amenity": [("name",)],
+    "city": [("country_code",)],
+    "place": [("city_id",), ("host_id",)],
+    "review": [("place_id",), ("user_id",)],
+    "placeamenity": [
+        ("place_id", "amenity_id"), ("place_id",), ("amenity_id",),
+    ],
+}
+
+# Sorted indexes every model gets, used for keyset pagination
+DEFAULT_SORTED_INDEXES: List[Tuple[str, ...]] = [KEYSET_FIELDS]
+
+# Additional sorted indexes declared per model
+SORTED_INDEXES: Dict[str, List[Tuple[str, ...]]] = {
+    "place": [
+        ("price_per_night",), ("max_guests",), ("number_of_rooms",),
+        ("number_of_bathrooms",),
+    ],
+}
+
+# Query planning: the next candidate set is intersected while it is at most
+# INTERSECT_RATIO times the current one, otherwise its predicate is checked per
+# candidate. A sorted index is walked for ORDER BY ... LIMIT when the most
+# selective predicate still keeps more than WALK_SELECTIVITY of the objects.
+INTERSECT_RATIO = 4
+WALK_SELECTIVITY = 0.1
+
+# Spatial grid indexes declared per model, as (latitude, longitude) attribute
+# names
+SPATIAL_INDEXES: Dict[str, Tuple[str, str]] = {
+    "place": ("latitude", "longitude"),
+}
+
+# Bitmap indexes declared per link model, as (owner, member) attribute names.
+# Members get dense bit positions, and every owner an int with the bits of
+# the members it is linked to, so "linked to all of" is one AND per owner.
+BITMAP_INDEXES: Dict[str, Tuple[str, str]] = {
+    "placeamenity": ("place_id", "amenity_id"),
+}
+
+# Link models keyed by their composite primary key instead of an id
+COMPOSITE_KEYS: Dict[str, Tuple[str, ...]] = {
+    "placeamenity": ("place_id", "amenity_id"),
+}
+
+# Side of a grid cell in degrees, about 11 km of latitude
+GRID_CELL_DEGREES = 0.1
+GRID_COLUMNS = math.ceil(360 / GRID_CELL_DEGREES)
+
+
+def grid_cell(lat: float, lon: float) -> Tuple[int, int]:
+    """Return the (row, column) of the grid cell holding a point."""
+    row = math.floor((lat + 90) / GRID_CELL_DEGREES)
+    column = math.floor((lon + 180) / GRID_CELL_DEGREES) % GRID_COLUMNS
+    return row, column
+
+
+def model_key(model) -> str:
+    """
+    Return the storage key of a model given as a name, a class or an instance.
+    """
+    if isinstance(model, str):
+        return model
+    if isinstance(model, type):
+        return model.__name__.lower()
+    return model.__class__.__name__.lower()
+
+
+def key_fields(model) -> Tuple[str, ...]:
+    """Return the attributes identifying the objects of a model."""
+    return COMPOSITE_KEYS.get(model_key(model), ("id",))
+
+
+def object_key(obj, model=None):
+    """
+    Return the key of an object in its model: its id, or its composite primary
+    key.
+    """
+    fields = key_fields(obj if model is None else model)
+    if fields == ("id",):
+        return obj.id
+    return tuple(getattr(obj, field, None) for field in fields)
+
+
+def row_key(model, row: dict):
+    """Return the key of an object serialized as a dict."""
+    fields = key_fields(model)
+    if fields == ("id",):
+        return row.get("id")
+    return tuple(row.get(field) for field in fields)
+
+
+class IndexedStore:
+    """
+    Objects grouped by model and keyed by object_key, with hash indexes on the
+    attribute tuples declared in SECONDARY_INDEXES and membership bitmaps on
+    the link models declared in BITMAP_INDEXES.
+    """
+
+    def __init__(
+        self,
+        indexes: Optional[Dict[str, List[Tuple[str, ...]]]] = None,
+        sorted_indexes: Optional[Dict[str, List[Tuple[str, ...]]]] = None,
+        spatial_indexes: Optional[Dict[str, Tuple[str, str]]] = None,
+        bitmap_indexes: Optional[Dict[str, Tuple[str, str]]] = None,
+    ) -> None:
+        """Initialize an empty store with the given index declarations."""
+        self.__declared = SECONDARY_INDEXES if indexes is None else indexes
+        self.__declared_sorted = (
+            SORTED_INDEXES if sorted_indexes is None else sorted_indexes
+        )
+        self.__declared_spatial = (
+            SPATIAL_INDEXES if spatial_indexes is None else spatial_indexes
+        )
+        self.__declared_bitmaps = (
+            BITMAP_INDEXES if bitmap_indexes is None else bitmap_indexes
+        )
+        self.__objects: Dict[str, Dict[str, Base]] = {}
+        # model -> fields -> key -> {id: obj}
+        self.__indexes: Dict[
+            str, Dict[Tuple[str, ...], Dict[tuple, Dict[str, Base]]]
+        ] = {}
+        # model -> fields -> id -> key, to unindex objects mutated in place
+        self.__keys: Dict[str, Dict[Tuple[str, ...], Dict[str, tuple]]] = {}
+        # model -> fields -> sorted list of (sortable values..., sortable id)
+        self.__sorted: Dict[str, Dict[Tuple[str, ...], List[tuple]]] = {}
+        # model -> fields -> id -> sorted key
+        self.__sorted_keys: Dict[
+            str, Dict[Tuple[str, ...], Dict[str, tuple]]
+        ] = {}
+        # model -> grid cell -> {id: obj}
+        self.__grids: Dict[str, Dict[Tuple[int, int], Dict[str, Base]]] = {}
+        # model -> id -> grid cell
+        self.__cells: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        # model -> owner -> bitmap of the members it is linked to
+        self.__bitmaps: Dict[str, Dict[Any, int]] = {}
+        # model -> member -> [bit position, number of owners linked to it]
+        self.__members: Dict[str, Dict[Any, List[int]]] = {}
+        # model -> heap of the bit positions released by members without owners
+        self.__free_bits: Dict[str, List[int]] = {}
+        # model -> (owner, member) -> number of link objects
+        self.__links: Dict[str, Dict[tuple, int]] = {}
+        # model -> object key -> (owner, member)
+        self.__linked: Dict[str, Dict[str, tuple]] = {}
+        # model -> number of mutations, prefixed by an epoch unique to this
+        # store
+        self.__versions: Dict[str, int] = {}
+        self.__epoch = uuid.uuid4().hex[:8]
+        self.__bulk = False
+
+    def declare(self, model) -> Dict[str, Base]:
+        """Create the empty collections for a model if needed."""
+        model = model_key(model)
+        if model not in self.__objects:
+            self.__objects[model] = {}
+            fields_list = self.__declared.get(model, [])
+            self.__indexes[model] = {fields: {} for fields in fields_list}
+            self.__keys[model] = {fields: {} for fields in fields_list}
+            sorted_list = (
+                DEFAULT_SORTED_INDEXES + self.__declared_sorted.get(model, [])
+            )
+            self.__sorted[model] = {fields: [] for fields in sorted_list}
+            self.__sorted_keys[model] = {fields: {} for fields in sorted_list}
+            if model in self.__declared_spatial:
+                self.__grids[model] = {}
+                self.__cells[model] = {}
+            if model in self.__declared_bitmaps:
+                self.__bitmaps[model] = {}
+                self.__members[model] = {}
+                self.__free_bits[model] = []
+                self.__links[model] = {}
+                self.__linked[model] = {}
+        return self.__objects[model]
+
+    def load(self, data: Dict[str, Iterable[Base]]) -> None:
+        """Replace the content of the store with lists of objects per model."""
+        self.clear()
+        # Sorted indexes are appended to, then sorted once per model
+        self.__bulk = True
+        try:
+            for model, objects in data.items():
+                self.declare(model)
+                for obj in objects:
+                    self.add(model, obj)
+        finally:
+            self.__bulk = False
+            for indexes in self.__sorted.values():
+                for keys in indexes.values():
+                    keys.sort()
+
+    def export(self) -> Dict[str, List[Base]]:
+        """Return the content of the store as lists of objects per model."""
+        return {
+            model: list(objects.values())
+            for model, objects in self.__objects.items()
+        }
+
+    def clear(self) -> None:
+        """Remove every object and index entry."""
+        for model in self.__objects:
+            self.__versions[model] = self.__versions.get(model, 0) + 1
+        self.__objects.clear()
+        self.__indexes.clear()
+        self.__keys.clear()
+        self.__sorted.clear()
+        self.__sorted_keys.clear()
+        self.__grids.clear()
+        self.__cells.clear()
+        self.__bitmaps.clear()
+        self.__members.clear()
+        self.__free_bits.clear()
+        self.__links.clear()
+        self.__linked.clear()
+
+    def version(self, model) -> str:
+        """
+        Return a value that changes whenever an object of the model is added,
+        replaced or removed.
+        """
+        return f"{self.__epoch}.{self.__versions.get(model_key(model), 0)}"
+
+    def models(self) -> List[str]:
+        """Return the names of the models held by the store."""
+        return list(self.__objects)
+
+    def all(self, model) -> List[Base]:
+        """Return all objects of a model."""
+        return list(self.__objects.get(model_key(model), {}).values())
+
+    def count(self, model) -> int:
+        """Return the number of objects of a model."""
+        return len(self.__objects.get(model_key(model), {}))
+
+    def get(self, model, obj_id) -> Optional[Base]:
+        """Return an object by key, or None."""
+        return self.__objects.get(model_key(model), {}).get(obj_id)
+
+    def add(self, model, obj: Base) -> None:
+        """Insert an object, or re-index it if its id is already present."""
+        model = model_key(model)
+        objects = self.declare(model)
+        obj_key = object_key(obj, model)
+        previous = objects.get(obj_key)
+        if previous is not None:
+            self.__unindex(model, previous)
+        objects[obj_key] = obj
+        self.__versions[model] = self.__versions.get(model, 0) + 1
+        for fields, entries in self.__indexes[model].items():
+            key = tuple(getattr(obj, field, None) for field in fields)
+            entries.setdefault(key, {})[obj_key] = obj
+            self.__keys[model][fields][obj_key] = key
+        for fields, keys in self.__sorted[model].items():
+            # The last element wraps the object key, kept raw after its
+            # sortable form
+            key = tuple(
+                sortable(getattr(obj, field, None)) for field in fields
+            ) + (sortable(obj_key) + (obj_key,),)
+            if self.__bulk:
+                keys.append(key)
+            else:
+                insort(keys, key)
+            self.__sorted_keys[model][fields][obj_key] = key
+        if model in self.__grids:
+            lat_field, lon_field = self.__declared_spatial[model]
+            lat = getattr(obj, lat_field, None)
+            lon = getattr(obj, lon_field, None)
+            if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+                cell = grid_cell(lat, lon)
+                self.__grids[model].setdefault(cell, {})[obj_key] = obj
+                self.__cells[model][obj_key] = cell
+        if model in self.__bitmaps:
+            self.__link(model, obj)
+
+    def discard(self, model, obj_id) -> bool:
+        """Remove an object by key. Return False if it was not stored."""
+        model = model_key(model)
+        obj = self.__objects.get(model, {}).pop(obj_id, None)
+        if obj is None:
+            return False
+        self.__unindex(model, obj)
+        self.__versions[model] = self.__versions.get(model, 0) + 1
+        return True
+
+    def find(self, model, **criteria) -> List[Base]:
+        """
+        Return the objects whose attributes equal the given criteria.
+        The narrowest matching index is used, the remaining criteria are
+        checked on its candidates.
+        """
+        model = model_key(model)
+        if not criteria:
+            return self.all(model)
+        candidates = None
+        for fields, entries in self.__indexes.get(model, {}).items():
+            if set(fields) <= criteria.keys():
+                key = tuple(criteria[field] for field in fields)
+                bucket = entries.get(key, {})
+                if candidates is None or len(bucket) < len(candidates):
+                    candidates = bucket
+        if candidates is None:
+            candidates = self.__objects.get(model, {})
+        return [
+            obj for obj in candidates.values()
+            if all(
+                getattr(obj, field, None) == value
+                for field, value in criteria.items()
+            )
+        ]
+
+    def has_sorted_index(self, model, fields: Tuple[str, ...]) -> bool:
+        """Check whether a sorted index is declared on the given fields."""
+        return tuple(fields) in self.__sorted.get(model_key(model), {})
+
+    def scan(self, model, fields: Tuple[str, ...],
+             start: Optional[tuple] = None, stop: Optional[tuple] = None,
+             include_start: bool = True, include_stop: bool = True,
+             reverse: bool = False) -> Iterator[Base]:
+        """
+        Yield objects in the order of a sorted index, between optional bounds.
+        Bounds are tuples of raw values and may be prefixes of the indexed
+        fields.
+        """
+        model = model_key(model)
+        keys = self.__sorted[model][tuple(fields)]
+        objects = self.__objects[model]
+        low, high = self.__positions(
+            keys, start, stop, include_start, include_stop
+        )
+        if reverse:
+            positions = range(high - 1, low - 1, -1)
+        else:
+            positions = range(low, high)
+        for position in positions:
+            # The last element of a key wraps the object key
+            yield objects[keys[position][-1][-1]]
+
+    def count_range(self, model, fields: Tuple[str, ...],
+                    start: Optional[tuple] = None,
+                    stop: Optional[tuple] = None,
+                    include_start: bool = True,
+                    include_stop: bool = True) -> int:
+        """
+        Count the objects of a sorted index between bounds, without visiting
+        them.
+        """
+        keys = self.__sorted[model_key(model)][tuple(fields)]
+        low, high = self.__positions(
+            keys, start, stop, include_start, include_stop
+        )
+        return max(0, high - low)
+
+    @staticmethod
+    def __positions(keys: List[tuple], start: Optional[tuple],
+                    stop: Optional[tuple], include_start: bool,
+                    include_stop: bool) -> Tuple[int, int]:
+        """Bisect the slice of a sorted index lying between bounds."""
+        low = 0
+        if start is not None:
+            start_key = tuple(sortable(value) for value in start)
+            if include_start:
+                low = bisect_left(keys, start_key)
+            else:
+                low = bisect_right(keys, start_key + (TOP,))
+        high = len(keys)
+        if stop is not None:
+            stop_key = tuple(sortable(value) for value in stop)
+            if include_stop:
+                high = bisect_right(keys, stop_key + (TOP,))
+            else:
+                high = bisect_left(keys, stop_key)
+        return low, max(low, high)
+
+    def select(self, model, where: Optional[Dict[str, Any]] = None,
+               order_by=None, limit: Optional[int] = None,
+               offset: Optional[int] = None) -> List[Base]:
+        """
+        Answer a Repository.query from the indexes. Every predicate an index
+        can serve is costed first, from bucket sizes and bisected range counts,
+        without visiting objects. The cheapest one drives, the next ones are
+        intersected while they stay comparably small, and every condition is
+        then checked on the remaining candidates.
+        """
+        model = model_key(model)
+        objects = self.__objects.get(model, {})
+        conditions = parse_where(where)
+        order = parse_order_by(order_by)
+        plans = sorted(
+            self.__plan(model, conditions), key=lambda plan: plan[0]
+        )
+        start = offset or 0
+
+        if (len(order) == 1 and limit is not None
+                and self.has_sorted_index(model, (order[0][0],))
+                and (not plans
+                     or plans[0][0] > len(objects) * WALK_SELECTIVITY)):
+            # Walking the sort index stops after offset + limit matches
+            field, descending = order[0]
+            walk = (
+                obj
+                for obj in self.scan(model, (field,), reverse=descending)
+                if matches(obj, conditions)
+            )
+            return list(islice(walk, start, start + limit))
+
+        candidates = objects
+        if plans:
+            candidates = plans[0][1]()
+            for estimate, fetch in plans[1:]:
+                if estimate > len(candidates) * INTERSECT_RATIO:
+                    break
+                other = fetch()
+                candidates = {
+                    obj_id: obj for obj_id, obj in candidates.items()
+                    if obj_id in other
+                }
+        results = [
+            obj for obj in candidates.values() if matches(obj, conditions)
+        ]
+        sort_objects(results, order)
+        if limit is not None:
+            return results[start:start + limit]
+        return results[start:]
+
+    def __plan(self, model: str, conditions: list) -> list:
+        """
+        Return (estimated size, fetch candidates) for every condition an index
+        can serve.
+        """
+        plans = []
+        indexes = self.__indexes.get(model, {})
+        equalities = {
+            field: value for field, op, value in conditions if op == "eq"
+        }
+        for fields, entries in indexes.items():
+            if set(fields) <= equalities.keys():
+                key = tuple(equalities[field] for field in fields)
+                bucket = entries.get(key, {})
+                plans.append((len(bucket), lambda bucket=bucket: bucket))
+        objects = self.__objects.get(model, {})
+        for field, op, values in conditions:
+            if op == "in" and field == "id":
+                plans.append((len(values), lambda values=values: {
+                    obj_id: objects[obj_id]
+                    for obj_id in values if obj_id in objects
+                }))
+            elif op == "in" and (field,) in indexes:
+                buckets = [
+                    indexes[(field,)].get((value,), {}) for value in values
+                ]
+                plans.append((sum(map(len, buckets)),
+                              lambda buckets=buckets: {
+                                  k: v
+                                  for bucket in buckets
+                                  for k, v in bucket.items()
+                              }))
+
+        # field -> [start, include_start, stop, include_stop], tightened by
+        # every condition on it
+        bounds = {}
+        for field, op, value in conditions:
+            if (op not in ("eq", "lt", "lte", "gt", "gte")
+                    or (field,) not in self.__sorted.get(model, {})):
+                continue
+            bound = bounds.setdefault(field, [None, True, None, True])
+            if op in ("eq", "gt", "gte"):
+                inclusive = op != "gt"
+                if (bound[0] is None or sortable(value) > sortable(bound[0][0])
+                        or (sortable(value) == sortable(bound[0][0])
+                            and not inclusive)):
+                    bound[0], bound[1] = (value,), inclusive
+            if op in ("eq", "lt", "lte"):
+                inclusive = op != "lt"
+                if (bound[2] is None or sortable(value) < sortable(bound[2][0])
+                        or (sortable(value) == sortable(bound[2][0])
+                            and not inclusive)):
+                    bound[2], bound[3] = (value,), inclusive
+        for field, bound in bounds.items():
+            start, include_start, stop, include_stop = bound
+            estimate = self.count_range(
+                model, (field,), start, stop, include_start, include_stop
+            )
+            plans.append((estimate, lambda field=field, start=start,
+                          stop=stop, include_start=include_start,
+                          include_stop=include_stop: {
+                              object_key(obj, model): obj
+                              for obj in self.scan(
+                                  model, (field,), start, stop,
+                                  include_start, include_stop,
+                              )
+                          }))
+        return plans
+
+    def page(self, model, limit: int, after: Optional[tuple] = None,
+             where: Optional[Dict[str, Any]] = None) -> List[Base]:
+        """
+        Return up to limit objects in (created_at, id) order, strictly after a
+        key. Equality conditions or an id IN list narrow the candidates first,
+        otherwise the sorted index is walked and stops as soon as the page is
+        full.
+        """
+        model = model_key(model)
+        if model not in self.__objects:
+            return []
+        conditions = parse_where(where)
+        equalities = {
+            field: value for field, op, value in conditions if op == "eq"
+        }
+        ids = next((
+            value for field, op, value in conditions
+            if field == "id" and op == "in"
+        ), None)
+        if not equalities and ids is None:
+            scan = self.scan(
+                model, KEYSET_FIELDS, start=after, include_start=False
+            )
+            return list(islice(
+                (obj for obj in scan if matches(obj, conditions)), limit
+            ))
+        if equalities:
+            candidates = self.find(model, **equalities)
+        else:
+            objects = self.__objects[model]
+            candidates = [
+                objects[obj_id] for obj_id in set(ids) if obj_id in objects
+            ]
+        sorted_keys = self.__sorted_keys[model][KEYSET_FIELDS]
+        candidates.sort(key=lambda obj: sorted_keys[object_key(obj, model)])
+        if after is not None:
+            bound = tuple(sortable(value) for value in after) + (TOP,)
+            keys = [sorted_keys[object_key(obj, model)] for obj in candidates]
+            candidates = candidates[bisect_right(keys, bound):]
+        return list(islice(
+            (obj for obj in candidates if matches(obj, conditions)), limit
+        ))
+
+    def has_spatial_index(self, model) -> bool:
+        """Check whether a spatial grid index is declared for a model."""
+        return model_key(model) in self.__declared_spatial
+
+    def nearby(self, model, lat: float, lon: float, radius_km: float,
+               limit: int) -> List[Tuple[Base, float]]:
+        """
+        Return up to limit (object, distance in km) pairs within radius_km of a
+        point, nearest first. Only the grid cells overlapping the bounding box
+        of the circle are visited, or the occupied cells when there are fewer
+        of those.
+        """
+        model = model_key(model)
+        grid = self.__grids.get(model)
+        if not grid:
+            return []
+        lat_field, lon_field = self.__declared_spatial[model]
+        min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+        rows = range(grid_cell(min_lat, 0)[0], grid_cell(max_lat, 0)[0] + 1)
+        columns = set()
+        for low, high in lon_ranges:
+            first = math.floor((low + 180) / GRID_CELL_DEGREES)
+            last = math.floor((high + 180) / GRID_CELL_DEGREES)
+            columns.update(
+                column % GRID_COLUMNS for column in range(first, last + 1)
+            )
+        if len(rows) * len(columns) <= len(grid):
+            buckets = (
+                grid.get((row, column)) for row in rows for column in columns
+            )
+        else:
+            buckets = (
+                bucket for (row, column), bucket in grid.items()
+                if row in rows and column in columns
+            )
+        candidates = []
+        for bucket in buckets:
+            if not bucket:
+                continue
+            for obj in bucket.values():
+                distance = haversine_km(
+                    lat, lon, getattr(obj, lat_field), getattr(obj, lon_field)
+                )
+                if distance <= radius_km:
+                    candidates.append(
+                        (distance, sortable(object_key(obj, model)), obj)
+                    )
+        return [
+            (obj, distance)
+            for distance, _, obj in heapq.nsmallest(limit, candidates)
+        ]
+
+    def has_bitmap_index(self, model, owner_field: str,
+                         member_field: str) -> bool:
+        """
+        Check whether a bitmap index is declared on a link model for the given
+        attributes.
+        """
+        declared = self.__declared_bitmaps.get(model_key(model))
+        return declared == (owner_field, member_field)
+
+    def owners_with_all(self, model, members: Iterable) -> set:
+        """
+        Return the owners linked to every given member through a bitmap index.
+        Only the owners of the rarest member are checked when its links are
+        hash indexed, otherwise every bitmap is.
+        """
+        model = model_key(model)
+        entries = self.__members.get(model, {})
+        mask, rarest = 0, None
+        for member in set(members):
+            entry = entries.get(member)
+            if entry is None:
+                return set()
+            mask |= 1 << entry[0]
+            if rarest is None or entry[1] < entries[rarest][1]:
+                rarest = member
+        if rarest is None:
+            return set()
+        bitmaps = self.__bitmaps[model]
+        links = self.__indexes[model].get((self.__declared_bitmaps[model][1],))
+        if links is not None:
+            linked = self.__linked[model]
+            owners = {
+                linked[obj_id][0]
+                for obj_id in links.get((rarest,), {}) if obj_id in linked
+            }
+        else:
+            owners = bitmaps.keys()
+        return {
+            owner for owner in owners if bitmaps.get(owner, 0) & mask == mask
+        }
+
+    def __unindex(self, model: str, obj: Base) -> None:
+        """Remove an object from the secondary indexes of its model."""
+        obj_key = object_key(obj, model)
+        for fields, entries in self.__indexes[model].items():
+            key = self.__keys[model][fields].pop(obj_key, None)
+            bucket = entries.get(key)
+            if bucket is not None:
+                bucket.pop(obj_key, None)
+                if not bucket:
+                    del entries[key]
+        for fields, keys in self.__sorted[model].items():
+            key = self.__sorted_keys[model][fields].pop(obj_key, None)
+            if key is not None and self.__bulk:
+                # Not sorted yet while loading
+                keys.remove(key)
+            elif key is not None:
+                position = bisect_left(keys, key)
+                if position < len(keys) and keys[position] == key:
+                    del keys[position]
+        if model in self.__grids:
+            cell = self.__cells[model].pop(obj_key, None)
+            bucket = self.__grids[model].get(cell)
+            if bucket is not None:
+                bucket.pop(obj_key, None)
+                if not bucket:
+                    del self.__grids[model][cell]
+        if model in self.__bitmaps:
+            self.__unlink(model, obj)
+
+    def __link(self, model: str, obj: Base) -> None:
+        """Set the bit of a link object's member in the bitmap of its owner."""
+        owner_field, member_field = self.__declared_bitmaps[model]
+        owner = getattr(obj, owner_field, None)
+        member = getattr(obj, member_field, None)
+        if owner is None or member is None:
+            return
+        self.__linked[model][object_key(obj, model)] = (owner, member)
+        links = self.__links[model]
+        links[(owner, member)] = links.get((owner, member), 0) + 1
+        if links[(owner, member)] > 1:
+            # Duplicate link, the bit is already set
+            return
+        entry = self.__members[model].get(member)
+        if entry is None:
+            free_bits = self.__free_bits[model]
+            if free_bits:
+                position = heapq.heappop(free_bits)
+            else:
+                position = len(self.__members[model])
+            entry = self.__members[model][member] = [position, 0]
+        entry[1] += 1
+        bitmaps = self.__bitmaps[model]
+        bitmaps[owner] = bitmaps.get(owner, 0) | (1 << entry[0])
+
+    def __unlink(self, model: str, obj: Base) -> None:
+        """
+        Clear the bit of a removed link object once no other object links the
+        same pair.
+        """
+        pair = self.__linked[model].pop(object_key(obj, model), None)
+        if pair is None:
+            return
+        links = self.__links[model]
+        links[pair] -= 1
+        if links[pair]:
+            return
+        del links[pair]
+        owner, member = pair
+        entry = self.__members[model][member]
+        bitmaps = self.__bitmaps[model]
+        bitmaps[owner] &= ~(1 << entry[0])
+        if not bitmaps[owner]:
+            del bitmaps[owner]
+        entry[1] -= 1
+        if not entry[1]:
+            # Released positions are reused first, which keeps them dense
+            del self.__members[model][member]
+            heapq.heappush(self.__free_bits[model], entry[0])
@@ -5,8 +5,10 @@ it only stores it in memory.
 
 from datetime import datetime
 import logging
+import threading
 from typing import Dict, Type, Optional
 from src.models.base import Base
+from src.persistence.indexes import IndexedStore, model_key, object_key
 from src.persistence.repository import Repository
 from utils.populate import populate_db
 
@@ -21,24 +23,62 @@ class MemoryRepository(Repository):
 
     def __init__(self) -> None:
         """Initialize the repository and populate it with initial data."""
-        self.__data: Dict[str, Dict[str, Base]] = {
-            "country": {},
-            "user": {},
-            "amenity": {},
-            "city": {},
-            "review": {},
-            "place": {},
-            "placeamenity": {},
-        }
+        self.__data = IndexedStore()
+        # Serializes the read-modify-write of increment
+        self.__lock = threading.RLock()
+        for model in ("country", "user", "amenity", "city", "review", "place",
+                      "placeamenity"):
+            self.__data.declare(model)
         self.reload()
 
     def get_all(self, model_name: str) -> list:
         """Return all objects of a given model."""
-        return list(self.__data.get(model_name, {}).values())
+        return self.__data.all(model_name)
 
     def get(self, model_name: str, obj_id: str) -> Optional[Base]:
         """Retrieve an object by its ID."""
-        return self.__data.get(model_name, {}).get(obj_id)
+        return self.__data.get(model_name, obj_id)
+
+    def find_by(self, model_name: str, **criteria) -> list:
+        """
+        Return the objects matching the criteria using the secondary indexes.
+        """
+        return self.__data.find(model_name, **criteria)
+
+    def query(self, model_name: str, where=None, order_by=None, limit=None,
+              offset=None, fields=None) -> list:
+        """Plan the query over the hash and sorted indexes of the store."""
+        return self.__data.select(model_name, where, order_by, limit, offset)
+
+    def page(self, model_name: str, limit: int, after=None, where=None,
+             fields=None) -> list:
+        """
+        Return one page of objects by walking the sorted (created_at, id)
+        index.
+        """
+        return self.__data.page(model_name, limit, after, where)
+
+    def nearby(self, model_name: str, lat: float, lon: float,
+               radius_km: float, limit: int) -> list:
+        """Search the spatial grid index of the store."""
+        if not self.__data.has_spatial_index(model_name):
+            return super().nearby(model_name, lat, lon, radius_km, limit)
+        return self.__data.nearby(model_name, lat, lon, radius_km, limit)
+
+    def owners_with_all(self, model_name: str, owner_field: str,
+                        member_field: str, members) -> set:
+        """AND the member bitmaps of the store's bitmap index."""
+        if not self.__data.has_bitmap_index(
+            model_name, owner_field, member_field
+        ):
+            return super().owners_with_all(
+                model_name, owner_field, member_field, members
+            )
+        return self.__data.owners_with_all(model_name, members)
+
+    def collection_version(self, model_name: str) -> str:
+        """Return the mutation counter the store keeps per model."""
+        return self.__data.version(model_name)
 
     def reload(self) -> None:
         """Populates the repository with initial data."""
@@ -50,33 +90,43 @@ class MemoryRepository(Repository):
 
     def save(self, obj: Base) -> None:
         """Save an object to the repository, ensuring no duplicate IDs."""
-        cls = obj.__class__.__name__.lower()
-        obj_dict = self.__data.setdefault(cls, {})
-        if obj.id in obj_dict:
-            logger.warning(f"Duplicate ID detected for {cls} with ID {obj.id}. Object not saved.")
+        cls = model_key(obj)
+        key = object_key(obj)
+        if self.__data.get(cls, key) is not None:
+            logger.warning(
+                f"Duplicate ID detected for {cls} with key {key}. "
+                "Object not saved."
+            )
             return
-        obj_dict[obj.id] = obj
-        logger.debug(f"Object saved: {cls} with ID {obj.id}")
+        self.__data.add(cls, obj)
+        logger.debug(f"Object saved: {cls} with key {key}")
 
     def update(self, obj: Base) -> Optional[Base]:
         """Update an existing object."""
-        cls = obj.__class__.__name__.lower()
-        obj_dict = self.__data.get(cls, {})
-        if obj.id in obj_dict:
-            obj.updated_at = datetime.now()
-            obj_dict[obj.id] = obj
-            logger.debug(f"Object updated: {cls} with ID {obj.id}")
+        cls = model_key(obj)
+        key = object_key(obj)
+        if self.__data.get(cls, key) is not None:
+            obj.updated_at = datetime.utcnow()
+            self.__data.add(cls, obj)
+            logger.debug(f"Object updated: {cls} with key {key}")
             return obj
-        logger.warning(f"Object not found for update: {cls} with ID {obj.id}")
+        logger.warning(f"Object not found for update: {cls} with key {key}")
         return None
 
     def delete(self, obj: Base) -> bool:
         """Remove an object from the repository."""
-        cls = obj.__class__.__name__.lower()
-        if obj.id in self.__data.get(cls, {}):
-            del self.__data[cls][obj.id]
-            logger.debug(f"Object deleted: {cls} with ID {obj.id}")
+        cls = model_key(obj)
+        key = object_key(obj)
+        if self.__data.discard(cls, key):
+            logger.debug(f"Object deleted: {cls} with key {key}")
             return True
-        logger.warning(f"Object not found for deletion: {cls} with ID {obj.id}")
+        logger.warning(f"Object not found for deletion: {cls} with key {key}")
         return False
 
+    def increment(self, model_name: str, obj_id: str, deltas: dict):
+        """
+        Add the deltas under the repository lock, so concurrent writers
+        cannot lose each other's increments.
+        """
+        with self.__lock:
+            super().increment(model_name, obj_id, deltas)
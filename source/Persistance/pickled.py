@@ -1,84 +1,505 @@
 """
-This module exports a Repository that persists data in a pickle file.
+This module exports a Repository that persists data in pickle files.
+
+Data is sharded per model, and optionally per id-hash bucket, under a
+directory next to PICKLE_STORAGE_FILENAME. Only shards touched since the
+last save are re-pickled, and shards are unpickled on first access.
+
+When writes happen is governed by STORAGE_DURABILITY (see flusher.py).
 """
 
+import os
 import pickle
 import logging
+import shutil
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from src.persistence.atomic import atomic_write
+from src.persistence.flusher import Flusher
+from src.persistence.indexes import IndexedStore, model_key, object_key
 from src.persistence.repository import Repository
-from utils.constants import PICKLE_STORAGE_FILENAME
+from utils.populate import populate_db
+from utils.constants import (
+    PICKLE_STORAGE_FILENAME, PICKLE_SHARD_BUCKETS, STORAGE_DURABILITY,
+)
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_FILENAME = "manifest.pkl"
+# Siblings of the shard directory while a reshard swaps the new layout in
+STAGING_SUFFIX = ".resharding"
+RETIRED_SUFFIX = ".retired"
+
 class PickleRepository(Repository):
     """Pickle Repository for more secure and optimized data handling."""
 
     def __init__(self) -> None:
         """Initialize the repository and load or populate data."""
         self.__filename = PICKLE_STORAGE_FILENAME
-        self.__data = {}
+        self.__directory = Path(PICKLE_STORAGE_FILENAME).with_suffix('.shards')
+        self.__buckets = max(1, PICKLE_SHARD_BUCKETS)
+        self.__data = IndexedStore()
+        self.__loaded = set()
+        self.__dirty = set()
+        # (model, bucket) -> ids of the objects held by that shard
+        self.__members = {}
+        self.__lock = threading.RLock()
         self.load_data()
+        self.__flusher = Flusher(
+            self.save_data, STORAGE_DURABILITY, name="pickle"
+        )
+        self.reload()
 
     def load_data(self):
-        """Load data from a pickle file or initialize with default data if the file does not exist."""
+        """
+        Open the shard directory, migrating a single-file pickle or
+        initializing default data.
+        """
         try:
-            with open(self.__filename, 'rb') as file:
-                self.__data = pickle.load(file, fix_imports=False)
-            logger.info("Data loaded successfully from the pickle file.")
-        except FileNotFoundError:
-            logger.warning("Pickle file not found, initializing with default data.")
-            self.__data = self.initialize_data()
-            self.save_data()
+            self.recover_layout()
+            manifest = self.__directory / MANIFEST_FILENAME
+            if manifest.exists():
+                with manifest.open('rb') as file:
+                    manifest_data = pickle.load(file, fix_imports=False)
+                stored_buckets = manifest_data["buckets"]
+                if stored_buckets != self.__buckets:
+                    self.reshard(stored_buckets)
+                logger.info(
+                    "Pickle shards opened, models will be loaded on first "
+                    "access."
+                )
+            elif os.path.exists(self.__filename):
+                self.migrate_single_file()
+            else:
+                logger.warning(
+                    "Pickle shards not found, initializing with default data."
+                )
+                self.__data.load(self.initialize_data())
+                self.index_shards()
+                self.__loaded.update(
+                    (model, bucket)
+                    for model in self.__data.models()
+                    for bucket in range(self.__buckets)
+                )
+                self.save_data()
         except pickle.PickleError as e:
             logger.error(f"Failed to load data due to pickle error: {e}")
         except Exception as e:
             logger.error(f"An unexpected error occurred during data loading: {e}")
 
+    def migrate_single_file(self):
+        """Split a legacy single-file pickle into shards."""
+        with open(self.__filename, 'rb') as file:
+            self.__data.load(pickle.load(file, fix_imports=False))
+        self.index_shards()
+        for model in self.__data.models():
+            for bucket in range(self.__buckets):
+                self.__loaded.add((model, bucket))
+                self.__dirty.add((model, bucket))
+        self.save_data()
+        logger.info(
+            f"Migrated {self.__filename} to shards in {self.__directory}."
+        )
+
+    def reshard(self, stored_buckets: int):
+        """
+        Load every shard written with another bucket count and rewrite them.
+        The new layout is written to a staging directory and swapped in
+        whole, so the old shards stay untouched until it is complete; if
+        writing fails, the data stays in the old layout.
+        """
+        configured_buckets = self.__buckets
+        self.__buckets = stored_buckets
+        for model in self.shard_models():
+            self.ensure_model(model)
+        staging = self.sibling(STAGING_SUFFIX)
+        self.__buckets = configured_buckets
+        self.index_shards()
+        shards = {
+            (model, bucket)
+            for model in self.__data.models()
+            for bucket in range(self.__buckets)
+        }
+        try:
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir(parents=True)
+            self.write_shards(staging, shards)
+            self.swap_in(staging)
+        except Exception as e:
+            logger.error(
+                f"Failed to reshard pickle data, keeping {stored_buckets} "
+                f"buckets: {e}"
+            )
+            shutil.rmtree(staging, ignore_errors=True)
+            self.__buckets = stored_buckets
+            self.index_shards()
+            return
+        self.__loaded = shards
+        self.__dirty.clear()
+        logger.info(
+            f"Resharded pickle data from {stored_buckets} to "
+            f"{self.__buckets} buckets."
+        )
+
+    def sibling(self, suffix: str) -> Path:
+        """Return a directory next to the shard directory."""
+        return self.__directory.with_name(self.__directory.name + suffix)
+
+    def swap_in(self, staging: Path):
+        """
+        Replace the shard directory with a complete one, then remove the old
+        shards.
+        """
+        retired = self.sibling(RETIRED_SUFFIX)
+        shutil.rmtree(retired, ignore_errors=True)
+        os.replace(self.__directory, retired)
+        os.replace(staging, self.__directory)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def recover_layout(self):
+        """
+        Finish a reshard interrupted between the two renames of swap_in, and
+        drop its leftovers.
+        """
+        staging = self.sibling(STAGING_SUFFIX)
+        retired = self.sibling(RETIRED_SUFFIX)
+        if not self.__directory.exists():
+            # The manifest is written last: a staging directory holding one is
+            # complete
+            for candidate in (staging, retired):
+                if (candidate / MANIFEST_FILENAME).exists():
+                    os.replace(candidate, self.__directory)
+                    logger.warning(
+                        f"Recovered pickle shards from {candidate.name}."
+                    )
+                    break
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def index_shards(self):
+        """Rebuild the shard membership of every object held by the store."""
+        self.__members = {}
+        for model in self.__data.models():
+            for obj in self.__data.all(model):
+                key = object_key(obj, model)
+                shard = (model, self.bucket(key))
+                self.__members.setdefault(shard, set()).add(key)
+
+    def shard_models(self) -> set:
+        """Return the models that have at least one shard on disk."""
+        return {
+            path.name.split('.')[0] for path in self.__directory.glob("*.pkl")
+            if path.name != MANIFEST_FILENAME
+        }
+
+    def bucket(self, obj_id) -> int:
+        """Return the bucket of an object key, stable across processes."""
+        if self.__buckets == 1:
+            return 0
+        return zlib.crc32(str(obj_id).encode()) % self.__buckets
+
+    def shard_path(self, model: str, bucket: int) -> Path:
+        """Return the file holding one shard."""
+        return self.__directory / f"{model}.{bucket}.pkl"
+
+    def ensure_shard(self, model: str, bucket: int):
+        """Unpickle a shard into memory the first time it is needed."""
+        if (model, bucket) in self.__loaded:
+            return
+        with self.__lock:
+            if (model, bucket) not in self.__loaded:
+                self.load_shard(model, bucket)
+
+    def load_shard(self, model: str, bucket: int):
+        """Read one shard file into the store."""
+        self.__data.declare(model)
+        path = self.shard_path(model, bucket)
+        try:
+            with path.open('rb') as file:
+                members = self.__members.setdefault((model, bucket), set())
+                for obj in pickle.load(file, fix_imports=False):
+                    self.__data.add(model, obj)
+                    members.add(object_key(obj, model))
+            logger.debug(f"Loaded pickle shard {path.name}.")
+        except FileNotFoundError:
+            pass
+        except pickle.PickleError as e:
+            logger.error(
+                f"Failed to load shard {path.name} due to pickle error: {e}"
+            )
+        self.__loaded.add((model, bucket))
+
+    def ensure_model(self, model: str):
+        """Unpickle every shard of a model."""
+        for bucket in range(self.__buckets):
+            self.ensure_shard(model, bucket)
+
     def save_data(self):
-        """Save the serialized data to a pickle file securely."""
+        """
+        Save the shards modified since the last save to their pickle files.
+        """
+        with self.__lock:
+            self.save_dirty_shards()
+
+    def save_dirty_shards(self):
+        """Pickle every dirty shard and the manifest."""
         try:
-            with open(self.__filename, 'wb') as file:
-                pickle.dump(self.__data, file, protocol=pickle.HIGHEST_PROTOCOL)
-            logger.info("Data saved successfully to the pickle file.")
+            self.write_shards(self.__directory, self.__dirty)
+            logger.info(f"Saved {len(self.__dirty)} pickle shard(s).")
+            self.__dirty.clear()
         except pickle.PickleError as e:
             logger.error(f"Failed to save data due to pickle error: {e}")
         except Exception as e:
             logger.error(f"An unexpected error occurred during data saving: {e}")
 
+    def write_shards(self, directory: Path, shards):
+        """
+        Pickle the given shards into a directory, then the manifest, raising on
+        failure.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        for model, bucket in sorted(shards):
+            objects = [
+                self.__data.get(model, obj_id)
+                for obj_id in self.__members.get((model, bucket), ())
+            ]
+            atomic_write(
+                directory / self.shard_path(model, bucket).name,
+                lambda file: pickle.dump(
+                    objects, file, protocol=pickle.HIGHEST_PROTOCOL
+                ),
+                binary=True,
+            )
+        atomic_write(
+            directory / MANIFEST_FILENAME,
+            lambda file: pickle.dump(
+                {"buckets": self.__buckets}, file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            ),
+            binary=True,
+        )
+
+    def store(self, model: str, bucket: int, obj):
+        """
+        Add or re-index an object, recording it in its shard, which becomes
+        dirty.
+        """
+        self.__data.add(model, obj)
+        self.__members.setdefault((model, bucket), set()).add(
+            object_key(obj, model)
+        )
+        self.__dirty.add((model, bucket))
+
+    def unstore(self, model: str, bucket: int, obj_id) -> bool:
+        """
+        Remove an object from the store and its shard. Return False if it was
+        not stored.
+        """
+        if not self.__data.discard(model, obj_id):
+            return False
+        self.__members.get((model, bucket), set()).discard(obj_id)
+        self.__dirty.add((model, bucket))
+        return True
+
+    @contextmanager
+    def transaction(self):
+        """Re-pickle the shards touched by a block once, when it exits."""
+        with self.__flusher.deferred():
+            yield
+
+    def close(self):
+        """Drain pending writes, used on graceful shutdown."""
+        self.__flusher.close()
+
     def get_all(self, model_name: str) -> list:
         """Return all objects of a given model from the memory."""
-        return self.__data.get(model_name, [])
+        model = model_key(model_name)
+        self.ensure_model(model)
+        return self.__data.all(model)
 
     def get(self, model_name: str, obj_id: str):
         """Retrieve an object by its ID from the stored data."""
-        for obj in self.get_all(model_name):
-            if obj.id == obj_id:
-                return obj
-        return None
+        model = model_key(model_name)
+        self.ensure_shard(model, self.bucket(obj_id))
+        return self.__data.get(model, obj_id)
+
+    def find_by(self, model_name: str, **criteria) -> list:
+        """
+        Return the objects matching the criteria using the secondary indexes.
+        """
+        model = model_key(model_name)
+        self.ensure_model(model)
+        return self.__data.find(model, **criteria)
+
+    def query(self, model_name: str, where=None, order_by=None, limit=None,
+              offset=None, fields=None) -> list:
+        """Plan the query over the hash and sorted indexes of the store."""
+        model = model_key(model_name)
+        self.ensure_model(model)
+        with self.__lock:
+            return self.__data.select(model, where, order_by, limit, offset)
+
+    def page(self, model_name: str, limit: int, after=None, where=None,
+             fields=None) -> list:
+        """
+        Return one page of objects by walking the sorted (created_at, id)
+        index.
+        """
+        model = model_key(model_name)
+        self.ensure_model(model)
+        with self.__lock:
+            return self.__data.page(model, limit, after, where)
+
+    def nearby(self, model_name: str, lat: float, lon: float,
+               radius_km: float, limit: int) -> list:
+        """Search the spatial grid index of the store."""
+        if not self.__data.has_spatial_index(model_name):
+            return super().nearby(model_name, lat, lon, radius_km, limit)
+        model = model_key(model_name)
+        self.ensure_model(model)
+        with self.__lock:
+            return self.__data.nearby(model, lat, lon, radius_km, limit)
+
+    def owners_with_all(self, model_name: str, owner_field: str,
+                        member_field: str, members) -> set:
+        """AND the member bitmaps of the store's bitmap index."""
+        if not self.__data.has_bitmap_index(
+            model_name, owner_field, member_field
+        ):
+            return super().owners_with_all(
+                model_name, owner_field, member_field, members
+            )
+        model = model_key(model_name)
+        self.ensure_model(model)
+        with self.__lock:
+            return self.__data.owners_with_all(model, members)
+
+    def collection_version(self, model_name: str) -> str:
+        """Return the mutation counter the store keeps per model."""
+        model = model_key(model_name)
+        self.ensure_model(model)
+        return self.__data.version(model)
 
     def save(self, obj, save_to_file=True):
         """Add a new object to the repository and optionally save to file."""
-        model = obj.__class__.__name__.lower()
-        self.__data.setdefault(model, []).append(obj)
+        model = model_key(obj)
+        bucket = self.bucket(object_key(obj))
+        self.ensure_shard(model, bucket)
+        with self.__lock:
+            self.store(model, bucket, obj)
         if save_to_file:
-            self.save_data()
+            self.__flusher.mark_dirty()
 
     def update(self, obj):
         """Update an existing object in the repository and save changes."""
-        model = obj.__class__.__name__.lower()
-        for i, existing_obj in enumerate(self.__data[model]):
-            if existing_obj.id == obj.id:
-                self.__data[model][i] = obj
-                self.save_data()
+        model = model_key(obj)
+        bucket = self.bucket(object_key(obj))
+        self.ensure_shard(model, bucket)
+        with self.__lock:
+            if self.__data.get(model, object_key(obj)) is None:
                 return
+            # A new updated_at moves the ETag and Last-Modified of the object
+            obj.updated_at = datetime.utcnow()
+            # Re-adding refreshes the index entries of an object changed in
+            # place
+            self.store(model, bucket, obj)
+        self.__flusher.mark_dirty()
 
     def delete(self, obj) -> bool:
         """Remove an object from the repository and update the file."""
-        model = obj.__class__.__name__.lower()
-        if obj in self.__data[model]:
-            self.__data[model].remove(obj)
-            self.save_data()
-            return True
-        return False
+        model = model_key(obj)
+        bucket = self.bucket(object_key(obj))
+        self.ensure_shard(model, bucket)
+        with self.__lock:
+            if not self.unstore(model, bucket, object_key(obj)):
+                return False
+        self.__flusher.mark_dirty()
+        return True
+
+    def increment(self, model_name: str, obj_id: str, deltas: dict):
+        """
+        Add the deltas under the repository lock, so concurrent writers
+        cannot lose each other's increments.
+        """
+        with self.__lock:
+            super().increment(model_name, obj_id, deltas)
+
+    def save_all(self, objs: list):
+        """Add many objects and re-pickle the touched shards once."""
+        for obj in objs:
+            self.save(obj, save_to_file=False)
+        if objs:
+            self.__flusher.mark_dirty()
+
+    def get_many(self, model_name: str, ids: list) -> list:
+        """
+        Retrieve many objects by ID, loading only the buckets they live in.
+        """
+        objs = (self.get(model_name, obj_id) for obj_id in ids)
+        return [obj for obj in objs if obj is not None]
+
+    def update_many(self, objs: list):
+        """
+        Update many existing objects and re-pickle the touched shards once.
+        """
+        updated = []
+        for obj in objs:
+            model = model_key(obj)
+            bucket = self.bucket(object_key(obj))
+            self.ensure_shard(model, bucket)
+            with self.__lock:
+                if self.__data.get(model, object_key(obj)) is not None:
+                    obj.updated_at = datetime.utcnow()
+                    self.store(model, bucket, obj)
+                    updated.append(obj)
+        if updated:
+            self.__flusher.mark_dirty()
+        return updated
+
+    def delete_many(self, objs: list) -> int:
+        """Remove many objects and re-pickle the touched shards once."""
+        deleted = 0
+        for obj in objs:
+            model = model_key(obj)
+            bucket = self.bucket(object_key(obj))
+            self.ensure_shard(model, bucket)
+            with self.__lock:
+                if self.unstore(model, bucket, object_key(obj)):
+                    deleted += 1
+        if deleted:
+            self.__flusher.mark_dirty()
+        return deleted
+
+    def reload(self):
+        """
+        Seed the initial data sets, skipped when their fingerprints match.
+        """
+        try:
+            populate_db(self)
+        except Exception as e:
+            logger.error(f"Failed to populate data: {e}")
+
+    def get_seed_fingerprint(self, data_set: str):
+        """Fetch the fingerprint recorded when a data set was last seeded."""
+        from src.models.seed import SeedFingerprint
+        seed = self.get(SeedFingerprint, data_set)
+        return seed.fingerprint if seed else None
+
+    def set_seed_fingerprint(self, data_set: str, fingerprint: str):
+        """
+        Record the fingerprint of a seeded data set as an object of the store,
+        pickled after the shards of the seeded rows.
+        """
+        from src.models.seed import SeedFingerprint
+        seed = self.get(SeedFingerprint, data_set)
+        if seed:
+            seed.fingerprint = fingerprint
+            self.update(seed)
+        else:
+            self.save(SeedFingerprint(data_set, fingerprint, id=data_set))
 
     def initialize_data(self):
         """Initialize default data structure if the file is not found."""
@@ -91,4 +512,3 @@ class PickleRepository(Repository):
             "place": [],
             "placeamenity": [],
         }
-
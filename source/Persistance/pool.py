@@ -0,0 +1,165 @@
+"""
+This module exports the monitor of the DBRepository connection pool.
+
+The engine is built with a QueuePool subclass timing every checkout, from
+the request for a connection until one is handed over: near zero while the
+pool has idle connections, the time spent queued behind the other threads
+once DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW connections are checked out. Wait
+times are counted in a fixed-bucket histogram, next to the connections
+opened, closed and invalidated, the churn that recycling and pre-ping add.
+
+Read with the live occupancy of the pool, this tells whether a worker's
+pool is too small (waits and timeouts), too large (connections never
+checked out) or recycled too often (connections opened per checkout).
+"""
+
+import logging
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the wait time histogram buckets, in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Pool events counted, and the counter each one adds to
+COUNTED_EVENTS = {
+    "checkout": "checkouts",
+    "checkin": "checkins",
+    "connect": "connects",
+    "close": "closes",
+    "close_detached": "closes",
+    "invalidate": "invalidations",
+    "soft_invalidate": "invalidations",
+}
+
+
+class MonitoredQueuePool(QueuePool):
+    """
+    QueuePool reporting how long each checkout waited for a connection to its
+    monitor.
+    """
+
+    monitor: "PoolMonitor"
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Create the pool and make its occupancy visible to the monitor."""
+        super().__init__(*args, **kwargs)
+        self.monitor.track(self)
+
+    def connect(self):
+        """Check a connection out, timing the wait."""
+        started = time.monotonic()
+        try:
+            connection = super().connect()
+        except TimeoutError:
+            self.monitor.waited(time.monotonic() - started, timed_out=True)
+            raise
+        self.monitor.waited(time.monotonic() - started)
+        return connection
+
+
+class PoolMonitor:
+    """
+    Counters, wait time histogram and occupancy of the connection pools of one
+    app.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the counters and the pool class reporting to this monitor.
+        """
+        self.__lock = threading.Lock()
+        self.__pools = weakref.WeakSet()
+        self.__counters = {
+            "checkouts": 0, "checkins": 0, "connects": 0, "closes": 0,
+            "invalidations": 0, "timeouts": 0,
+        }
+        self.__buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.__wait_total = 0.0
+        self.__wait_max = 0.0
+        self.pool_class = type(
+            "MonitoredQueuePool", (MonitoredQueuePool,), {"monitor": self}
+        )
+        # Listening on the class covers the pools an engine recreates after a
+        # dispose
+        for name, counter in COUNTED_EVENTS.items():
+            event.listen(self.pool_class, name, self.__counter(counter))
+
+    def init_app(self, app) -> None:
+        """
+        Build the engine of a Flask app on the monitored pool and publish the
+        metrics. Runs before db.init_app, which creates the engine.
+        """
+        options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}
+        if "pool_size" in options and "poolclass" not in options:
+            # A copy: the options dict belongs to the config class
+            app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+                **options, "poolclass": self.pool_class,
+            }
+        metrics.register("db_pool", self.stats)
+
+    def track(self, pool: QueuePool) -> None:
+        """Include a pool in the occupancy figures for as long as it lives."""
+        with self.__lock:
+            self.__pools.add(pool)
+
+    def waited(self, seconds: float, timed_out: bool = False) -> None:
+        """Count one checkout wait."""
+        milliseconds = seconds * 1000
+        with self.__lock:
+            self.__buckets[bisect_left(WAIT_BUCKETS_MS, milliseconds)] += 1
+            self.__wait_total += seconds
+            self.__wait_max = max(self.__wait_max, seconds)
+            if timed_out:
+                self.__counters["timeouts"] += 1
+
+    def stats(self) -> dict:
+        """
+        Return the occupancy of the pools, the counters and the wait time
+        histogram.
+        """
+        with self.__lock:
+            pools = list(self.__pools)
+            counters = dict(self.__counters)
+            buckets = list(self.__buckets)
+            wait_total, wait_max = self.__wait_total, self.__wait_max
+        waits = sum(buckets)
+        churn = None
+        if counters["checkouts"]:
+            churn = round(counters["connects"] / counters["checkouts"], 3)
+        bounds = [str(bound) for bound in WAIT_BUCKETS_MS] + ["+Inf"]
+        return {
+            "size": sum(pool.size() for pool in pools),
+            "checked_out": sum(pool.checkedout() for pool in pools),
+            "checked_in": sum(pool.checkedin() for pool in pools),
+            # Negative while the pool has not opened pool_size connections yet
+            "overflow": sum(max(0, pool.overflow()) for pool in pools),
+            **counters,
+            # Connections opened per checkout: near 0 when connections are
+            # reused
+            "churn": churn,
+            "wait_ms": {
+                "buckets": dict(zip(bounds, buckets)),
+                "mean": round(wait_total / waits * 1000, 2) if waits else None,
+                "max": round(wait_max * 1000, 2) if waits else None,
+            },
+        }
+
+    def __counter(self, name: str):
+        """Return a pool event listener adding one to a counter."""
+        def count(*args) -> None:
+            """Add one to the counter."""
+            with self.__lock:
+                self.__counters[name] += 1
+        return count
+
+
+# Monitor shared by the whole application
+pool_monitor = PoolMonitor()
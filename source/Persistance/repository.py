@@ -1,16 +1,132 @@
+"""
+This module exports the Repository interface every storage implements,
+with the query helpers its implementations share.
+"""
+
+import operator
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
 from abc import ABC, abstractmethod
-from typing import TypeVar, Generic, List, Optional
+from typing import (
+    Any, Callable, Dict, TypeVar, Generic, Iterator, List, Optional, Sequence,
+    Set, Tuple, Union,
+)
 
 # Define a type variable that can be any type.
 T = TypeVar('T')
 
+# Fields ordering the pages returned by Repository.page
+KEYSET_FIELDS = ("created_at", "id")
+
+# Bounds comparing below and above every sortable value
+BOTTOM = (-1,)
+TOP = (9,)
+
+# Comparison suffixes accepted in `where` keys, e.g.
+# {"price_per_night__lte": 100}
+OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda value, values: value in values,
+}
+
+
+def parse_where(where: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Any]]:
+    """Split `where` keys into (field, operator, value) conditions."""
+    conditions = []
+    for key, value in (where or {}).items():
+        field, _, op = key.partition("__")
+        op = op or "eq"
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator '{op}' in '{key}'")
+        conditions.append((field, op, value))
+    return conditions
+
+
+def parse_order_by(
+    order_by: Union[str, Sequence[str], None]
+) -> List[Tuple[str, bool]]:
+    """
+    Split an order_by spec into (field, descending) pairs, '-field' meaning
+    descending.
+    """
+    if not order_by:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    return [(field.lstrip("-"), field.startswith("-")) for field in order_by]
+
+
+def matches(obj, conditions: List[Tuple[str, str, Any]]) -> bool:
+    """
+    Check an object against parsed conditions. None never satisfies a
+    comparison.
+    """
+    for field, op, value in conditions:
+        attribute = getattr(obj, field, None)
+        if attribute is None and op not in ("eq", "ne", "in"):
+            return False
+        if not OPERATORS[op](attribute, value):
+            return False
+    return True
+
+
+def sortable(value) -> tuple:
+    """
+    Wrap a value so values of different types compare without errors.
+    Datetimes and ISO strings share a rank so timestamps read back from JSON
+    sort with the ones created in this process.
+    """
+    if value is None:
+        return (0,)
+    if isinstance(value, (bool, int, float)):
+        return (1, value)
+    if isinstance(value, datetime):
+        return (2, value.isoformat())
+    if isinstance(value, str):
+        return (2, value)
+    return (3, str(value))
+
+
+def keyset_key(obj) -> tuple:
+    """Return the comparable (created_at, id) key of an object."""
+    return tuple(
+        sortable(getattr(obj, field, None)) for field in KEYSET_FIELDS
+    )
+
+
+def sort_objects(objs: List, order: List[Tuple[str, bool]]) -> List:
+    """Sort objects by several fields, None values first in ascending order."""
+    for field, descending in reversed(order):
+        # sortable() ranks None first and compares mixed types, such as ISO
+        # strings and datetimes
+        objs.sort(
+            key=lambda obj: sortable(getattr(obj, field, None)),
+            reverse=descending,
+        )
+    return objs
+
+
+class RolledBack(Exception):
+    """
+    Raised when the writes of a savepoint were undone because one of them
+    failed.
+    """
+
+
 class Repository(ABC, Generic[T]):
     """
     Abstract class for a repository pattern that provides an interface for data access and manipulation.
     This pattern abstracts the data access layer, allowing different implementations based on the data source.
 
     Attributes:
-        None
+        transactional (bool): Whether a transaction can undo the writes made in
+            it.
 
     Methods:
         reload: Reload or refresh data from the data source.
@@ -19,8 +135,39 @@ class Repository(ABC, Generic[T]):
         save: Save or persist an object in the data source.
         update: Update an existing object in the data source.
         delete: Remove an object from the data source.
+        find_by: Retrieve the objects whose attributes equal the given values.
+        save_all: Save many objects in one batch.
+        insert_many: Insert new objects given as column values in one batch.
+        get_many: Fetch many objects by their identifiers.
+        update_many: Update many objects in one batch.
+        delete_many: Remove many objects in one batch.
+        distinct_values: Retrieve the distinct values of one attribute of a
+            model.
+        get_seed_fingerprint: Fetch the fingerprint recorded for a seeded data
+            set.
+        set_seed_fingerprint: Record the fingerprint of a seeded data set.
+        query: Retrieve objects matching conditions, sorted and sliced by the
+            data source.
+        page: Retrieve the page of objects following a (created_at, id) key.
+        iter_all: Iterate over the objects of a model, fetched in chunks.
+        get_updated_at: Fetch the last modification time of one object.
+        collection_version: Fetch a value that changes whenever a model's
+            collection changes.
+        nearby: Retrieve the objects closest to a point within a radius.
+        increment: Add deltas to numeric attributes of one object.
+        owners_with_all: Retrieve the owners linked to every given member
+            through a link model.
+        detach: Return a copy of an object that can be kept across requests.
+        attach: Return an object kept by detach ready for use in the current
+            request.
+        transaction: Group the writes of a block into one commit or one flush.
+        savepoint: Undo the writes of a block alone when it fails inside a
+            transaction.
+        read_snapshot: Read many models as of one point in time.
     """
 
+    transactional = False
+
     @abstractmethod
     def reload(self) -> None:
         """
@@ -89,3 +236,408 @@ class Repository(ABC, Generic[T]):
         """
         pass
 
+    def find_by(self, model_name: str, **criteria) -> List[T]:
+        """
+        Retrieve the objects whose attributes equal the given values.
+        Backends with secondary indexes override this full scan.
+
+        Parameters:
+            model_name (str): The model type from which to retrieve the
+                objects.
+            **criteria: Attribute names and the values they must equal.
+
+        Returns:
+            List[T]: The matching objects.
+        """
+        return [
+            obj for obj in self.get_all(model_name)
+            if all(
+                getattr(obj, field, None) == value
+                for field, value in criteria.items()
+            )
+        ]
+
+    def save_all(self, objs: List[T]) -> None:
+        """
+        Save many objects in one batch.
+        Backends override this to use a single transaction or a single flush.
+
+        Parameters:
+            objs (List[T]): The objects to save.
+        """
+        for obj in objs:
+            self.save(obj)
+
+    def insert_many(self, model_name: str, rows: List[Dict[str, Any]],
+                    build: Optional[Callable[..., T]] = None) -> int:
+        """
+        Insert new objects given as dicts of column values, in one batch.
+        This default builds the objects, gives them an id and timestamps when
+        the row has none, and saves them with save_all; the database backend
+        inserts the rows without building objects.
+
+        Parameters:
+            model_name (type): The model class of the objects.
+            rows (List[dict]): The column values of each new object.
+            build (callable): Builds an object from the column values given as
+                keyword arguments, the model class itself by default.
+
+        Returns:
+            int: The number of objects inserted.
+        """
+        build = build or model_name
+        now = datetime.utcnow()
+        objs = []
+        for row in rows:
+            obj = build(**row)
+            if getattr(obj, "id", None) is None:
+                obj.id = str(uuid.uuid4())
+            for field in ("created_at", "updated_at"):
+                if getattr(obj, field, None) is None:
+                    setattr(obj, field, now)
+            objs.append(obj)
+        self.save_all(objs)
+        return len(objs)
+
+    def get_many(self, model_name: str, ids: List[str]) -> List[T]:
+        """
+        Fetch many objects by their identifiers.
+
+        Parameters:
+            model_name (str): The model type from which to retrieve the
+                objects.
+            ids (List[str]): The identifiers to look up.
+
+        Returns:
+            List[T]: The objects found, in the order of ids. Unknown ids are
+            skipped.
+        """
+        objs = (self.get(model_name, obj_id) for obj_id in ids)
+        return [obj for obj in objs if obj is not None]
+
+    def update_many(self, objs: List[T]) -> None:
+        """
+        Update many objects in one batch.
+
+        Parameters:
+            objs (List[T]): The objects to update.
+        """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, objs: List[T]) -> int:
+        """
+        Remove many objects in one batch.
+
+        Parameters:
+            objs (List[T]): The objects to delete.
+
+        Returns:
+            int: The number of objects deleted.
+        """
+        return sum(1 for obj in objs if self.delete(obj))
+
+    def distinct_values(self, model_name: str, field: str) -> Set:
+        """
+        Retrieve the distinct values of one attribute of a model.
+
+        Parameters:
+            model_name (str): The model type to read.
+            field (str): The attribute to collect.
+
+        Returns:
+            Set: The distinct values.
+        """
+        return {getattr(obj, field, None) for obj in self.get_all(model_name)}
+
+    def get_seed_fingerprint(self, data_set: str) -> Optional[str]:
+        """
+        Fetch the fingerprint recorded when a data set was last seeded.
+        Backends that do not persist data never record one.
+
+        Parameters:
+            data_set (str): The name of the seeded data set.
+
+        Returns:
+            Optional[str]: The fingerprint if one was recorded, otherwise None.
+        """
+        return None
+
+    def set_seed_fingerprint(self, data_set: str, fingerprint: str) -> None:
+        """
+        Record the fingerprint of a data set once it has been seeded.
+
+        Parameters:
+            data_set (str): The name of the seeded data set.
+            fingerprint (str): The fingerprint of the seeded content.
+        """
+        pass
+
+    def query(self, model_name: str, where: Optional[Dict[str, Any]] = None,
+              order_by: Union[str, Sequence[str], None] = None,
+              limit: Optional[int] = None, offset: Optional[int] = None,
+              fields: Optional[Sequence[str]] = None) -> List[T]:
+        """
+        Retrieve the objects matching conditions, sorted and sliced. Equality
+        conditions go through find_by so indexed backends only visit candidate
+        objects; the database backend translates the whole query to SQL.
+
+        Parameters:
+            model_name (str): The model type to query.
+            where (dict): Conditions keyed by field, with an optional operator
+                suffix: field__ne, __lt, __lte, __gt, __gte or __in.
+            order_by (str | list): Fields to sort by, prefixed with '-' for
+                descending order.
+            limit (int): Maximum number of objects to return.
+            offset (int): Number of objects to skip.
+            fields (list): The attributes the caller will read. The database
+                backend leaves the other columns unloaded; None loads every
+                column.
+
+        Returns:
+            List[T]: The matching objects.
+        """
+        conditions = parse_where(where)
+        equalities = {
+            field: value for field, op, value in conditions if op == "eq"
+        }
+        others = [
+            condition for condition in conditions if condition[1] != "eq"
+        ]
+        if equalities:
+            candidates = self.find_by(model_name, **equalities)
+        else:
+            candidates = self.get_all(model_name)
+        results = [obj for obj in candidates if matches(obj, others)]
+        sort_objects(results, parse_order_by(order_by))
+        start = offset or 0
+        if limit is not None:
+            return results[start:start + limit]
+        return results[start:]
+
+    def page(self, model_name: str, limit: int,
+             after: Optional[Tuple[Any, str]] = None,
+             where: Optional[Dict[str, Any]] = None,
+             fields: Optional[Sequence[str]] = None) -> List[T]:
+        """
+        Retrieve one page of objects in (created_at, id) order, for keyset
+        pagination. Unlike an offset, the position is given by the key of the
+        last object already returned, so each page costs the same however deep
+        it is.
+
+        Parameters:
+            model_name (str): The model type to page through.
+            limit (int): Maximum number of objects to return.
+            after (tuple): The (created_at, id) of the last object of the
+                previous page, or None for the first page.
+            where (dict): Conditions as accepted by query.
+            fields (list): The attributes the caller will read, as accepted by
+                query.
+
+        Returns:
+            List[T]: The objects of the page.
+        """
+        results = self.query(model_name, where=where)
+        results.sort(key=keyset_key)
+        if after is not None:
+            bound = tuple(sortable(value) for value in after)
+            results = [obj for obj in results if keyset_key(obj) > bound]
+        return results[:limit]
+
+    def iter_all(self, model_name: str, chunk_size: int = 500,
+                 where: Optional[Dict[str, Any]] = None,
+                 fields: Optional[Sequence[str]] = None) -> Iterator[T]:
+        """
+        Iterate over the objects of a model in (created_at, id) order, so
+        callers can stream large collections. This default runs the query and
+        sorts the matches once, then hands them out chunk by chunk; the
+        database backend overrides it with a server-side cursor.
+
+        Parameters:
+            model_name (str): The model type to iterate over.
+            chunk_size (int): Number of objects handed out per chunk.
+            where (dict): Conditions as accepted by query.
+            fields (list): The attributes the caller will read, as accepted by
+                query.
+
+        Yields:
+            T: The matching objects.
+        """
+        results = self.query(model_name, where=where, fields=fields)
+        results.sort(key=keyset_key)
+        for start in range(0, len(results), chunk_size):
+            yield from results[start:start + chunk_size]
+
+    def detach(self, obj: T) -> T:
+        """
+        Return a copy of an object that can be kept, e.g. by a cache, beyond
+        the current request. In-process backends hand out their stored objects,
+        so the object itself is returned.
+
+        Parameters:
+            obj (T): An object returned by this repository.
+
+        Returns:
+            T: The object to keep.
+        """
+        return obj
+
+    def attach(self, obj: T) -> T:
+        """
+        Return an object kept by detach ready for use in the current request.
+
+        Parameters:
+            obj (T): An object returned by detach.
+
+        Returns:
+            T: The object to hand to the caller.
+        """
+        return obj
+
+    def get_updated_at(self, model_name: str, obj_id: str) -> Optional[Any]:
+        """
+        Fetch the last modification time of one object, used to validate
+        conditional requests. Backends able to read it without loading the
+        whole object override this.
+
+        Parameters:
+            model_name (str): The model type of the object.
+            obj_id (str): The identifier of the object.
+
+        Returns:
+            The updated_at of the object, or None if it does not exist.
+        """
+        obj = self.get(model_name, obj_id)
+        return getattr(obj, "updated_at", None) if obj is not None else None
+
+    def collection_version(self, model_name: str) -> str:
+        """
+        Fetch a value that changes whenever an object of the model is created,
+        updated or deleted, used to validate conditional collection requests.
+
+        Parameters:
+            model_name (str): The model type to version.
+
+        Returns:
+            str: The current version of the collection.
+        """
+        objs = self.get_all(model_name)
+        latest = max(
+            (sortable(getattr(obj, "updated_at", None)) for obj in objs),
+            default=None,
+        )
+        return f"{len(objs)}.{latest}"
+
+    def increment(self, model_name: str, obj_id: str,
+                  deltas: Dict[str, Any]) -> None:
+        """
+        Add deltas to numeric attributes of one object, missing values counting
+        as 0. Used to maintain aggregates without recomputing them.
+
+        Parameters:
+            model_name (str): The model type of the object.
+            obj_id (str): The identifier of the object.
+            deltas (dict): The amount to add, keyed by attribute.
+        """
+        obj = self.get(model_name, obj_id)
+        if obj is None:
+            return
+        for field, delta in deltas.items():
+            setattr(obj, field, (getattr(obj, field, None) or 0) + delta)
+        self.update(obj)
+
+    def nearby(self, model_name: str, lat: float, lon: float, radius_km: float,
+               limit: int) -> List[Tuple[T, float]]:
+        """
+        Retrieve the objects within radius_km of a point, nearest first. This
+        default scans the collection; backends with a spatial index override
+        it.
+
+        Parameters:
+            model_name (str): The model type to search, which has latitude and
+                longitude.
+            lat (float): Latitude of the point.
+            lon (float): Longitude of the point.
+            radius_km (float): Search radius in kilometers.
+            limit (int): Maximum number of objects to return.
+
+        Returns:
+            List[Tuple[T, float]]: (object, distance in km) pairs.
+        """
+        from utils.geo import haversine_km
+
+        found = []
+        for obj in self.get_all(model_name):
+            if obj.latitude is None or obj.longitude is None:
+                continue
+            distance = haversine_km(lat, lon, obj.latitude, obj.longitude)
+            if distance <= radius_km:
+                found.append((obj, distance))
+        found.sort(key=lambda pair: pair[1])
+        return found[:limit]
+
+    def owners_with_all(self, model_name: str, owner_field: str,
+                        member_field: str, members: Sequence) -> Set:
+        """
+        Retrieve the owners linked to every given member through a link model,
+        e.g. the places having all of some amenities through PlaceAmenity.
+        This default intersects one lookup per member; backends with a bitmap
+        index or SQL override it.
+
+        Parameters:
+            model_name (str): The link model type.
+            owner_field (str): The attribute of the link holding the owner id.
+            member_field (str): The attribute of the link holding the member
+                id.
+            members (Sequence): The member ids every returned owner is linked
+                to.
+
+        Returns:
+            Set: The owner ids, empty when no member is given.
+        """
+        owners = None
+        for member in set(members):
+            links = self.find_by(model_name, **{member_field: member})
+            linked = {getattr(obj, owner_field) for obj in links}
+            owners = linked if owners is None else owners & linked
+            if not owners:
+                break
+        return owners or set()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group the writes made in a block: they are committed, or flushed to
+        storage, once when the block exits. When the block raises,
+        transactional backends undo them; the others keep the writes already
+        applied. This default applies every write at once.
+        """
+        yield
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Within a transaction, undo the writes of a block alone when it raises,
+        or when a write of the block fails, in which case RolledBack is raised.
+        This default undoes nothing.
+        """
+        yield
+
+    @contextmanager
+    def read_snapshot(self, model_names: Sequence[str]):
+        """
+        Read many models as they were when the block started. The block is
+        given a function taking a model and a chunk size and returning an
+        iterator over its objects.
+        This default lists the objects of every model on entry, which the
+        backends holding their objects in memory can afford; the database
+        backend streams them from one read transaction.
+
+        Parameters:
+            model_names (list): The models read in the block, as later given to
+                the function.
+        """
+        listed = {
+            model_name: self.get_all(model_name) for model_name in model_names
+        }
+        yield lambda model_name, chunk_size=500: iter(listed[model_name])
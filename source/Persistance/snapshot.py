@@ -0,0 +1,295 @@
+"""
+This module exports a versioned binary snapshot format that is read through
+mmap, so opening a snapshot costs a few header reads and rows are only
+decoded when they are asked for.
+
+Layout (little-endian):
+    header      magic b"HBNBSNAP", version u16, model count u16
+    directory   per model: name (u16 length + utf-8), section offset u64
+    section     row count u32, column count u16,
+                per column: name (u16 length + utf-8), type u8, data offset
+                u64, id index offset u64
+    column      null flags u8[rows], then
+                  q/d/t: fixed-width int64/float64/int64 microseconds [rows]
+                  ?:     uint8 [rows]
+                  s/j:   end offsets u64[rows] followed by the utf-8 blob
+    id index    row numbers u32[rows] sorted by the id column
+
+Type codes: q int, d float, ? bool, t datetime, s str, j any JSON value.
+"""
+
+import json
+import mmap
+import struct
+import logging
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+from src.persistence.atomic import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"HBNBSNAP"
+VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+FIXED_FORMATS = {'q': '<q', 'd': '<d', 't': '<q', '?': '<B'}
+
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot file is missing, truncated or of another version.
+    """
+
+
+def column_type(values: list) -> str:
+    """Infer the narrowest type code able to hold every non-null value."""
+    types = {type(value) for value in values if value is not None}
+    if not types:
+        return 's'
+    if types == {bool}:
+        return '?'
+    if types == {int}:
+        return 'q'
+    if types <= {int, float}:
+        return 'd'
+    if types == {datetime}:
+        return 't'
+    if types == {str}:
+        return 's'
+    return 'j'
+
+
+def encode_value(code: str, value) -> bytes:
+    """Encode one non-null value of a variable-width column."""
+    if code == 'j':
+        return json.dumps(value, separators=(',', ':'), default=str).encode()
+    return value.encode()
+
+
+def encode_column(code: str, values: list) -> bytes:
+    """Encode a column with its null flags."""
+    parts = [bytes(value is None for value in values)]
+    if code in FIXED_FORMATS:
+        fmt = FIXED_FORMATS[code]
+        for value in values:
+            if value is None:
+                value = 0
+            elif code == 't':
+                value = (value - EPOCH) // timedelta(microseconds=1)
+            parts.append(struct.pack(fmt, value))
+    else:
+        blobs = [
+            b"" if value is None else encode_value(code, value)
+            for value in values
+        ]
+        end = 0
+        for blob in blobs:
+            end += len(blob)
+            parts.append(struct.pack('<Q', end))
+        parts.extend(blobs)
+    return b"".join(parts)
+
+
+def write_snapshot(path, data: Dict[str, List[dict]]) -> None:
+    """Write rows, given as lists of dicts per model, to a binary snapshot."""
+    header = MAGIC + struct.pack('<HH', VERSION, len(data))
+    directory_size = sum(2 + len(model.encode()) + 8 for model in data)
+    sections = []
+    offset = len(header) + directory_size
+    directory = []
+    for model, rows in data.items():
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+        columns = columns or ["id"]
+        encoded = []
+        for name in columns:
+            values = [row.get(name) for row in rows]
+            code = column_type(values)
+            encoded.append((name.encode(), code, encode_column(code, values)))
+        ids = [str(row.get("id")) for row in rows]
+        order = sorted(range(len(rows)), key=ids.__getitem__)
+        id_index = b"".join(struct.pack('<I', i) for i in order)
+
+        descriptor_size = 4 + 2 + sum(
+            2 + len(name) + 1 + 8 for name, _, _ in encoded
+        ) + 8
+        data_offset = offset + descriptor_size
+        descriptor = [struct.pack('<IH', len(rows), len(encoded))]
+        payload = []
+        for name, code, blob in encoded:
+            descriptor.append(
+                struct.pack('<H', len(name)) + name + code.encode()
+                + struct.pack('<Q', data_offset)
+            )
+            payload.append(blob)
+            data_offset += len(blob)
+        descriptor.append(struct.pack('<Q', data_offset))
+        payload.append(id_index)
+
+        section = b"".join(descriptor) + b"".join(payload)
+        name = model.encode()
+        directory.append(
+            struct.pack('<H', len(name)) + name + struct.pack('<Q', offset)
+        )
+        sections.append(section)
+        offset += len(section)
+
+    def write(file):
+        """Stream the header, directory and sections into the file."""
+        file.write(header)
+        file.write(b"".join(directory))
+        for section in sections:
+            file.write(section)
+
+    atomic_write(path, write, binary=True)
+    logger.debug(f"Binary snapshot written to {path}")
+
+
+class SnapshotReader:
+    """Read-only, lazily decoded view over a binary snapshot."""
+
+    def __init__(self, path) -> None:
+        """
+        Map the snapshot file and parse its header, directory and column
+        descriptors.
+        """
+        try:
+            with open(path, 'rb') as file:
+                self.__mm = mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Cannot map snapshot {path}: {e}") from e
+        if self.__mm[:len(MAGIC)] != MAGIC:
+            raise SnapshotError(f"{path} is not a binary snapshot")
+        version, model_count = struct.unpack_from('<HH', self.__mm, len(MAGIC))
+        if version != VERSION:
+            raise SnapshotError(
+                f"Unsupported snapshot version {version} in {path}"
+            )
+        self.__models = {}
+        position = len(MAGIC) + 4
+        for _ in range(model_count):
+            model, position = self.__read_name(position)
+            (section,) = struct.unpack_from('<Q', self.__mm, position)
+            position += 8
+            self.__models[model] = self.__read_section(section)
+
+    def __read_name(self, position: int):
+        """
+        Read a length-prefixed utf-8 name, returning it and the next position.
+        """
+        (length,) = struct.unpack_from('<H', self.__mm, position)
+        start = position + 2
+        return self.__mm[start:start + length].decode(), start + length
+
+    def __read_section(self, position: int) -> dict:
+        """Parse the descriptor of a model section."""
+        rows, column_count = struct.unpack_from('<IH', self.__mm, position)
+        position += 6
+        columns = {}
+        for _ in range(column_count):
+            name, position = self.__read_name(position)
+            code = chr(self.__mm[position])
+            (offset,) = struct.unpack_from('<Q', self.__mm, position + 1)
+            columns[name] = (code, offset)
+            position += 9
+        (id_index,) = struct.unpack_from('<Q', self.__mm, position)
+        return {"rows": rows, "columns": columns, "id_index": id_index}
+
+    def models(self) -> List[str]:
+        """Return the models stored in the snapshot."""
+        return list(self.__models)
+
+    def count(self, model: str) -> int:
+        """Return the number of rows of a model."""
+        section = self.__models.get(model)
+        return section["rows"] if section else 0
+
+    def value(self, model: str, column: str, row: int):
+        """Decode a single cell."""
+        section = self.__models[model]
+        code, offset = section["columns"][column]
+        rows = section["rows"]
+        if self.__mm[offset + row]:
+            return None
+        data = offset + rows
+        if code in FIXED_FORMATS:
+            fmt = FIXED_FORMATS[code]
+            (value,) = struct.unpack_from(
+                fmt, self.__mm, data + row * struct.calcsize(fmt)
+            )
+            if code == '?':
+                return bool(value)
+            if code == 't':
+                return EPOCH + timedelta(microseconds=value)
+            return value
+        start = 0
+        if row:
+            # A blob starts where the previous one ends
+            (start,) = struct.unpack_from('<Q', self.__mm, data + row * 8 - 8)
+        (end,) = struct.unpack_from('<Q', self.__mm, data + row * 8)
+        blob_start = data + rows * 8
+        raw = self.__mm[blob_start + start:blob_start + end].decode()
+        return json.loads(raw) if code == 'j' else raw
+
+    def row(self, model: str, row: int) -> dict:
+        """Decode one row into a dict."""
+        return {
+            column: self.value(model, column, row)
+            for column in self.__models[model]["columns"]
+        }
+
+    def rows(self, model: str) -> Iterator[dict]:
+        """Decode the rows of a model one at a time."""
+        for row in range(self.count(model)):
+            yield self.row(model, row)
+
+    def find_row(self, model: str, obj_id) -> Optional[int]:
+        """Binary search the id index for the row holding an id."""
+        section = self.__models.get(model)
+        if section is None or "id" not in section["columns"]:
+            return None
+        index = section["id_index"]
+        target = str(obj_id)
+        ordered = _IdView(self, model, index, section["rows"])
+        position = bisect_left(ordered, target)
+        if position < section["rows"] and ordered[position] == target:
+            return self.row_at(index, position)
+        return None
+
+    def row_at(self, index: int, position: int) -> int:
+        """Return the row number stored at a position of an id index."""
+        return struct.unpack_from('<I', self.__mm, index + position * 4)[0]
+
+    def get(self, model: str, obj_id) -> Optional[dict]:
+        """Decode the row of an id, or return None."""
+        row = self.find_row(model, obj_id)
+        return None if row is None else self.row(model, row)
+
+    def close(self) -> None:
+        """Release the mapping."""
+        self.__mm.close()
+
+
+class _IdView:
+    """
+    Sequence of the ids of a model in id-index order, decoded on access for
+    bisect.
+    """
+
+    def __init__(self, reader: SnapshotReader, model: str, index: int,
+                 rows: int) -> None:
+        """Bind the view to a model section."""
+        self.reader = reader
+        self.model = model
+        self.index = index
+        self.rows = rows
+
+    def __len__(self) -> int:
+        """Number of ids in the index."""
+        return self.rows
+
+    def __getitem__(self, position: int) -> str:
+        """Decode the id at a position of the index."""
+        row = self.reader.row_at(self.index, position)
+        return str(self.reader.value(self.model, "id", row))
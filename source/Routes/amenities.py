@@ -6,6 +6,8 @@ from src.controllers.amenities import (
     get_amenities,
     update_amenity,
 )
+from src.models.amenity import Amenity
+from src.routes.streaming import stream_collection, stream_format
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
@@ -30,7 +32,9 @@ def handle_errors(f):
 @amenities_bp.route("/", methods=["GET"])
 @limiter.limit("100 per minute")
 def get_all_amenities():
-    """Retrieve all amenities."""
+    """Retrieve all amenities, streamed with ?stream=json or ?stream=ndjson."""
+    if stream_format():
+        return stream_collection(Amenity, ())
     return get_amenities()
 
 @amenities_bp.route("/", methods=["POST"])
@@ -0,0 +1,16 @@
+"""
+Batch route module: POST /batch runs many API operations at once
+"""
+
+from flask import Blueprint
+from src.controllers.batch import run_batch
+
+# Initialize the blueprint
+batch_bp = Blueprint("batch", __name__, url_prefix="/batch")
+
+
+# Route running many operations in one request and one transaction
+@batch_bp.route("/", methods=["POST"])
+def post_batch():
+    """Run the operations of the request in one transaction."""
+    return run_batch()
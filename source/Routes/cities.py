@@ -6,6 +6,10 @@ from src.controllers.cities import (
     get_cities,
     update_city,
 )
+from src.controllers.conditional import conditional_entity
+from src.controllers.listing import fields_argument
+from src.models.city import City
+from src.routes.streaming import stream_collection, stream_format
 from marshmallow import Schema, fields, ValidationError
 from flask_httpauth import HTTPBasicAuth
 
@@ -28,8 +32,10 @@ def verify_password(username, password):
 # Route to retrieve all cities
 @cities_bp.route("/", methods=["GET"])
 def get_all_cities():
-    cities = get_cities()
-    return jsonify([city_schema.dump(city) for city in cities])
+    """Retrieve all cities, streamed with ?stream=json or ?stream=ndjson."""
+    if stream_format():
+        return stream_collection(City, ('country_code',))
+    return get_cities()
 
 # Route to create a new city
 @cities_bp.route("/", methods=["POST"])
@@ -44,11 +50,16 @@ def post_city():
 
 # Route to retrieve a specific city by ID
 @cities_bp.route("/<int:city_id>", methods=["GET"])
+@conditional_entity(City, 'city_id')
 def show_city(city_id):
+    """Retrieve a city, restricted to the fields listed in ?fields= if any."""
     city = get_city_by_id(city_id)
     if not city:
         abort(404, description="City not found")
-    return jsonify(city_schema.dump(city))
+    fields = fields_argument(City)
+    if fields is None:
+        return jsonify(city_schema.dump(city))
+    return jsonify({field: city[field] for field in fields})
 
 # Route to update a specific city
 @cities_bp.route("/<int:city_id>", methods=["PUT"])
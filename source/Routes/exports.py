@@ -0,0 +1,16 @@
+"""
+Export route module: GET /admin/export streams the data set
+"""
+
+from flask import Blueprint
+from src.controllers.exports import export_data
+
+# Initialize the blueprint
+exports_bp = Blueprint("exports", __name__, url_prefix="/admin/export")
+
+
+# Route streaming the NDJSON export of the whole data set
+@exports_bp.route("/", methods=["GET"])
+def get_export():
+    """Stream the NDJSON export of the whole data set."""
+    return export_data()
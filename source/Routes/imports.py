@@ -0,0 +1,16 @@
+"""
+Import route module: POST /admin/import/<model> loads records
+"""
+
+from flask import Blueprint
+from src.controllers.imports import import_records
+
+# Initialize the blueprint
+imports_bp = Blueprint("imports", __name__, url_prefix="/admin/import")
+
+
+# Route importing the NDJSON or CSV records of a model sent in the request body
+@imports_bp.route("/<string:model_name>", methods=["POST"])
+def post_import(model_name):
+    """Import the NDJSON or CSV records of a model."""
+    return import_records(model_name)
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, abort
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token
+from flask_jwt_extended import JWTManager, create_access_token
+from src.controllers.login import jwt_required
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import os
@@ -0,0 +1,28 @@
+"""
+Metrics route module: GET /metrics reports the collectors to admins
+"""
+
+import logging
+from flask import Blueprint, jsonify
+from src.controllers.login import check_admin, jwt_required
+from src.metrics import metrics
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Initialize the blueprint
+metrics_bp = Blueprint("metrics", __name__, url_prefix="/metrics")
+
+
+# Route exposing the values of every registered metrics collector
+@metrics_bp.route("/", methods=["GET"])
+@jwt_required()
+def get_metrics():
+    """
+    Return the values of every registered metrics collector. Only accessible
+    by admins.
+    """
+    if not check_admin():
+        logger.warning("Unauthorized attempt to read the metrics")
+        return jsonify({"msg": "Administration rights required"}), 403
+    return jsonify(metrics.collect()), 200
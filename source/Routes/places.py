@@ -1,11 +1,17 @@
 from flask import Blueprint, request, jsonify, abort
 from src.controllers.places import (
+    amenity_conditions,
     create_place,
     delete_place,
     get_place_by_id,
+    get_place_rating,
     get_places,
+    get_places_nearby,
+    search_places,
     update_place,
 )
+from src.models.place import Place
+from src.routes.streaming import stream_collection, stream_format
 from src.schemas.place_schema import PlaceSchema  # Ensure this schema is properly defined
 from marshmallow import ValidationError
 import logging
@@ -21,8 +27,26 @@ place_schema = PlaceSchema()
 # Route to get all places
 @places_bp.route("/", methods=["GET"])
 def get_all_places():
-    places = get_places()
-    return jsonify([place_schema.dump(place) for place in places]), 200
+    """Retrieve all places, streamed with ?stream=json or ?stream=ndjson."""
+    if stream_format():
+        return stream_collection(
+            Place, ('city_id', 'host_id'), amenity_conditions()
+        )
+    return get_places()
+
+
+# Route to search places by city, price and capacity
+@places_bp.route("/search", methods=["GET"])
+def search():
+    """Search places, filtered, sorted and sliced by the query arguments."""
+    return search_places()
+
+
+# Route to list the places around a point, nearest first
+@places_bp.route("/nearby", methods=["GET"])
+def nearby():
+    """List the places within a radius of a point, nearest first."""
+    return get_places_nearby()
 
 # Route to create a new place
 @places_bp.route("/", methods=["POST"])
@@ -42,15 +66,17 @@ def post_place():
 # Route to get a specific place by ID
 @places_bp.route("/<int:place_id>", methods=["GET"])
 def show_place(place_id):
-    try:
-        place = get_place_by_id(place_id)
-        if not place:
-            logger.info(f"Place with id {place_id} not found")
-            abort(404, description=f"Place with id {place_id} not found")
-        return jsonify(place_schema.dump(place)), 200
-    except Exception as e:
-        logger.error(f"Error getting place with id {place_id}: {e}")
-        abort(500, description="Internal Server Error")
+    """Retrieve a place, with its ETag and Last-Modified validators."""
+    return get_place_by_id(place_id=place_id)
+
+
+# Route to get the review aggregates of a place
+@places_bp.route("/<place_id>/rating", methods=["GET"])
+def show_place_rating(place_id):
+    """
+    Retrieve the review count, average rating and rating histogram of a place.
+    """
+    return get_place_rating(place_id=place_id)
 
 # Route to update a specific place
 @places_bp.route("/<int:place_id>", methods=["PUT"])
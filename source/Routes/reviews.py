@@ -8,8 +8,11 @@ from src.controllers.reviews import (
     get_reviews_from_place,
     get_reviews_from_user,
 )
+from src.models.review import Review
+from src.routes.streaming import stream_collection, stream_format
 from src.schemas.review_schema import ReviewSchema  # Ensure this schema is properly defined
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import get_jwt_identity
+from src.controllers.login import jwt_required
 from marshmallow import ValidationError
 import logging
 
@@ -36,29 +39,32 @@ def create_place_review(place_id):
 
 @reviews_bp.route("/places/<int:place_id>/reviews", methods=["GET"])
 def get_reviews_for_place(place_id):
-    reviews = get_reviews_from_place(place_id)
-    return jsonify([review_schema.dump(review) for review in reviews]), 200
+    """Retrieve the reviews of a place."""
+    return get_reviews_from_place(place_id)
 
 @reviews_bp.route("/users/<int:user_id>/reviews", methods=["GET"])
 def get_user_reviews(user_id):
-    reviews = get_reviews_from_user(user_id)
-    return jsonify([review_schema.dump(review) for review in reviews]), 200
+    """Retrieve the reviews written by a user."""
+    return get_reviews_from_user(user_id)
 
 @reviews_bp.route("/", methods=["GET"])
 def get_all_reviews():
-    reviews = get_reviews()
-    return jsonify([review_schema.dump(review) for review in reviews]), 200
+    """Retrieve all reviews, streamed with ?stream=json or ?stream=ndjson."""
+    if stream_format():
+        return stream_collection(Review, ('place_id', 'user_id'))
+    return get_reviews()
 
 @reviews_bp.route("/<int:review_id>", methods=["GET", "PUT", "DELETE"])
 @jwt_required()
 def review_operations(review_id):
+    if request.method == "GET":
+        # The controller answers with the entity and its validators, or 304
+        return get_review_by_id(review_id=review_id)
     review = get_review_by_id(review_id)
     if not review:
         logger.warning(f"Review with id {review_id} not found")
         abort(404, description="Review not found")
-    if request.method == "GET":
-        return jsonify(review_schema.dump(review)), 200
-    elif request.method == "PUT":
+    if request.method == "PUT":
         try:
             data = review_schema.load(request.get_json())
             updated_review = update_review(review_id, data)
@@ -0,0 +1,78 @@
+"""
+Streamed responses for the collection routes
+
+A collection is streamed when the client asks for ?stream=json (a JSON array)
+or ?stream=ndjson / Accept: application/x-ndjson (one JSON document per line).
+Rows are pulled from the repository, serialized and encoded STREAM_CHUNK_SIZE
+at a time, so neither the full list of objects nor the full body is ever held
+in memory.
+"""
+
+from itertools import islice
+from flask import Response, current_app, json, request, stream_with_context
+from src.controllers.listing import fields_argument, list_arguments
+from src.serializers import serializers
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def stream_format():
+    """
+    Returns 'json' or 'ndjson' when the client asked for a streamed response,
+    else None
+    """
+    requested = request.args.get("stream")
+    if requested in ("json", "ndjson"):
+        return requested
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return "ndjson"
+    return None
+
+
+def stream_json(objs, serialize_many, fmt="json", chunk_size=500):
+    """
+    Streams objects as a JSON array or as NDJSON, serializing and sending
+    chunk_size objects per write; serialize_many turns a list of objects into
+    documents
+    """
+
+    def generate():
+        """Yield the encoded chunks of the body."""
+        objs_iter = iter(objs)
+        if fmt == "json":
+            yield "["
+        separator = ""
+        while True:
+            chunk = list(islice(objs_iter, chunk_size))
+            if not chunk:
+                break
+            documents = serialize_many(chunk)
+            if fmt == "json":
+                # One encoder call per chunk, without the brackets of the list
+                yield separator + json.dumps(documents)[1:-1]
+                separator = ","
+            else:
+                yield "".join(
+                    json.dumps(document) + "\n" for document in documents
+                )
+        if fmt == "json":
+            yield "]"
+
+    mimetype = "application/json" if fmt == "json" else NDJSON_MIMETYPE
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def stream_collection(model, filters, where=None):
+    """
+    Streams the objects of a model matching the equality filters of the request
+    and the extra conditions, restricted to the fields listed in ?fields= if
+    any
+    """
+    chunk_size = current_app.config.get("STREAM_CHUNK_SIZE", 500)
+    where = {**list_arguments(filters)["where"], **(where or {})}
+    fields = fields_argument(model)
+    columns = serializers.columns(model, fields) if fields else None
+    objs = model.iter_all(chunk_size=chunk_size, where=where, fields=columns)
+    return stream_json(
+        objs, serializers.many(model, fields), stream_format(), chunk_size
+    )
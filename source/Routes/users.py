@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify, abort
 from src.controllers.users import create_user, delete_user, get_user_by_id, get_users, update_user
+from src.models.user import User
+from src.routes.streaming import stream_collection, stream_format
 from marshmallow import Schema, fields, validate, ValidationError
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import get_jwt_identity
+from src.controllers.login import jwt_required
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import logging
@@ -24,8 +27,10 @@ user_schema = UserSchema()
 # Routes for user operations
 @users_bp.route("/", methods=["GET"])
 def get_all_users():
-    users = get_users()
-    return jsonify([user_schema.dump(user) for user in users]), 200
+    """Retrieve all users, streamed with ?stream=json or ?stream=ndjson."""
+    if stream_format():
+        return stream_collection(User, ('email',))
+    return get_users()
 
 @users_bp.route("/", methods=["POST"])
 @jwt_required()
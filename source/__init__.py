@@ -24,13 +24,20 @@ def create_app(config_class) -> Flask:
     app.config.from_object(config_class)
 
     from src.models import db
+    # The pool class must be set before db.init_app creates the engine
+    from src.persistence.pool import pool_monitor
+    pool_monitor.init_app(app)
     db.init_app(app)
     jwt.init_app(app)
     bcrypt.init_app(app)
 
+    from src.hashing import hasher
+    hasher.init_app(app)
+
     register_extensions(app)
     register_routes(app)
     register_handlers(app)
+    register_commands(app)
 
     print(f"Using {config_class} as config")
 
@@ -40,6 +47,16 @@ def create_app(config_class) -> Flask:
 def register_extensions(app: Flask) -> None:
     """Register the extensions for the Flask app"""
     cors.init_app(app, resources={r"/api/*": {"origins": "*"}})
+
+    from src.serializers import init_json
+    init_json(app)
+
+    from src.compression import compression
+    compression.init_app(app)
+
+    # Objects loaded during a request are forgotten with it
+    from src.persistence.identity import drop_identity_map
+    app.teardown_appcontext(drop_identity_map)
     # Further extensions can be added here
 
 
@@ -55,6 +72,10 @@ def register_routes(app: Flask) -> None:
     from src.routes.reviews import reviews_bp
     from src.routes.login import login_bp
     from src.routes.admin import admin_bp
+    from src.routes.metrics import metrics_bp
+    from src.routes.batch import batch_bp
+    from src.routes.imports import imports_bp
+    from src.routes.exports import exports_bp
 
     # Register the blueprints in the app
     app.register_blueprint(users_bp)
@@ -65,10 +86,16 @@ def register_routes(app: Flask) -> None:
     app.register_blueprint(amenities_bp)
     app.register_blueprint(login_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(batch_bp)
+    app.register_blueprint(imports_bp)
+    app.register_blueprint(exports_bp)
 
 
 def register_handlers(app: Flask) -> None:
     """Register the error handlers for the Flask app."""
+    from src.hashing import HashingSaturated
+
     app.errorhandler(404)(lambda e: (
         {"error": "Not found", "message": str(e)}, 404
     )
@@ -78,3 +105,25 @@ def register_handlers(app: Flask) -> None:
             {"error": "Bad request", "message": str(e)}, 400
         )
     )
+    # The password hashing pool is full: ask the client to come back shortly
+    app.errorhandler(HashingSaturated)(
+        lambda e: (
+            {"error": "Service unavailable", "message": str(e)}, 503,
+            {"Retry-After": "1"}
+        )
+    )
+
+
+def register_commands(app: Flask) -> None:
+    """Register the CLI commands of the Flask app"""
+    from src.commands import (
+        export_data_command,
+        import_data_command,
+        load_export_command,
+        rebuild_ratings_command,
+    )
+
+    app.cli.add_command(rebuild_ratings_command)
+    app.cli.add_command(import_data_command)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(load_export_command)
@@ -0,0 +1,167 @@
+"""
+CLI commands registered on the Flask app, run with `flask <command>`.
+"""
+
+import click
+from flask.cli import with_appcontext
+
+# Seconds between two progress lines of import-data and load-export
+PROGRESS_INTERVAL = 2
+
+
+@click.command("rebuild-ratings")
+@with_appcontext
+def rebuild_ratings_command():
+    """Rebuild the review aggregates of every place from the reviews."""
+    from src.models.place import Place
+
+    count = Place.rebuild_ratings()
+    click.echo(f"Rebuilt the review aggregates of {count} place(s).")
+
+
+@click.command("import-data")
+@click.argument("model", type=click.Choice(["user", "place", "review"]))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]),
+              default=None,
+              help="Input format, guessed from the file extension by default.")
+@click.option("--chunk-size", type=int, default=None,
+              help="Records validated and inserted per batch.")
+@click.option("--workers", type=int, default=None,
+              help="Processes parsing and validating, 0 for none.")
+@click.option("--rejects", type=click.Path(dir_okay=False), default=None,
+              help="Where rejected records are written, "
+                   "PATH.rejects.ndjson by default.")
+@with_appcontext
+def import_data_command(model, path, fmt, chunk_size, workers, rejects):
+    """Import users, places or reviews from an NDJSON or CSV file."""
+    import json
+    import time
+    from flask import current_app
+    from src.importer import Importer
+    from src.persistence import repo
+
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    rejects = rejects or f"{path}.rejects.ndjson"
+    last_report = [0.0]
+
+    def progress(report):
+        """Echo the counters of the import."""
+        # At most one line every PROGRESS_INTERVAL seconds
+        if time.monotonic() - last_report[0] >= PROGRESS_INTERVAL:
+            last_report[0] = time.monotonic()
+            stats = report.to_dict()
+            click.echo(f"{stats['read']} read, {stats['imported']} imported, "
+                       f"{stats['rejected']} rejected "
+                       f"({stats['rows_per_s']} rows/s)")
+
+    def reject(rejected):
+        """Write a rejected record to the reject file."""
+        reject_file.write(json.dumps(rejected, default=str) + "\n")
+
+    config = current_app.config
+    if workers is None:
+        workers = config.get("IMPORT_WORKERS", 0)
+    with open(path, newline="", encoding="utf-8") as source, \
+            open(rejects, "w", encoding="utf-8") as reject_file:
+        importer = Importer(
+            model, repo,
+            chunk_size=chunk_size or config.get("IMPORT_CHUNK_SIZE", 1000),
+            workers=workers,
+            rounds=config.get("BCRYPT_LOG_ROUNDS", 12),
+            reject=reject,
+            progress=progress,
+        )
+        stats = importer.run(source, fmt).to_dict()
+    click.echo(f"Imported {stats['imported']} {model}(s) in "
+               f"{stats['elapsed_s']}s, rejected {stats['rejected']}"
+               + (f", see {rejects}" if stats["rejected"] else "."))
+
+
+def open_export(path: str, mode: str, compress: bool):
+    """
+    Open an export file, or stdin/stdout for '-', as text, through gzip when
+    compress is set.
+    """
+    import gzip
+    import io
+
+    if path == "-":
+        stream = click.get_binary_stream("stdout" if mode == "w" else "stdin")
+        if compress:
+            stream = gzip.GzipFile(fileobj=stream, mode=mode + "b")
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    if compress:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+@click.command("export-data")
+@click.option("--output", "-o", default="-",
+              help="Export file, standard output by default.")
+@click.option("--models", default=None,
+              help="Comma-separated models to export, all by default.")
+@click.option("--compress", is_flag=True, default=False,
+              help="Compress with gzip, implied by an output file ending "
+                   "in .gz.")
+@click.option("--chunk-size", type=int, default=None,
+              help="Objects read and written per batch.")
+@with_appcontext
+def export_data_command(output, models, compress, chunk_size):
+    """
+    Export every object of the repository as NDJSON, from one consistent
+    snapshot.
+    """
+    from flask import current_app
+    from src.exporter import EXPORT_MODELS, export_lines
+    from src.persistence import repo
+
+    model_names = [name for name in (models or "").split(",") if name] or None
+    unknown = [name for name in model_names or () if name not in EXPORT_MODELS]
+    if unknown:
+        raise click.BadParameter(
+            f"unknown models {', '.join(unknown)}", param_hint="--models"
+        )
+    chunk_size = chunk_size or current_app.config.get("STREAM_CHUNK_SIZE", 500)
+    compress = compress or output.endswith(".gz")
+    with open_export(output, "w", compress) as stream:
+        for lines in export_lines(repo, model_names, chunk_size):
+            stream.write(lines)
+    if output != "-":
+        click.echo(f"Exported to {output}.")
+
+
+@click.command("load-export")
+@click.argument("path")
+@click.option("--chunk-size", type=int, default=None,
+              help="Objects inserted per batch.")
+@with_appcontext
+def load_export_command(path, chunk_size):
+    """
+    Load an NDJSON export into the repository, skipping the objects it has
+    already.
+    """
+    import time
+    from flask import current_app
+    from src.exporter import load_lines
+    from src.persistence import repo
+
+    last_report = [0.0]
+
+    def progress(counts):
+        """Echo the number of objects loaded per model."""
+        # At most one line every PROGRESS_INTERVAL seconds
+        if time.monotonic() - last_report[0] >= PROGRESS_INTERVAL:
+            last_report[0] = time.monotonic()
+            click.echo(", ".join(
+                f"{count['loaded']} {model}(s)"
+                for model, count in counts.items()
+            ) + " loaded")
+
+    if not chunk_size:
+        chunk_size = current_app.config.get("IMPORT_CHUNK_SIZE", 1000)
+    with open_export(path, "r", path.endswith(".gz")) as stream:
+        counts = load_lines(repo, stream, chunk_size, progress)
+    for model, count in counts.items():
+        click.echo(f"{model}: {count['loaded']} loaded, "
+                   f"{count['skipped']} already present")
@@ -0,0 +1,252 @@
+"""
+This module exports the response compression extension.
+
+Responses are compressed with the best encoding the client accepts among
+br (when the brotli package is installed), gzip and deflate. A buffered
+response is compressed when its body reaches COMPRESS_MIN_SIZE bytes; below
+that the headers would cost more than they save. A streamed response is
+compressed chunk by chunk as the generator yields, each chunk flushed to the
+client at once, so the first rows of a large collection still arrive early.
+
+Compressing is the expensive part of a cheap collection read, so the
+compressed variants of bodies carrying an ETag, which the conditional
+controllers set from the collection version, are kept in a small LRU cache
+keyed by a digest of the body and served again without recompressing.
+
+Settings, read from the Flask config by init_app:
+    COMPRESS_MIN_SIZE       smallest buffered body compressed, in bytes
+    COMPRESS_LEVEL          compression level, 1 (fastest) to 9
+    COMPRESS_MIMETYPES      media types compressed
+    COMPRESS_CACHE_SIZE     compressed variants cached, 0 disables the cache
+"""
+
+import hashlib
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Tuple
+from flask import request
+from src.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip and deflate are offered instead
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIMETYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/html",
+    "text/plain",
+    "text/csv",
+)
+
+# zlib window bits of each encoding: a gzip container, or a zlib stream for
+# deflate
+WBITS = {"gzip": 31, "deflate": 15}
+
+
+class StreamCompressor:
+    """Incremental compressor of one response body."""
+
+    def __init__(self, encoding: str, level: int) -> None:
+        """Start a compressed stream in the given encoding."""
+        if encoding == "br":
+            # brotli quality runs from 0 to 11, zlib levels from 1 to 9
+            self.__brotli = brotli.Compressor(quality=min(11, level + 1))
+            self.__zlib = None
+        else:
+            self.__brotli = None
+            self.__zlib = zlib.compressobj(
+                level, zlib.DEFLATED, WBITS[encoding]
+            )
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress a chunk and flush it, so the client can decode everything sent
+        so far.
+        """
+        if self.__brotli is not None:
+            return self.__brotli.process(data) + self.__brotli.flush()
+        return (self.__zlib.compress(data)
+                + self.__zlib.flush(zlib.Z_SYNC_FLUSH))
+
+    def finish(self) -> bytes:
+        """End the compressed stream."""
+        if self.__brotli is not None:
+            return self.__brotli.finish()
+        return self.__zlib.flush()
+
+
+def compress_body(body: bytes, encoding: str, level: int) -> bytes:
+    """Return a whole body compressed in the given encoding."""
+    if encoding == "br":
+        return brotli.compress(body, quality=min(11, level + 1))
+    compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_chunks(chunks: Iterable, compressor: StreamCompressor,
+                    charset: str = "utf-8") -> Iterator[bytes]:
+    """
+    Compress the chunks of a streamed body as they are produced, closing the
+    source when done.
+    """
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Lets stream_with_context pop the request context it holds
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+class Compression:
+    """Flask extension compressing responses after the views ran."""
+
+    def __init__(self, min_size: int = 1024, level: int = 6,
+                 mimetypes: Iterable[str] = DEFAULT_MIMETYPES,
+                 cache_size: int = 256) -> None:
+        """Initialize the extension. init_app reads the settings of an app."""
+        self.__lock = threading.Lock()
+        self.__cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self.__counters = {
+            "compressed": 0, "streamed": 0, "too_small": 0,
+            "bytes_in": 0, "bytes_out": 0, "cache_hits": 0, "cache_misses": 0,
+        }
+        self.configure(min_size, level, mimetypes, cache_size)
+
+    def configure(self, min_size: int, level: int, mimetypes: Iterable[str],
+                  cache_size: int) -> None:
+        """Apply new settings and empty the cache."""
+        with self.__lock:
+            self.__min_size = max(0, min_size)
+            self.__level = min(9, max(1, level))
+            self.__mimetypes = frozenset(mimetypes)
+            self.__cache_size = max(0, cache_size)
+            self.__cache.clear()
+
+    def init_app(self, app) -> None:
+        """
+        Read the settings of a Flask app, compress its responses and publish
+        the metrics.
+        """
+        self.configure(
+            min_size=app.config.get("COMPRESS_MIN_SIZE", 1024),
+            level=app.config.get("COMPRESS_LEVEL", 6),
+            mimetypes=app.config.get("COMPRESS_MIMETYPES", DEFAULT_MIMETYPES),
+            cache_size=app.config.get("COMPRESS_CACHE_SIZE", 256),
+        )
+        app.after_request(self.after_request)
+        metrics.register("compression", self.stats)
+
+    @property
+    def encodings(self) -> Tuple[str, ...]:
+        """The encodings offered, preferred first."""
+        if brotli is not None:
+            return ("br", "gzip", "deflate")
+        return ("gzip", "deflate")
+
+    def negotiate(self, accept_encodings) -> Optional[str]:
+        """Return the preferred encoding the client accepts, or None."""
+        return accept_encodings.best_match(self.encodings)
+
+    def after_request(self, response):
+        """
+        Compress a response when the client, the media type and the size allow
+        it.
+        """
+        cache_control = response.headers.get("Cache-Control", "")
+        if (response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or response.mimetype not in self.__mimetypes
+                or "Content-Encoding" in response.headers
+                or "no-transform" in cache_control):
+            return response
+        # The body now depends on Accept-Encoding, for every client and cache
+        # in between
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_chunks(
+                response.response, StreamCompressor(encoding, self.__level)
+            )
+            response.direct_passthrough = False
+            response.headers.pop("Content-Length", None)
+            self.__count(streamed=1)
+        else:
+            body = response.get_data()
+            if len(body) < self.__min_size:
+                self.__count(too_small=1)
+                return response
+            response.set_data(self.__compressed(response, body, encoding))
+            self.__count(compressed=1, bytes_in=len(body),
+                         bytes_out=response.content_length or 0)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # A strong validator identifies the bytes, which differ per
+            # encoding
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+    def stats(self) -> dict:
+        """
+        Return the counters, the cache occupancy and the overall compression
+        ratio.
+        """
+        with self.__lock:
+            stats = {**self.__counters, "cached": len(self.__cache),
+                     "cache_size": self.__cache_size}
+        stats["ratio"] = None
+        if stats["bytes_in"]:
+            stats["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 3)
+        return stats
+
+    def __compressed(self, response, body: bytes, encoding: str) -> bytes:
+        """
+        Compress a buffered body, through the cache when the response carries
+        an ETag.
+        """
+        etag, weak = response.get_etag()
+        if not etag or not self.__cache_size:
+            return compress_body(body, encoding, self.__level)
+        # Responses sharing an ETag differ with ?fields= and between routes of
+        # one entity: the key is the body itself, hashed far faster than it
+        # compresses
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        with self.__lock:
+            compressed = self.__cache.get(key)
+            if compressed is not None:
+                self.__cache.move_to_end(key)
+                self.__counters["cache_hits"] += 1
+                return compressed
+            self.__counters["cache_misses"] += 1
+        compressed = compress_body(body, encoding, self.__level)
+        with self.__lock:
+            self.__cache[key] = compressed
+            while len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+        return compressed
+
+    def __count(self, **deltas) -> None:
+        """Add to the counters."""
+        with self.__lock:
+            for name, delta in deltas.items():
+                self.__counters[name] += delta
+
+
+# Extension shared by the whole application
+compression = Compression()
@@ -0,0 +1,194 @@
+"""
+This module exports the logical export and load of the whole data set.
+
+An export is NDJSON, one line per object, models in dependency order:
+
+    {"model": "place", "data": {"id": 1, "name": "Loft", ..., "created_at":
+    "2024-05-01T12:30:00"}}
+
+Every column is written, including the ones the API leaves out, so an
+export taken from one backend loads into any other: that is how data moves
+between the memory, file, pickle and db repositories.
+
+Objects are read through Repository.read_snapshot: one read transaction on
+the database, streamed with yield_per; the set of objects present when the
+export started on the other backends, which hold them in memory already.
+Lines are produced by a generator, chunk by chunk, so an export never holds
+more than one chunk of serialized objects.
+"""
+
+import importlib
+import json
+import logging
+from datetime import date, datetime
+from itertools import islice
+from typing import (
+    Callable, Iterable, Iterator, List, Optional, Sequence, Tuple,
+)
+from src.serializers import Serializer
+
+logger = logging.getLogger(__name__)
+
+# Every exported model, referenced models first, and the import path of its
+# class
+EXPORT_MODELS = {
+    "country": "src.models.country.Country",
+    "user": "src.models.user.User",
+    "amenity": "src.models.amenity.Amenity",
+    "city": "src.models.city.City",
+    "place": "src.models.place.Place",
+    "placeamenity": "src.models.amenity.PlaceAmenity",
+    "review": "src.models.review.Review",
+}
+
+# Arguments a model constructor requires besides the columns
+BUILD_ARGUMENTS = {"user": {"password": None}}
+
+
+def model_class(model_name: str) -> type:
+    """Import and return the class of an exported model by name."""
+    module, _, name = EXPORT_MODELS[model_name].rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+def export_fields(model: type) -> List[Tuple[str, str]]:
+    """
+    Return the (key, kind) pairs of every column of a model, as taken by
+    Serializer.
+    """
+    from sqlalchemy import Date, DateTime
+
+    return [
+        (column.key,
+         "datetime" if isinstance(column.type, (Date, DateTime)) else "column")
+        for column in model.__table__.columns
+    ]
+
+
+def chunks(objs: Iterable, size: int) -> Iterator[list]:
+    """
+    Group an iterable into lists of at most size items, pulling one list at a
+    time.
+    """
+    iterator = iter(objs)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_lines(repository, model_names: Optional[Sequence[str]] = None,
+                 chunk_size: int = 500) -> Iterator[str]:
+    """
+    Yield the NDJSON export of the given models, all by default, one chunk of
+    lines at a time.
+    """
+    model_names = list(model_names or EXPORT_MODELS)
+    models = [model_class(model_name) for model_name in model_names]
+    with repository.read_snapshot(models) as read:
+        for model_name, model in zip(model_names, models):
+            dump_many = Serializer(model, export_fields(model)).dump_many
+            exported = 0
+            for chunk in chunks(read(model, chunk_size), chunk_size):
+                yield "".join(
+                    json.dumps({"model": model_name, "data": data},
+                               separators=(",", ":"), default=str) + "\n"
+                    for data in dump_many(chunk)
+                )
+                exported += len(chunk)
+            logger.info(f"Exported {exported} {model_name}(s)")
+
+
+def parse_values(model: type, data: dict) -> dict:
+    """
+    Return the column values of an exported object, with its timestamps read
+    back as datetimes.
+    """
+    from sqlalchemy import Date, DateTime
+
+    row = {}
+    for column in model.__table__.columns:
+        if column.key not in data:
+            continue
+        value = data[column.key]
+        if isinstance(value, str) and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif isinstance(value, str) and isinstance(column.type, Date):
+            value = date.fromisoformat(value)
+        row[column.key] = value
+    return row
+
+
+def load_lines(repository, lines: Iterable[str], chunk_size: int = 1000,
+               progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Insert the objects of an export into a repository, chunk_size at a time,
+    skipping the ones whose primary key exists already, so loading the same
+    export twice inserts nothing the second time. Returns the counts per model.
+    """
+    counts = {}
+    existing = {}
+    pending = []
+    pending_model = None
+
+    def flush():
+        """Insert the pending rows of the current model."""
+        if pending:
+            model = model_class(pending_model)
+            build = model
+            if pending_model in BUILD_ARGUMENTS:
+                arguments = BUILD_ARGUMENTS[pending_model]
+
+                def build(**row):
+                    """Build an object with the arguments it requires."""
+                    return model(**arguments, **row)
+            loaded = repository.insert_many(model, pending, build)
+            counts[pending_model]["loaded"] += loaded
+            pending.clear()
+            if progress is not None:
+                progress(counts)
+
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            model_name, data = entry["model"], entry["data"]
+            model = model_class(model_name)
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(
+                f"Line {line_number} is not an exported object: {e}"
+            )
+        if model_name != pending_model:
+            flush()
+            pending_model = model_name
+        if model_name not in existing:
+            existing[model_name] = primary_keys(repository, model)
+            counts[model_name] = {"loaded": 0, "skipped": 0}
+        row = parse_values(model, data)
+        key = tuple(
+            row.get(column.key)
+            for column in model.__table__.primary_key.columns
+        )
+        if key in existing[model_name]:
+            counts[model_name]["skipped"] += 1
+            continue
+        existing[model_name].add(key)
+        pending.append(row)
+        if len(pending) >= chunk_size:
+            flush()
+    flush()
+    return counts
+
+
+def primary_keys(repository, model: type) -> set:
+    """
+    Return the primary keys of the objects of a model in a repository, as
+    tuples.
+    """
+    columns = [column.key for column in model.__table__.primary_key.columns]
+    return {
+        tuple(getattr(obj, column, None) for column in columns)
+        for obj in repository.iter_all(model)
+    }
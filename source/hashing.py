@@ -0,0 +1,191 @@
+"""
+This module exports the password hashing service.
+
+bcrypt runs in a bounded pool of worker processes so the request threads
+only wait on a future, and a burst of logins cannot pin every worker of the
+web server. At most `max_pending` hashes are queued or running; past that,
+new work is rejected at once with HashingSaturated, which the app answers
+with 503 and Retry-After instead of letting requests pile up.
+
+Settings, read from the Flask config by init_app:
+    BCRYPT_LOG_ROUNDS           bcrypt work factor, lowered in tests
+    PASSWORD_HASH_WORKERS       worker processes, 0 hashes on the calling
+                                thread
+    PASSWORD_HASH_MAX_PENDING   hashes queued or running before rejecting
+    PASSWORD_HASH_TIMEOUT       seconds a request waits for its hash
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from typing import Callable, Optional
+import bcrypt
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Number of recent latencies the percentiles are computed from
+LATENCY_WINDOW = 1024
+
+
+class HashingSaturated(Exception):
+    """Raised when the hashing pool has no room for more work."""
+
+
+def hash_password(password: str, rounds: int) -> str:
+    """Return the bcrypt hash of a password. Runs in a worker process."""
+    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds))
+    return hashed.decode("utf-8")
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    """Check a password against a bcrypt hash. Runs in a worker process."""
+    try:
+        return bcrypt.checkpw(
+            password.encode("utf-8"), password_hash.encode("utf-8")
+        )
+    except ValueError:
+        # Not a bcrypt hash
+        return False
+
+
+class PasswordHasher:
+    """Bounded pool of processes hashing and checking passwords."""
+
+    def __init__(self, workers: int = 2, max_pending: int = 64,
+                 rounds: int = 12, timeout: float = 10) -> None:
+        """Initialize the service. The pool is started on first use."""
+        self.__lock = threading.Lock()
+        self.__pool: Optional[ProcessPoolExecutor] = None
+        self.__latencies = deque(maxlen=LATENCY_WINDOW)
+        self.__counters = {"completed": 0, "rejected": 0, "timeouts": 0}
+        self.__pending = 0
+        self.configure(workers, max_pending, rounds, timeout)
+        atexit.register(self.close)
+
+    def configure(self, workers: int, max_pending: int, rounds: int,
+                  timeout: float) -> None:
+        """Apply new settings, replacing the pool if one was started."""
+        self.close()
+        with self.__lock:
+            self.__workers = max(0, workers)
+            self.__max_pending = max(1, max_pending)
+            self.__rounds = rounds
+            self.__timeout = timeout
+
+    def init_app(self, app) -> None:
+        """
+        Read the settings of a Flask app and publish the metrics of the pool.
+        """
+        self.configure(
+            workers=app.config.get("PASSWORD_HASH_WORKERS", 2),
+            max_pending=app.config.get("PASSWORD_HASH_MAX_PENDING", 64),
+            rounds=app.config.get("BCRYPT_LOG_ROUNDS", 12),
+            timeout=app.config.get("PASSWORD_HASH_TIMEOUT", 10),
+        )
+        metrics.register("password_hashing", self.stats)
+
+    @property
+    def rounds(self) -> int:
+        """The bcrypt work factor of new hashes."""
+        return self.__rounds
+
+    def hash(self, password: str) -> str:
+        """
+        Return the bcrypt hash of a password, raising HashingSaturated when the
+        pool is full.
+        """
+        return self.__run(hash_password, password, self.__rounds)
+
+    def check(self, password: str, password_hash: str) -> bool:
+        """
+        Check a password against its hash, raising HashingSaturated when the
+        pool is full.
+        """
+        return self.__run(check_password, password, password_hash)
+
+    def stats(self) -> dict:
+        """
+        Return the queue depth, counters and recent latencies in milliseconds.
+        """
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+            stats = {
+                "workers": self.__workers,
+                "rounds": self.__rounds,
+                "pending": self.__pending,
+                "queued": (max(0, self.__pending - self.__workers)
+                           if self.__workers else 0),
+                "max_pending": self.__max_pending,
+                **self.__counters,
+            }
+        percentiles = (("p50_ms", 0.5), ("p95_ms", 0.95), ("max_ms", 1.0))
+        for name, fraction in percentiles:
+            index = min(len(latencies) - 1, int(len(latencies) * fraction))
+            stats[name] = (
+                round(latencies[index] * 1000, 2) if latencies else None
+            )
+        return stats
+
+    def close(self) -> None:
+        """Shut the worker processes down. The next hash starts a new pool."""
+        with self.__lock:
+            pool, self.__pool = self.__pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def __run(self, function: Callable, *args):
+        """
+        Run a hashing function in the pool, or inline without workers, unless
+        saturated.
+        """
+        with self.__lock:
+            if self.__pending >= self.__max_pending:
+                self.__counters["rejected"] += 1
+                raise HashingSaturated(
+                    f"{self.__pending} password hashes already pending"
+                )
+            self.__pending += 1
+            if self.__workers and self.__pool is None:
+                self.__pool = ProcessPoolExecutor(max_workers=self.__workers)
+            pool = self.__pool if self.__workers else None
+        started = time.monotonic()
+        if pool is None:
+            try:
+                result = function(*args)
+            finally:
+                self.__release()
+        else:
+            try:
+                future = pool.submit(function, *args)
+            except BaseException:
+                self.__release()
+                raise
+            # A worker keeps hashing after a timeout: its slot is freed when it
+            # is done
+            future.add_done_callback(self.__release)
+            try:
+                result = future.result(timeout=self.__timeout)
+            except TimeoutError:
+                future.cancel()
+                with self.__lock:
+                    self.__counters["timeouts"] += 1
+                raise HashingSaturated(
+                    f"Password hash not done within {self.__timeout}s"
+                )
+        with self.__lock:
+            self.__counters["completed"] += 1
+            self.__latencies.append(time.monotonic() - started)
+        return result
+
+    def __release(self, future=None) -> None:
+        """Free the pending slot of a hash, once done or failed to start."""
+        with self.__lock:
+            self.__pending -= 1
+
+
+# Service shared by the whole application
+hasher = PasswordHasher()
@@ -0,0 +1,425 @@
+"""
+This module exports the bulk importer of users, places and reviews.
+
+Records are read one at a time from NDJSON (one JSON object per line) or CSV
+(a header line naming the fields), so the input never has to fit in memory.
+Each chunk of IMPORT_CHUNK_SIZE records is parsed and validated, in a pool
+of worker processes when there are some, then checked against the ids of
+the referenced models, loaded once before the import, and written with one
+Repository.insert_many call: a batched INSERT on the database, one flush on
+the file repositories. Invalid records are written to a reject file, one
+JSON line each, with their line number and the error, and the import goes on.
+
+Passwords of imported users are hashed by the workers; a `password_hash`
+column computed elsewhere is taken as is.
+"""
+
+import csv
+import importlib
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Tuple
+from src.hashing import hash_password
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "csv")
+# Chunks handed to the workers ahead of the one being written
+CHUNKS_AHEAD_PER_WORKER = 2
+
+
+def text(value) -> str:
+    """Return a value as a stripped, non-empty string."""
+    value = str(value).strip()
+    if not value:
+        raise ValueError("must not be empty")
+    return value
+
+
+def integer(value) -> int:
+    """
+    Return a whole number given as a number or a string, rejecting fractions
+    and booleans.
+    """
+    if isinstance(value, bool) or (
+        isinstance(value, float) and not value.is_integer()
+    ):
+        raise ValueError("must be a whole number")
+    number = int(value)
+    if number < 0:
+        raise ValueError("must not be negative")
+    return number
+
+
+def number(value) -> float:
+    """Return a number given as a number or a string."""
+    if isinstance(value, bool):
+        raise ValueError("must be a number")
+    return float(value)
+
+
+def boolean(value) -> bool:
+    """
+    Return a boolean given as a JSON boolean or as true/false, 1/0, yes/no.
+    """
+    if isinstance(value, bool):
+        return value
+    lowered = str(value).strip().lower()
+    if lowered in ("true", "1", "yes"):
+        return True
+    if lowered in ("false", "0", "no"):
+        return False
+    raise ValueError("must be true or false")
+
+
+def check_user(row: dict, rounds: int) -> None:
+    """
+    Hash the password of a user row, which must have a password or a password
+    hash.
+    """
+    password = row.pop("password", None)
+    if password is not None:
+        row["password_hash"] = hash_password(password, rounds)
+    elif "password_hash" not in row:
+        raise ValueError("password or password_hash is required")
+    row.setdefault("is_admin", False)
+
+
+def check_place(row: dict, rounds: int) -> None:
+    """Check the coordinates of a place row."""
+    if not -90 <= row["latitude"] <= 90:
+        raise ValueError("latitude must be between -90 and 90")
+    if not -180 <= row["longitude"] <= 180:
+        raise ValueError("longitude must be between -180 and 180")
+
+
+def check_review(row: dict, rounds: int) -> None:
+    """Check the rating of a review row."""
+    if not 1 <= row["rating"] <= 5:
+        raise ValueError("rating must be between 1 and 5")
+
+
+# What can be imported, per model name: model       import path of the model
+# class fields      accepted fields and the function converting their values
+# required    fields every record must have references  fields holding the id
+# of an object of another model unique      fields no two objects share check
+# further checks and conversions of a converted row, run by the workers
+IMPORT_SPECS = {
+    "user": {
+        "model": "src.models.user.User",
+        "fields": {"id": text, "email": text, "password": str,
+                   "password_hash": text, "first_name": text,
+                   "last_name": text, "is_admin": boolean},
+        "required": ("email", "first_name", "last_name"),
+        "references": {},
+        "unique": ("email",),
+        "check": check_user,
+    },
+    "place": {
+        "model": "src.models.place.Place",
+        "fields": {"id": text, "name": text, "description": str,
+                   "address": text, "latitude": number, "longitude": number,
+                   "host_id": text, "city_id": text,
+                   "price_per_night": integer, "number_of_rooms": integer,
+                   "number_of_bathrooms": integer, "max_guests": integer},
+        "required": ("name", "description", "address", "latitude",
+                     "longitude", "host_id", "city_id", "price_per_night",
+                     "number_of_rooms", "number_of_bathrooms", "max_guests"),
+        "references": {"host_id": "user", "city_id": "city"},
+        "unique": (),
+        "check": check_place,
+    },
+    "review": {
+        "model": "src.models.review.Review",
+        "fields": {"id": text, "place_id": text, "user_id": text,
+                   "comment": str, "rating": number},
+        "required": ("place_id", "user_id", "comment", "rating"),
+        "references": {"place_id": "place", "user_id": "user"},
+        "unique": (),
+        "check": check_review,
+    },
+}
+
+# Classes of the referenced models that are not imported themselves
+REFERENCED_MODELS = {"city": "src.models.city.City"}
+
+
+def model_class(model_name: str) -> type:
+    """Import and return the class of a model by name."""
+    if model_name in IMPORT_SPECS:
+        path = IMPORT_SPECS[model_name]["model"]
+    else:
+        path = REFERENCED_MODELS[model_name]
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    Yield the (line number, record) pairs of an input: the raw line of an
+    NDJSON object, parsed later by a worker, or the dict of a CSV row.
+    """
+    if fmt == "csv":
+        reader = csv.reader(stream)
+        header = [name.strip() for name in next(reader, [])]
+        for record in reader:
+            if record:
+                yield reader.line_num, dict(zip(header, record))
+        return
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            yield line_number, line
+
+
+def prepare_row(model_name: str, record, rounds: int) -> dict:
+    """
+    Parse and convert one record into the column values of a new object,
+    raising ValueError if invalid.
+    """
+    spec = IMPORT_SPECS[model_name]
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError:
+            raise ValueError("invalid JSON")
+    if not isinstance(record, dict):
+        raise ValueError("a record must be an object")
+    row = {}
+    for field, convert in spec["fields"].items():
+        value = record.get(field)
+        # An empty string is a missing value, except for free text
+        if value is None or (value == "" and convert is not str):
+            if field in spec["required"]:
+                raise ValueError(f"{field} is required")
+            continue
+        try:
+            row[field] = convert(value)
+        except (TypeError, ValueError) as e:
+            if str(e).startswith("must"):
+                raise ValueError(f"{field} {e}")
+            raise ValueError(f"{field} is invalid")
+    spec["check"](row, rounds)
+    return row
+
+
+def prepare_chunk(model_name: str, rounds: int,
+                  chunk: List[Tuple[int, object]]) -> list:
+    """
+    Prepare the records of a chunk, returning (line number, row or None, error
+    or None, record). Runs in a worker.
+    """
+    prepared = []
+    for line_number, record in chunk:
+        try:
+            row = prepare_row(model_name, record, rounds)
+            prepared.append((line_number, row, None, record))
+        except ValueError as e:
+            prepared.append((line_number, None, str(e), record))
+    return prepared
+
+
+def rejected(line_number: int, error: str, record) -> dict:
+    """Return the entry of the reject file for a record."""
+    return {"line": line_number, "error": error,
+            "record": (record.rstrip("\r\n") if isinstance(record, str)
+                       else record)}
+
+
+def chunked(records: Iterable, size: int) -> Iterator[list]:
+    """Group records into lists of at most size records."""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ImportReport:
+    """Counters of a running import."""
+
+    def __init__(self, model_name: str) -> None:
+        """Start counting."""
+        self.model_name = model_name
+        self.read = 0
+        self.imported = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the import started."""
+        return time.monotonic() - self.started
+
+    def to_dict(self) -> dict:
+        """Return the counters and the rate in records per second."""
+        elapsed = self.elapsed
+        return {
+            "model": self.model_name,
+            "read": self.read,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "elapsed_s": round(elapsed, 2),
+            "rows_per_s": round(self.read / elapsed) if elapsed else None,
+        }
+
+
+class Importer:
+    """Imports the records of one model from a stream."""
+
+    def __init__(self, model_name: str, repository, chunk_size: int = 1000,
+                 workers: int = 0, rounds: int = 12,
+                 reject: Optional[Callable[[dict], None]] = None,
+                 progress: Optional[Callable[[ImportReport], None]] = None
+                 ) -> None:
+        """
+        Prepare an import into a repository. reject receives every rejected
+        record, progress the report after every chunk written.
+        """
+        if model_name not in IMPORT_SPECS:
+            raise ValueError(
+                f"Cannot import {model_name}, expected one of "
+                f"{', '.join(IMPORT_SPECS)}"
+            )
+        self.model_name = model_name
+        self.repository = repository
+        self.chunk_size = max(1, chunk_size)
+        self.workers = max(0, workers)
+        self.rounds = rounds
+        self.reject = reject or (lambda rejected: None)
+        self.progress = progress or (lambda report: None)
+        self.spec = IMPORT_SPECS[model_name]
+        self.model = model_class(model_name)
+        self.known = {}
+
+    def load_known_values(self) -> None:
+        """
+        Load the ids of the referenced models, and the values of the unique
+        fields, once.
+        """
+        distinct_values = self.repository.distinct_values
+        self.known = {
+            field: {
+                str(value)
+                for value in distinct_values(model_class(model), "id")
+            }
+            for field, model in self.spec["references"].items()
+        }
+        for field in ("id", *self.spec["unique"]):
+            self.known[field] = {
+                str(value) for value in distinct_values(self.model, field)
+            }
+
+    def run(self, stream: TextIO, fmt: str = "ndjson") -> ImportReport:
+        """Import every record of a stream and return the final report."""
+        if fmt not in FORMATS:
+            raise ValueError(
+                f"Unknown format {fmt}, expected one of {', '.join(FORMATS)}"
+            )
+        report = ImportReport(self.model_name)
+        self.load_known_values()
+        chunks = chunked(read_records(stream, fmt), self.chunk_size)
+        for prepared in self.prepared_chunks(chunks):
+            self.write(prepared, report)
+            self.progress(report)
+        if self.model_name == "review" and report.imported:
+            # Imported reviews bypass Review.create, which maintains the
+            # aggregates
+            model_class("place").rebuild_ratings()
+        logger.info(
+            f"Imported {report.imported} {self.model_name}(s), "
+            f"rejected {report.rejected}"
+        )
+        return report
+
+    def prepared_chunks(self, chunks: Iterator[list]) -> Iterator[list]:
+        """
+        Prepare the chunks in order, in the worker pool when there is one, a
+        few chunks ahead of the writes.
+        """
+        prepare = partial(prepare_chunk, self.model_name, self.rounds)
+        if not self.workers:
+            yield from map(prepare, chunks)
+            return
+        with ProcessPoolExecutor(self.workers) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(prepare, chunk))
+                if len(pending) >= self.workers * CHUNKS_AHEAD_PER_WORKER:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def write(self, prepared: list, report: ImportReport) -> None:
+        """
+        Check the references of a prepared chunk, insert the valid rows and
+        reject the others.
+        """
+        rows = []
+        lines = []
+        # Values taken by the rows of this chunk, known only once they are
+        # inserted
+        taken = {field: set() for field in ("id", *self.spec["unique"])}
+        for line_number, row, error, record in prepared:
+            report.read += 1
+            error = error or self.check_known_values(row, taken)
+            if error:
+                report.rejected += 1
+                self.reject(rejected(line_number, error, record))
+                continue
+            for field in taken:
+                if field in row:
+                    taken[field].add(str(row[field]))
+            rows.append(row)
+            lines.append((line_number, record))
+        if not rows:
+            return
+        now = datetime.utcnow()
+        for row in rows:
+            row.setdefault("created_at", now)
+            row.setdefault("updated_at", now)
+        inserted = self.repository.insert_many(self.model, rows, self.build)
+        if inserted:
+            report.imported += inserted
+            for field, values in taken.items():
+                self.known[field] |= values
+            return
+        for line_number, record in lines:
+            report.rejected += 1
+            self.reject(rejected(
+                line_number, "the repository failed to write the chunk",
+                record,
+            ))
+
+    def check_known_values(self, row: dict, taken: dict) -> Optional[str]:
+        """
+        Return why a row conflicts with the existing objects or the rows of its
+        chunk, or None.
+        """
+        for field in self.spec["references"]:
+            if str(row[field]) not in self.known[field]:
+                return f"{field} {row[field]} does not exist"
+        for field in ("id", *self.spec["unique"]):
+            value = str(row.get(field))
+            if field in row and (
+                value in self.known[field] or value in taken[field]
+            ):
+                return f"{field} {row[field]} already exists"
+        return None
+
+    def build(self, **row):
+        """
+        Build an object from its column values, for the repositories storing
+        objects.
+        """
+        if self.model_name == "user":
+            # The hash is given: nothing to hash again
+            return self.model(password=None, **row)
+        return self.model(**row)
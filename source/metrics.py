@@ -0,0 +1,51 @@
+"""
+This module exports the process-wide metrics registry.
+
+Components register a collector, a callable returning a dict of current
+values, under a name. Collectors are only called when metrics are read,
+so registering one costs nothing on the hot path.
+"""
+
+import logging
+import threading
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRegistry:
+    """Named collectors whose values are gathered on demand."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self.__collectors: Dict[str, Callable[[], dict]] = {}
+        self.__lock = threading.Lock()
+
+    def register(self, name: str, collector: Callable[[], dict]) -> None:
+        """
+        Register a collector, replacing any collector registered under the same
+        name.
+        """
+        with self.__lock:
+            self.__collectors[name] = collector
+
+    def unregister(self, name: str) -> None:
+        """Remove a collector if it is registered."""
+        with self.__lock:
+            self.__collectors.pop(name, None)
+
+    def collect(self) -> Dict[str, dict]:
+        """Call every collector and return their values by name."""
+        with self.__lock:
+            collectors = dict(self.__collectors)
+        values = {}
+        for name, collector in collectors.items():
+            try:
+                values[name] = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector {name} failed: {e}")
+        return values
+
+
+# Registry shared by the whole application
+metrics = MetricsRegistry()
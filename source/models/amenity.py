@@ -44,6 +44,25 @@ class Amenity(db.Model):
 
         return amenity
 
+    @staticmethod
+    def resolve(references: list) -> "tuple[list[str], list[str]]":
+        """
+        Map amenity ids or names to ids, returning (ids, unknown references)
+        """
+        from src.persistence import repo
+
+        ids, unknown = [], []
+        for reference in references:
+            if Amenity.get(reference):
+                ids.append(reference)
+                continue
+            amenities: list[Amenity] = repo.find_by("amenity", name=reference)
+            if amenities:
+                ids.append(amenities[0].id)
+            else:
+                unknown.append(reference)
+        return ids, unknown
+
     @staticmethod
     def update(amenity_id: str, data: dict) -> "Amenity | None":
         """Update an existing amenity"""
@@ -67,6 +86,9 @@ class PlaceAmenity(db.Model):
 
     __tablename__ = 'place_amenities'
 
+    # Serves the amenity lookups of places_with_all without touching the table
+    __extra_indexes__ = (("amenity_id", "place_id"),)
+
     place_id = db.Column(db.String(36), db.ForeignKey('places.id'), primary_key=True)
     amenity_id = db.Column(db.String(36), db.ForeignKey('amenities.id'), primary_key=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -101,16 +123,20 @@ class PlaceAmenity(db.Model):
         """Get a PlaceAmenity object by place_id and amenity_id"""
         from src.persistence import repo
 
-        place_amenities: list[PlaceAmenity] = repo.get_all("placeamenity")
+        place_amenities: list[PlaceAmenity] = repo.find_by(
+            "placeamenity", place_id=place_id, amenity_id=amenity_id
+        )
 
-        for place_amenity in place_amenities:
-            if (
-                place_amenity.place_id == place_id
-                and place_amenity.amenity_id == amenity_id
-            ):
-                return place_amenity
+        return place_amenities[0] if place_amenities else None
 
-        return None
+    @staticmethod
+    def places_with_all(amenity_ids: list) -> "set[str]":
+        """Get the ids of the places having every given amenity"""
+        from src.persistence import repo
+
+        return repo.owners_with_all(
+            "placeamenity", "place_id", "amenity_id", amenity_ids
+        )
 
     @staticmethod
     def create(data: dict) -> "PlaceAmenity":
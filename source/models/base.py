@@ -1,5 +1,6 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Index
+from sqlalchemy.orm import declared_attr
 from datetime import datetime
 import uuid
 from abc import ABC, abstractmethod
@@ -15,6 +16,30 @@ class Base(TimestampMixin, Base, ABC):
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
 
+    # Additional composite indexes declared by a model, as tuples of column
+    # names
+    __extra_indexes__ = ()
+
+    # Columns left out of, and attributes or methods added to, the generated
+    # serializer, with the columns each added field reads, loaded even when
+    # they are not requested
+    __serializer_exclude__ = ()
+    __serializer_extra__ = ()
+    __serializer_depends__ = {}
+
+    # Back the keyset pagination of Repository.page and the max() of
+    # collection_version
+    @declared_attr
+    def __table_args__(cls):
+        """Indexes shared by every model, plus the ones it declares"""
+        table = cls.__tablename__
+        return (
+            Index(f"ix_{table}_created_at_id", "created_at", "id"),
+            Index(f"ix_{table}_updated_at", "updated_at"),
+            *(Index(f"ix_{table}_{'_'.join(columns)}", *columns)
+              for columns in cls.__extra_indexes__),
+        )
+
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             if hasattr(self.__class__, key):
@@ -31,11 +56,56 @@ class Base(TimestampMixin, Base, ABC):
         from src.persistence import repo
         return repo.get(cls, id)
 
+    @classmethod
+    def get_many(cls, ids):
+        """Fetch many objects by id"""
+        from src.persistence import repo
+        return repo.get_many(cls, ids)
+
     @classmethod
     def get_all(cls):
         from src.persistence import repo
         return repo.get_all(cls)
 
+    @classmethod
+    def select(cls, where=None, order_by=None, limit=None, offset=None,
+               fields=None):
+        """Retrieve the objects matching conditions, sorted and sliced"""
+        from src.persistence import repo
+        return repo.query(cls, where=where, order_by=order_by, limit=limit,
+                          offset=offset, fields=fields)
+
+    @classmethod
+    def page(cls, limit, after=None, where=None, fields=None):
+        """Retrieve the page of objects following a (created_at, id) key"""
+        from src.persistence import repo
+        return repo.page(cls, limit, after=after, where=where, fields=fields)
+
+    @classmethod
+    def iter_all(cls, chunk_size=500, where=None, fields=None):
+        """Iterate over the objects, fetched in chunks"""
+        from src.persistence import repo
+        return repo.iter_all(cls, chunk_size=chunk_size, where=where,
+                             fields=fields)
+
+    @classmethod
+    def get_updated_at(cls, id):
+        """Fetch the last modification time of one object"""
+        from src.persistence import repo
+        return repo.get_updated_at(cls, id)
+
+    @classmethod
+    def collection_version(cls):
+        """Fetch a value that changes whenever the collection changes"""
+        from src.persistence import repo
+        return repo.collection_version(cls)
+
+    @classmethod
+    def nearby(cls, lat, lon, radius_km, limit):
+        """Retrieve the objects closest to a point within a radius"""
+        from src.persistence import repo
+        return repo.nearby(cls, lat, lon, radius_km, limit)
+
     @abstractmethod
     def save(self):
         raise NotImplementedError("Subclasses must implement save method.")
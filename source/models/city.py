@@ -39,33 +39,27 @@ class City(db.Model):
     @staticmethod
     def create(data: dict) -> "City":
         """Create a new city"""
-        country = Country.query.get(data["country_code"])
-        if not country:
+        from src.persistence import repo
+
+        if not repo.find_by("country", code=data["country_code"]):
             raise ValueError("Country not found")
 
         city = City(**data)
-        db.session.add(city)
-        db.session.commit()
+        repo.save(city)
         return city
 
     @staticmethod
     def update(city_id: str, data: dict) -> "City | None":
         """Update an existing city"""
-        city = City.query.get(city_id)
+        from src.persistence import repo
+
+        city = City.get(city_id)
         if not city:
             raise ValueError("City not found")
 
         for key, value in data.items():
             setattr(city, key, value)
 
-        db.session.commit()
+        repo.update(city)
         return city
 
-    @staticmethod
-    def get_all() -> list["City"]:
-        return City.query.all()
-
-    @staticmethod
-    def get(city_id: str) -> "City | None":
-        return City.query.get(city_id)
-
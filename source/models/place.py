@@ -6,8 +6,28 @@ from src.models.user import User
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship
 
+# Whole-star buckets of the rating histogram, a rating is counted in its
+# rounded bucket
+RATING_BUCKETS = range(1, 6)
+
 class Place(db.Model):
     __tablename__ = 'places'
+    # Bounding-box prefilter of Repository.nearby, and the filters and sorts of
+    # /places/search
+    __extra_indexes__ = (
+        ("latitude", "longitude"),
+        ("city_id", "price_per_night"),
+        ("price_per_night",),
+        ("max_guests",),
+        ("number_of_rooms",),
+    )
+    # The aggregates are summarized by review_count and average_rating
+    __serializer_exclude__ = (
+        "rating_sum", "rating_1", "rating_2", "rating_3", "rating_4",
+        "rating_5",
+    )
+    __serializer_extra__ = ("average_rating",)
+    __serializer_depends__ = {"average_rating": ("review_count", "rating_sum")}
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
@@ -24,6 +44,16 @@ class Place(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Review aggregates, maintained by Review.create, Review.update and
+    # Review.delete
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Float, nullable=False, default=0.0)
+    rating_1 = db.Column(db.Integer, nullable=False, default=0)
+    rating_2 = db.Column(db.Integer, nullable=False, default=0)
+    rating_3 = db.Column(db.Integer, nullable=False, default=0)
+    rating_4 = db.Column(db.Integer, nullable=False, default=0)
+    rating_5 = db.Column(db.Integer, nullable=False, default=0)
+
     host = db.relationship("User", back_populates='places')
     city = db.relationship('City', back_populates='places')
     amenities = db.relationship("PlaceAmenity", back_populates='place', lazy='dynamic')
@@ -61,35 +91,118 @@ class Place(db.Model):
             "number_of_rooms": self.number_of_rooms,
             "number_of_bathrooms": self.number_of_bathrooms,
             "max_guests": self.max_guests,
+            "review_count": self.review_count or 0,
+            "average_rating": self.average_rating(),
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
 
     @staticmethod
     def create(data: dict) -> "Place":
-        user = User.query.get(data["host_id"])
+        from src.persistence import repo
+
+        user = User.get(data["host_id"])
         if not user:
             raise ValueError(f"User with ID {data['host_id']} not found")
 
-        city = City.query.get(data["city_id"])
+        city = City.get(data["city_id"])
         if not city:
             raise ValueError(f"City with ID {data['city_id']} not found")
 
         new_place = Place(data=data)
-        db.session.add(new_place)
-        db.session.commit()
+        # Through the repository, which keeps its spatial grid and price
+        # indexes current
+        repo.save(new_place)
 
         return new_place
 
     @staticmethod
     def update(place_id: str, data: dict) -> "Place | None":
-        place = Place.query.get(place_id)
+        from src.persistence import repo
+
+        place = Place.get(place_id)
         if not place:
             return None
 
         for key, value in data.items():
             setattr(place, key, value)
 
-        db.session.commit()
+        repo.update(place)
         return place
 
+    def average_rating(self) -> "float | None":
+        """Average rating of the reviews, None without reviews"""
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 2)
+
+    def rating_summary(self) -> dict:
+        """Review count, rating sum, average and histogram of the place"""
+        return {
+            "place_id": self.id,
+            "review_count": self.review_count or 0,
+            "rating_sum": self.rating_sum or 0.0,
+            "average_rating": self.average_rating(),
+            "histogram": {
+                str(bucket): getattr(self, f"rating_{bucket}") or 0
+                for bucket in RATING_BUCKETS
+            },
+        }
+
+    @staticmethod
+    def rating_bucket(rating: float) -> int:
+        """Whole-star histogram bucket a rating is counted in"""
+        bucket = max(int(rating + 0.5), RATING_BUCKETS[0])
+        return min(bucket, RATING_BUCKETS[-1])
+
+    @staticmethod
+    def apply_review(place_id: str, removed: "float | None" = None,
+                     added: "float | None" = None) -> None:
+        """
+        Moves the aggregates of a place by a review rating removed and/or added
+        """
+        from src.persistence import repo
+
+        deltas = {}
+        for rating, sign in ((removed, -1), (added, 1)):
+            if rating is None:
+                continue
+            bucket = f"rating_{Place.rating_bucket(rating)}"
+            deltas["review_count"] = deltas.get("review_count", 0) + sign
+            deltas["rating_sum"] = deltas.get("rating_sum", 0) + sign * rating
+            deltas[bucket] = deltas.get(bucket, 0) + sign
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if deltas:
+            repo.increment(Place, place_id, deltas)
+
+    @staticmethod
+    def rebuild_ratings() -> int:
+        """
+        Recomputes the review aggregates of every place from the reviews,
+        returns the number of places
+        """
+        from src.persistence import repo
+        from src.models.review import Review
+
+        totals = {}
+        for review in repo.iter_all(Review):
+            total = totals.setdefault(
+                review.place_id, {"count": 0, "sum": 0.0, "buckets": {}}
+            )
+            bucket = Place.rating_bucket(review.rating)
+            total["count"] += 1
+            total["sum"] += review.rating
+            total["buckets"][bucket] = total["buckets"].get(bucket, 0) + 1
+
+        places = repo.get_all(Place)
+        for place in places:
+            total = totals.get(
+                place.id, {"count": 0, "sum": 0.0, "buckets": {}}
+            )
+            place.review_count = total["count"]
+            place.rating_sum = total["sum"]
+            for bucket in RATING_BUCKETS:
+                setattr(place, f"rating_{bucket}",
+                        total["buckets"].get(bucket, 0))
+        repo.update_many(places)
+        return len(places)
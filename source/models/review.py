@@ -45,15 +45,18 @@ class Review(db.Model):
     def create(data: dict) -> "Review":
         from src.persistence import repo
 
-        user = User.query.get(data["user_id"])
+        user = User.get(data["user_id"])
         if not user:
             raise ValueError(f"User with ID {data['user_id']} not found")
 
-        place = Place.query.get(data["place_id"])
+        place = Place.get(data["place_id"])
         if not place:
             raise ValueError(f"Place with ID {data['place_id']} not found")
 
         new_review = Review(**data)
+        # Applied right before the save so both land in the same commit on the
+        # database
+        Place.apply_review(new_review.place_id, added=new_review.rating)
         repo.save(new_review)
         return new_review
 
@@ -61,21 +64,32 @@ class Review(db.Model):
     def update(review_id: str, data: dict) -> "Review | None":
         from src.persistence import repo
 
-        review = Review.query.get(review_id)
+        review = Review.get(review_id)
         if not review:
             raise ValueError("Review not found")
 
+        old_place_id, old_rating = review.place_id, review.rating
         for key, value in data.items():
             setattr(review, key, value)
 
+        if old_place_id == review.place_id:
+            Place.apply_review(
+                review.place_id, removed=old_rating, added=review.rating
+            )
+        else:
+            Place.apply_review(old_place_id, removed=old_rating)
+            Place.apply_review(review.place_id, added=review.rating)
         repo.update(review)
         return review
 
     @staticmethod
-    def get_all() -> list["Review"]:
-        return Review.query.all()
+    def delete(review_id: str) -> bool:
+        """Delete a review and take its rating out of the place aggregates"""
+        from src.persistence import repo
 
-    @staticmethod
-    def get(review_id: str) -> "Review | None":
-        return Review.query.get(review_id)
+        review = Review.get(review_id)
+        if not review:
+            return False
 
+        Place.apply_review(review.place_id, removed=review.rating)
+        return repo.delete(review)
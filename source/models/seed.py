@@ -0,0 +1,25 @@
+"""
+Seed fingerprint related functionality
+"""
+
+from . import db
+
+
+class SeedFingerprint(db.Model):
+    """Fingerprint of a data set the database has been seeded with"""
+
+    __tablename__ = 'seed_fingerprints'
+
+    data_set = db.Column(db.String(64), unique=True, nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+
+    def __init__(self, data_set: str, fingerprint: str, **kw) -> None:
+        """Dummy init"""
+        super().__init__(**kw)
+
+        self.data_set = data_set
+        self.fingerprint = fingerprint
+
+    def __repr__(self) -> str:
+        """Dummy repr"""
+        return f"<SeedFingerprint {self.data_set} ({self.fingerprint})>"
@@ -1,12 +1,11 @@
 # models.py
 from datetime import datetime
 from your_app import db
-from flask_bcrypt import Bcrypt
-
-bcrypt = Bcrypt()
+from src.hashing import hasher
 
 class User(db.Model):
     __tablename__ = 'users'
+    __serializer_exclude__ = ("password_hash",)
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -23,16 +22,19 @@ class User(db.Model):
     def __init__(self, email: str, password: str, is_admin: bool, first_name: str, last_name: str, **kw):
         super().__init__(**kw)
         self.email = email
-        self.set_password(password)
+        # None when the hash is given instead, as by the bulk import
+        if password is not None:
+            self.set_password(password)
         self.is_admin = is_admin
         self.first_name = first_name
         self.last_name = last_name
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        # Hashed by the worker pool, raises HashingSaturated when it is full
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return hasher.check(password, self.password_hash)
 
     def __repr__(self):
         return f"<User {self.id} ({self.email})>"
@@ -52,11 +54,8 @@ class User(db.Model):
     def create(user_data: dict) -> "User":
         from src.persistence import repo
 
-        users = User.get_all()
-
-        for u in users:
-            if u.email == user_data["email"]:
-                raise ValueError("User already exists")
+        if repo.find_by("user", email=user_data["email"]):
+            raise ValueError("User already exists")
 
         new_user = User(**user_data)
         repo.save(new_user)
@@ -66,7 +65,7 @@ class User(db.Model):
     def update(user_id: str, data: dict) -> "User | None":
         from src.persistence import repo
 
-        user = User.query.get(user_id)
+        user = User.get(user_id)
 
         if not user:
             return None
@@ -85,11 +84,3 @@ class User(db.Model):
         repo.update(user)
         return user
 
-    @staticmethod
-    def get_all() -> list["User"]:
-        return User.query.all()
-
-    @staticmethod
-    def get(user_id: str) -> "User | None":
-        return User.query.get(user_id)
-
@@ -0,0 +1,260 @@
+"""
+This module exports the serializer registry and the fast JSON provider.
+
+The registry generates the source of a dump function per model from the
+columns of its table, minus the columns listed in `__serializer_exclude__`,
+plus the attributes or methods listed in `__serializer_extra__`, and
+compiles it once. Dumping an object is then a single dict display reading
+attributes directly, and dumping a list is a single list comprehension,
+instead of a to_dict() call or a marshmallow dump per object.
+
+Sparse fieldsets (?fields=id,name) get their own generated functions, and
+`columns` tells the repository which columns they read, through
+`__serializer_depends__` for the computed fields, so the others need not be
+loaded at all.
+
+When orjson is installed, OrjsonProvider replaces the JSON provider of the
+Flask app, so jsonify and the streamed responses encode with it. orjson
+encodes datetimes natively, to the same text as isoformat(), so the registry
+then leaves them to the encoder instead of calling isoformat() per value.
+"""
+
+import logging
+import threading
+from datetime import date
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used instead
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Sparse fieldsets compiled and kept per registry; further ones are compiled
+# per call
+MAX_FIELDSETS = 256
+
+
+def iso_datetime(value):
+    """
+    Return a date or datetime as ISO 8601, and anything else (None, a string
+    read back from JSON) as is.
+    """
+    return value.isoformat() if isinstance(value, date) else value
+
+
+class Serializer:
+    """The dump functions generated for one model."""
+
+    def __init__(self, model: type, fields: Sequence[Tuple[str, str]]) -> None:
+        """
+        Compile the dump functions of a model from (key, kind) pairs, kind
+        being 'column', 'datetime', 'method' or 'attribute'.
+        """
+        self.model = model
+        self.fields = [key for key, _ in fields]
+        for key, _ in fields:
+            if not key.isidentifier():
+                raise ValueError(
+                    f"Cannot serialize field '{key}' of {model.__name__}"
+                )
+        display = self.display(fields, native_datetimes=False)
+        native_display = self.display(fields, native_datetimes=True)
+        self.source = (
+            f"def dump(obj):\n    return {display}\n\n"
+            f"def dump_many(objs):\n    return [{display} for obj in objs]\n\n"
+            f"def dump_native(obj):\n    return {native_display}\n\n"
+            f"def dump_many_native(objs):\n"
+            f"    return [{native_display} for obj in objs]\n"
+        )
+        namespace = {"_iso": iso_datetime}
+        code = compile(self.source, f"<serializer {model.__name__}>", "exec")
+        exec(code, namespace)
+        self.dump: Callable[[object], dict] = namespace["dump"]
+        self.dump_many: Callable[[Sequence], List[dict]] = (
+            namespace["dump_many"]
+        )
+        # Leave datetimes to an encoder that handles them, like orjson
+        self.dump_native: Callable[[object], dict] = namespace["dump_native"]
+        self.dump_many_native: Callable[[Sequence], List[dict]] = (
+            namespace["dump_many_native"]
+        )
+
+    @staticmethod
+    def display(fields: Sequence[Tuple[str, str]],
+                native_datetimes: bool) -> str:
+        """
+        Return the source of the dict display building the document of `obj`.
+        """
+        expressions = []
+        for key, kind in fields:
+            expression = {
+                "column": f"obj.{key}",
+                "attribute": f"obj.{key}",
+                "datetime": (
+                    f"obj.{key}" if native_datetimes else f"_iso(obj.{key})"
+                ),
+                "method": f"obj.{key}()",
+            }[kind]
+            expressions.append(f"{key!r}: {expression}")
+        return "{" + ", ".join(expressions) + "}"
+
+
+class SerializerRegistry:
+    """Serializers generated on first use and kept per model class."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self.__serializers: Dict[type, Serializer] = {}
+        self.__fieldsets: Dict[Tuple[type, Tuple[str, ...]], Serializer] = {}
+        self.__lock = threading.Lock()
+        # Set by init_json when the app encoder serializes datetimes itself
+        self.native_datetimes = False
+
+    def serializer(self, model: type,
+                   fields: Optional[Sequence[str]] = None) -> Serializer:
+        """
+        Return the serializer of a model class, generating it on first use,
+        restricted to the given fields when there are some.
+        """
+        serializer = self.__serializers.get(model)
+        if serializer is None:
+            with self.__lock:
+                serializer = self.__serializers.get(model)
+                if serializer is None:
+                    serializer = Serializer(model, self.fields(model))
+                    self.__serializers[model] = serializer
+        if fields is None:
+            return serializer
+        key = (model, tuple(fields))
+        sparse = self.__fieldsets.get(key)
+        if sparse is None:
+            wanted = set(fields)
+            sparse = Serializer(model, [
+                field for field in self.fields(model) if field[0] in wanted
+            ])
+            with self.__lock:
+                if len(self.__fieldsets) < MAX_FIELDSETS:
+                    self.__fieldsets[key] = sparse
+        return sparse
+
+    def columns(self, model: type, fields: Sequence[str]) -> List[str]:
+        """
+        Return the table columns read to serialize the given fields of a model.
+        """
+        table_columns = {column.key for column in model.__table__.columns}
+        depends = getattr(model, "__serializer_depends__", {})
+        columns = []
+        for field in fields:
+            for column in depends.get(field, (field,)):
+                if column in table_columns and column not in columns:
+                    columns.append(column)
+        return columns
+
+    @staticmethod
+    def fields(model: type) -> List[Tuple[str, str]]:
+        """
+        Return the (key, kind) pairs serialized for a model, from its table and
+        declarations.
+        """
+        from sqlalchemy import Date, DateTime
+
+        exclude = set(getattr(model, "__serializer_exclude__", ()))
+        fields = [
+            (column.key,
+             "datetime" if isinstance(column.type, (Date, DateTime))
+             else "column")
+            for column in model.__table__.columns
+            if column.key not in exclude
+        ]
+        for name in getattr(model, "__serializer_extra__", ()):
+            if callable(getattr(model, name, None)):
+                fields.append((name, "method"))
+            else:
+                fields.append((name, "attribute"))
+        return fields
+
+    def many(self, model: type, fields: Optional[Sequence[str]] = None
+             ) -> Callable[[Sequence], List[dict]]:
+        """
+        Return the function serializing a list of objects of a model for the
+        app encoder.
+        """
+        serializer = self.serializer(model, fields)
+        if self.native_datetimes:
+            return serializer.dump_many_native
+        return serializer.dump_many
+
+    def dump(self, data, many: bool = False,
+             fields: Optional[Sequence[str]] = None):
+        """
+        Serialize an object, or a list of objects of one model when many is
+        set, for the app encoder, keeping only the given fields when there are
+        some.
+        """
+        if many:
+            objs = data if isinstance(data, (list, tuple)) else list(data)
+            if not objs:
+                return []
+            return self.many(type(objs[0]), fields)(objs)
+        serializer = self.serializer(type(data), fields)
+        if self.native_datetimes:
+            return serializer.dump_native(data)
+        return serializer.dump(data)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider encoding with orjson, falling back to Flask's encoder
+    for other types.
+    """
+
+    def options(self) -> int:
+        """
+        Return the orjson options matching the sort_keys and compact settings
+        of the provider.
+        """
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs) -> str:
+        """
+        Serialize data as a JSON string. Arguments meant for json.dumps use the
+        standard encoder.
+        """
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(
+            obj, default=self.default, option=self.options()
+        ).decode()
+
+    def response(self, *args, **kwargs):
+        """
+        Build a JSON response from the encoded bytes, without a round trip
+        through str.
+        """
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.options())
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app) -> None:
+    """
+    Install OrjsonProvider on an app when orjson is installed and
+    JSON_FAST_ENCODER is on.
+    """
+    if orjson is not None and app.config.get("JSON_FAST_ENCODER", True):
+        app.json = OrjsonProvider(app)
+        serializers.native_datetimes = True
+        logger.info("Encoding JSON responses with orjson")
+
+
+# Registry shared by the whole application
+serializers = SerializerRegistry()
+dump = serializers.dump
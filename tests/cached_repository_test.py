@@ -0,0 +1,102 @@
+import unittest
+from types import SimpleNamespace
+from src.persistence.cached import CachedRepository, LRUCache, MISSING, parse_cache_policies
+from src.persistence.indexes import IndexedStore
+from src.persistence.repository import Repository
+
+
+class Place(SimpleNamespace):
+    """Stand-in model, cached under the 'place' key."""
+
+
+class CountingRepository(Repository):
+    """Repository over an IndexedStore counting the lookups that reach it."""
+
+    def __init__(self):
+        self.store = IndexedStore()
+        self.gets = 0
+
+    def reload(self):
+        pass
+
+    def get_all(self, model_name):
+        return self.store.all(model_name)
+
+    def get(self, model_name, id):
+        self.gets += 1
+        return self.store.get(model_name, id)
+
+    def save(self, obj):
+        self.store.add("place", obj)
+
+    def update(self, obj):
+        self.store.add("place", obj)
+
+    def delete(self, obj):
+        return self.store.discard("place", obj.id)
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expires_entries(self):
+        now = [100.0]
+        cache = LRUCache(10, ttl=5, clock=lambda: now[0])
+        cache.put("a", 1)
+        now[0] += 4
+        self.assertEqual(cache.get("a"), 1)
+        now[0] += 2
+        self.assertIs(cache.get("a"), MISSING)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_fill_after_invalidation_is_dropped(self):
+        cache = LRUCache(10)
+        generation = cache.generation
+        cache.invalidate("a")
+        cache.put("a", "stale", generation)
+        self.assertIs(cache.get("a"), MISSING)
+
+
+class TestCachedRepository(unittest.TestCase):
+    def setUp(self):
+        self.inner = CountingRepository()
+        self.place = Place(id="p1", name="old")
+        self.inner.save(self.place)
+
+    def test_hits_skip_the_wrapped_repository(self):
+        repo = CachedRepository(self.inner)
+        self.assertIs(repo.get("place", "p1"), self.place)
+        self.assertIs(repo.get("place", "p1"), self.place)
+        self.assertEqual(self.inner.gets, 1)
+        self.assertEqual(repo.stats()["place"]["hits"], 1)
+
+    def test_writes_invalidate(self):
+        repo = CachedRepository(self.inner)
+        repo.get("place", "p1")
+        repo.update(Place(id="p1", name="new"))
+        self.assertEqual(repo.get("place", "p1").name, "new")
+        repo.delete(self.place)
+        self.assertIsNone(repo.get("place", "p1"))
+
+    def test_policy_can_disable_a_model(self):
+        repo = CachedRepository(self.inner, policies=parse_cache_policies("place=off"))
+        repo.get("place", "p1")
+        repo.get("place", "p1")
+        self.assertEqual(self.inner.gets, 2)
+
+    def test_parse_cache_policies(self):
+        self.assertEqual(parse_cache_policies(" place=10:60, user=off "), {"place": (10, 60.0), "user": None})
+        with self.assertRaises(ValueError):
+            parse_cache_policies("place=big")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import zlib
+from src.compression import StreamCompressor, compress_body, compress_chunks
+
+
+class Source:
+    """Stand-in streamed body recording whether it was closed."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class TestCompression(unittest.TestCase):
+    def test_buffered_bodies_round_trip(self):
+        body = b'[{"id": "p1", "name": "Loft"}]' * 100
+        self.assertEqual(zlib.decompress(compress_body(body, "gzip", 6), 31), body)
+        self.assertEqual(zlib.decompress(compress_body(body, "deflate", 6)), body)
+
+    def test_streamed_chunks_are_decodable_as_they_arrive(self):
+        source = Source(['[{"id": "p1"}', ',{"id": "p2"}', "]"])
+        decoder = zlib.decompressobj(31)
+        received = []
+        for data in compress_chunks(source, StreamCompressor("gzip", 6)):
+            received.append(decoder.decompress(data))
+        # Every chunk was flushed before the next one was produced
+        self.assertEqual(received[:2], [b'[{"id": "p1"}', b',{"id": "p2"}'])
+        self.assertEqual(b"".join(received) + decoder.flush(), b'[{"id": "p1"},{"id": "p2"}]')
+        self.assertTrue(source.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
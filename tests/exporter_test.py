@@ -0,0 +1,68 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+from sqlalchemy import Column, DateTime, MetaData, String, Table
+from src.exporter import EXPORT_MODELS, export_lines, load_lines
+from src.persistence.indexes import IndexedStore
+from src.persistence.repository import Repository
+
+
+class Item(SimpleNamespace):
+    """Stand-in model mapped on a real table."""
+
+    __table__ = Table("items", MetaData(), Column("id", String, primary_key=True),
+                      Column("name", String), Column("created_at", DateTime))
+
+
+class StoreRepository(Repository):
+    """Repository over an IndexedStore."""
+
+    def __init__(self):
+        self.store = IndexedStore()
+
+    def reload(self):
+        pass
+
+    def get_all(self, model_name):
+        return self.store.all("item")
+
+    def get(self, model_name, id):
+        return self.store.get("item", id)
+
+    def save(self, obj):
+        self.store.add("item", obj)
+
+    def update(self, obj):
+        self.store.add("item", obj)
+
+    def delete(self, obj):
+        return self.store.discard("item", obj.id)
+
+
+@mock.patch.dict(EXPORT_MODELS, {"item": f"{__name__}.Item"}, clear=True)
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.source = StoreRepository()
+        for i in range(5):
+            self.source.save(Item(id=f"i{i}", name=f"Item {i}", created_at=datetime(2024, 1, 1, 12, i)))
+
+    def test_export_loads_into_another_repository(self):
+        lines = "".join(export_lines(self.source, chunk_size=2)).splitlines()
+        self.assertEqual(len(lines), 5)
+        target = StoreRepository()
+        self.assertEqual(load_lines(target, lines, chunk_size=2), {"item": {"loaded": 5, "skipped": 0}})
+        loaded = target.get("item", "i3")
+        self.assertEqual((loaded.name, loaded.created_at), ("Item 3", datetime(2024, 1, 1, 12, 3)))
+        # Loading the same export again finds every object present
+        self.assertEqual(load_lines(target, lines), {"item": {"loaded": 0, "skipped": 5}})
+
+    def test_snapshot_keeps_the_objects_present_when_it_started(self):
+        export = export_lines(self.source, chunk_size=2)
+        first = next(export)
+        self.source.save(Item(id="late", name="Late", created_at=datetime(2024, 1, 2)))
+        self.assertNotIn("late", first + "".join(export))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import time
+import unittest
+from src.persistence.flusher import Flusher, parse_durability
+
+
+class TestFlusher(unittest.TestCase):
+    def setUp(self):
+        self.flushes = []
+
+    def flush(self):
+        self.flushes.append(time.monotonic())
+
+    def test_parse_durability(self):
+        self.assertEqual(parse_durability("always"), ("always", None))
+        self.assertEqual(parse_durability("interval=250"), ("interval", 250))
+        self.assertEqual(parse_durability("batch=10"), ("batch", 10))
+        for setting in ("sometimes", "interval=", "batch=0", "always=1"):
+            with self.assertRaises(ValueError):
+                parse_durability(setting)
+
+    def test_always_flushes_synchronously(self):
+        flusher = Flusher(self.flush, "always")
+        flusher.mark_dirty()
+        flusher.mark_dirty()
+        self.assertEqual(len(self.flushes), 2)
+
+    def test_deferred_block_flushes_once(self):
+        flusher = Flusher(self.flush, "always")
+        with flusher.deferred():
+            with flusher.deferred():
+                flusher.mark_dirty()
+            flusher.mark_dirty()
+            self.assertEqual(self.flushes, [])
+        self.assertEqual(len(self.flushes), 1)
+        with flusher.deferred():
+            pass
+        self.assertEqual(len(self.flushes), 1)
+
+    def test_batch_coalesces_mutations(self):
+        flusher = Flusher(self.flush, "batch=50")
+        for _ in range(20):
+            flusher.mark_dirty()
+        self.assertEqual(self.flushes, [])
+        flusher.close()
+        self.assertEqual(len(self.flushes), 1)
+
+    def test_interval_flushes_in_background(self):
+        flusher = Flusher(self.flush, "interval=20")
+        for _ in range(100):
+            flusher.mark_dirty()
+        time.sleep(0.2)
+        self.assertGreaterEqual(len(self.flushes), 1)
+        self.assertLess(len(self.flushes), 100)
+        flusher.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from utils.geo import bounding_box, haversine_km
+
+
+class TestGeo(unittest.TestCase):
+    def test_haversine(self):
+        # Paris to London is about 344 km
+        self.assertAlmostEqual(haversine_km(48.8566, 2.3522, 51.5074, -0.1278), 343.5, delta=1)
+        self.assertEqual(haversine_km(10, 20, 10, 20), 0)
+
+    def test_bounding_box_contains_the_circle(self):
+        min_lat, max_lat, ranges = bounding_box(45, 10, 100)
+        self.assertEqual(len(ranges), 1)
+        self.assertAlmostEqual(haversine_km(45, 10, max_lat, 10), 100, places=6)
+        low, high = ranges[0]
+        self.assertLess(low, 10)
+        self.assertGreater(high, 10)
+
+    def test_bounding_box_crosses_the_antimeridian(self):
+        _, _, ranges = bounding_box(0, 179.9, 50)
+        self.assertEqual(len(ranges), 2)
+        self.assertEqual(ranges[0][1], 180.0)
+        self.assertEqual(ranges[1][0], -180.0)
+
+    def test_bounding_box_reaching_a_pole(self):
+        min_lat, max_lat, ranges = bounding_box(89.9, 0, 50)
+        self.assertEqual((max_lat, ranges), (90.0, [(-180.0, 180.0)]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import threading
+import unittest
+from unittest import mock
+from src import hashing
+from src.hashing import HashingSaturated, PasswordHasher
+
+
+class TestPasswordHasher(unittest.TestCase):
+    def setUp(self):
+        self.hasher = PasswordHasher(workers=0, max_pending=1, rounds=4)
+
+    def test_hash_then_check(self):
+        password_hash = self.hasher.hash("secret")
+        self.assertTrue(password_hash.startswith("$2b$04$"))
+        self.assertTrue(self.hasher.check("secret", password_hash))
+        self.assertFalse(self.hasher.check("wrong", password_hash))
+        self.assertFalse(self.hasher.check("secret", "not a hash"))
+        self.assertEqual(self.hasher.stats()["completed"], 4)
+
+    def test_rejects_work_when_saturated(self):
+        started, release = threading.Event(), threading.Event()
+
+        def blocking_hash(password, rounds):
+            started.set()
+            release.wait(5)
+            return "hash"
+
+        with mock.patch.object(hashing, "hash_password", blocking_hash):
+            worker = threading.Thread(target=self.hasher.hash, args=("first",))
+            worker.start()
+            started.wait(5)
+            self.assertEqual(self.hasher.stats()["pending"], 1)
+            with self.assertRaises(HashingSaturated):
+                self.hasher.hash("second")
+            release.set()
+            worker.join(5)
+        stats = self.hasher.stats()
+        self.assertEqual((stats["pending"], stats["rejected"], stats["completed"]), (0, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
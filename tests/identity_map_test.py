@@ -0,0 +1,78 @@
+import unittest
+from types import SimpleNamespace
+from flask import Flask
+from src.persistence.identity import IdentityMapRepository, drop_identity_map
+from src.persistence.indexes import IndexedStore
+from src.persistence.repository import Repository
+
+
+class Review(SimpleNamespace):
+    """Stand-in model, mapped under the 'review' key."""
+
+
+class CountingRepository(Repository):
+    """Repository over an IndexedStore counting the reads that reach it."""
+
+    def __init__(self):
+        self.store = IndexedStore()
+        self.reads = 0
+
+    def reload(self):
+        pass
+
+    def get_all(self, model_name):
+        self.reads += 1
+        return self.store.all(model_name)
+
+    def get(self, model_name, id):
+        self.reads += 1
+        return self.store.get(model_name, id)
+
+    def save(self, obj):
+        self.store.add("review", obj)
+
+    def update(self, obj):
+        self.store.add("review", obj)
+
+    def delete(self, obj):
+        return self.store.discard("review", obj.id)
+
+
+class TestIdentityMapRepository(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.teardown_appcontext(drop_identity_map)
+        self.backend = CountingRepository()
+        self.backend.save(Review(id="r1", rating=4))
+        self.repo = IdentityMapRepository(self.backend)
+
+    def test_loads_each_object_once_per_request(self):
+        with self.app.app_context():
+            first = self.repo.get("review", "r1")
+            self.assertIs(self.repo.get("review", "r1"), first)
+            self.assertIsNone(self.repo.get("review", "missing"))
+            self.assertIsNone(self.repo.get("review", "missing"))
+            self.assertEqual(self.backend.reads, 2)
+        with self.app.app_context():
+            self.repo.get("review", "r1")
+            self.assertEqual(self.backend.reads, 3)
+
+    def test_writes_update_the_map(self):
+        with self.app.app_context():
+            self.assertEqual(len(self.repo.get_all("review")), 1)
+            created = Review(id="r2", rating=5)
+            self.repo.save(created)
+            self.assertIs(self.repo.get("review", "r2"), created)
+            self.assertEqual(len(self.repo.get_all("review")), 2)
+            self.repo.delete(created)
+            self.assertIsNone(self.repo.get("review", "r2"))
+            self.assertEqual(self.backend.reads, 2)
+
+    def test_passes_through_outside_an_app_context(self):
+        self.repo.get("review", "r1")
+        self.repo.get("review", "r1")
+        self.assertEqual(self.backend.reads, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import io
+import unittest
+from src.importer import prepare_chunk, prepare_row, read_records
+
+PLACE = {"name": "Loft", "description": "", "address": "1 Main Street", "latitude": "48.85",
+         "longitude": 2.35, "host_id": "u1", "city_id": "c1", "price_per_night": "120",
+         "number_of_rooms": 2, "number_of_bathrooms": 1, "max_guests": 4}
+
+
+class TestImporter(unittest.TestCase):
+    def test_reads_ndjson_lines_and_csv_rows(self):
+        ndjson = io.StringIO('{"a": 1}\n\n{"a": 2}\n')
+        self.assertEqual(list(read_records(ndjson, "ndjson")), [(1, '{"a": 1}\n'), (3, '{"a": 2}\n')])
+        rows = io.StringIO('name,comment\nLoft,"two\nlines"\nCabin,ok\n')
+        self.assertEqual(list(read_records(rows, "csv")), [
+            (3, {"name": "Loft", "comment": "two\nlines"}),
+            (4, {"name": "Cabin", "comment": "ok"}),
+        ])
+
+    def test_converts_the_values_of_a_record(self):
+        row = prepare_row("place", PLACE, rounds=4)
+        self.assertEqual((row["latitude"], row["price_per_night"]), (48.85, 120))
+        self.assertEqual(row["description"], "")
+
+    def test_rejects_invalid_records_with_their_line(self):
+        chunk = [
+            (1, "not json"),
+            (2, {**PLACE, "max_guests": 2.5}),
+            (3, {**PLACE, "latitude": 91}),
+            (4, {**PLACE, "city_id": ""}),
+        ]
+        errors = [(line, error) for line, row, error, _ in prepare_chunk("place", 4, chunk)]
+        self.assertEqual(errors, [
+            (1, "invalid JSON"),
+            (2, "max_guests must be a whole number"),
+            (3, "latitude must be between -90 and 90"),
+            (4, "city_id is required"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
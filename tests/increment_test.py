@@ -0,0 +1,65 @@
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+from parameterized import parameterized
+from src.models.place import Place
+from src.persistence.file import FileRepository
+from src.persistence.memory import MemoryRepository
+from src.persistence.pickled import PickleRepository
+
+THREADS = 8
+INCREMENTS = 50
+
+
+class TestConcurrentIncrements(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        path = Path(self.directory.name)
+        for target, value in [
+            ("src.persistence.file.FILE_STORAGE_FILENAME", str(path / "data.json")),
+            ("src.persistence.file.FILE_STORAGE_MODE", "journal"),
+            ("src.persistence.pickled.PICKLE_STORAGE_FILENAME", str(path / "data.pkl")),
+        ]:
+            patch = mock.patch(target, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+        # Switch threads as often as possible, so a lost update would show
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    @parameterized.expand([
+        ("memory", MemoryRepository),
+        ("file", FileRepository),
+        ("pickle", PickleRepository),
+    ])
+    def test_concurrent_increments_are_not_lost(self, _, repository_class):
+        repo = repository_class()
+        place = Place({"name": "Loft", "city_id": "c1", "host_id": "u1"})
+        place.id = "p1"
+        place.created_at = place.updated_at = datetime.utcnow()
+        place.review_count, place.rating_sum = 0, 0.0
+        repo.save(place)
+
+        def review():
+            for _ in range(INCREMENTS):
+                repo.increment("place", "p1", {"review_count": 1, "rating_sum": 4})
+
+        threads = [threading.Thread(target=review) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stored = repo.get("place", "p1")
+        self.assertEqual(stored.review_count, THREADS * INCREMENTS)
+        self.assertEqual(stored.rating_sum, 4 * THREADS * INCREMENTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import random
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from src.persistence.indexes import IndexedStore, model_key, object_key
+from src.persistence.repository import matches, parse_order_by, parse_where, sort_objects
+
+
+class PlaceAmenity:
+    # Shaped like the link model: a composite (place_id, amenity_id) key and no id
+    __slots__ = ("place_id", "amenity_id", "created_at")
+
+    def __init__(self, place_id, amenity_id):
+        self.place_id, self.amenity_id, self.created_at = place_id, amenity_id, None
+
+
+class TestIndexedStore(unittest.TestCase):
+    def setUp(self):
+        self.store = IndexedStore()
+        self.review = SimpleNamespace(id="r1", place_id="p1", user_id="u1")
+        self.store.add("review", self.review)
+        self.store.add("review", SimpleNamespace(id="r2", place_id="p2", user_id="u1"))
+
+    def test_get_by_id(self):
+        self.assertIs(self.store.get("review", "r1"), self.review)
+        self.assertIsNone(self.store.get("review", "missing"))
+
+    def test_find_uses_secondary_index(self):
+        self.assertEqual([r.id for r in self.store.find("review", place_id="p1")], ["r1"])
+        self.assertEqual(len(self.store.find("review", user_id="u1")), 2)
+
+    def test_reindex_after_in_place_update(self):
+        self.review.place_id = "p2"
+        self.store.add("review", self.review)
+        self.assertEqual(self.store.find("review", place_id="p1"), [])
+        self.assertEqual(len(self.store.find("review", place_id="p2")), 2)
+
+    def test_discard_removes_index_entries(self):
+        self.assertTrue(self.store.discard("review", "r1"))
+        self.assertFalse(self.store.discard("review", "r1"))
+        self.assertEqual(self.store.find("review", place_id="p1"), [])
+
+    def test_composite_index(self):
+        link = PlaceAmenity("p1", "a1")
+        self.store.add("placeamenity", link)
+        self.assertEqual(self.store.find("placeamenity", place_id="p1", amenity_id="a1"), [link])
+        self.assertEqual(self.store.find("placeamenity", place_id="p1", amenity_id="a2"), [])
+
+    def test_link_models_are_keyed_by_their_primary_key(self):
+        first, second = PlaceAmenity("p1", "a1"), PlaceAmenity("p1", "a2")
+        self.store.add("placeamenity", first)
+        self.store.add("placeamenity", second)
+        self.assertEqual(object_key(first), ("p1", "a1"))
+        self.assertIs(self.store.get("placeamenity", ("p1", "a2")), second)
+        self.assertEqual(len(self.store.page("placeamenity", 10)), 2)
+        self.assertTrue(self.store.discard("placeamenity", ("p1", "a1")))
+        self.assertEqual(self.store.all("placeamenity"), [second])
+
+    def test_page_follows_created_at_then_id(self):
+        store = IndexedStore()
+        same = datetime(2024, 1, 2)
+        for obj_id, created_at, place_id in [("b", same, "p1"), ("a", same, "p2"),
+                                             ("c", datetime(2024, 1, 1), "p1"), ("d", "2024-01-03T00:00:00", "p1")]:
+            store.add("review", SimpleNamespace(id=obj_id, created_at=created_at, place_id=place_id, user_id="u1"))
+        first = store.page("review", 2)
+        self.assertEqual([r.id for r in first], ["c", "a"])
+        after = (first[-1].created_at, first[-1].id)
+        self.assertEqual([r.id for r in store.page("review", 2, after)], ["b", "d"])
+        self.assertEqual([r.id for r in store.page("review", 5, (same, "a"), {"place_id": "p1"})], ["b", "d"])
+
+    def test_page_after_update_and_discard(self):
+        store = IndexedStore()
+        for obj_id, day in [("a", 1), ("b", 2), ("c", 3)]:
+            store.add("user", SimpleNamespace(id=obj_id, created_at=datetime(2024, 1, day), email=obj_id))
+        moved = store.get("user", "a")
+        moved.created_at = datetime(2024, 1, 4)
+        store.add("user", moved)
+        store.discard("user", "b")
+        self.assertEqual([u.id for u in store.page("user", 10)], ["c", "a"])
+
+    def test_version_changes_on_every_mutation(self):
+        before = self.store.version("review")
+        self.store.add("review", self.review)
+        after_update = self.store.version("review")
+        self.store.discard("review", "r2")
+        self.assertEqual(len({before, after_update, self.store.version("review")}), 3)
+        self.assertNotEqual(IndexedStore().version("review"), IndexedStore().version("review"))
+
+    def test_nearby_uses_the_grid_across_the_antimeridian(self):
+        store = IndexedStore()
+        for obj_id, lat, lon in [("east", 0, 179.95), ("west", 0, -179.95), ("far", 0, 170), ("near", 0.01, 179.99)]:
+            store.add("place", SimpleNamespace(id=obj_id, latitude=lat, longitude=lon))
+        found = store.nearby("place", 0, 179.99, 20, 10)
+        self.assertEqual([place.id for place, _ in found], ["near", "east", "west"])
+        self.assertEqual([place.id for place, _ in store.nearby("place", 0, 179.99, 20, 1)], ["near"])
+        store.discard("place", "near")
+        store.get("place", "west").longitude = 100
+        store.add("place", store.get("place", "west"))
+        self.assertEqual([place.id for place, _ in store.nearby("place", 0, 179.99, 20, 10)], ["east"])
+
+    def test_select_agrees_with_a_full_scan(self):
+        rng = random.Random(7)
+        store = IndexedStore()
+        places = []
+        for i in range(500):
+            place = SimpleNamespace(id=f"p{i:03}", city_id=rng.choice(["c1", "c2", "c3"]),
+                                    host_id="h", price_per_night=rng.choice([None, *range(50, 300, 10)]),
+                                    max_guests=rng.randint(1, 8), number_of_rooms=rng.randint(1, 4),
+                                    number_of_bathrooms=1)
+            places.append(place)
+            store.add("place", place)
+        queries = [
+            ({"city_id": "c2", "price_per_night__gte": 100, "price_per_night__lte": 200}, "price_per_night", None),
+            ({"max_guests__gte": 6, "number_of_rooms__gte": 3}, "-price_per_night", 10),
+            ({"price_per_night__lt": 120}, "price_per_night", 5),
+            ({"price_per_night__gt": 100, "price_per_night__gte": 100}, None, None),
+            ({"city_id__in": ["c1", "c3"], "max_guests": 4}, "max_guests", None),
+            ({}, "-max_guests", 3),
+        ]
+        for where, order_by, limit in queries:
+            expected = [p for p in places if matches(p, parse_where(where))]
+            sort_objects(expected, parse_order_by(order_by))
+            expected = expected[:limit] if limit is not None else expected
+            found = store.select("place", where, order_by, limit)
+            if order_by:
+                field = order_by.lstrip("-")
+                self.assertEqual([getattr(p, field) for p in found], [getattr(p, field) for p in expected])
+            self.assertEqual(len(found), len(expected))
+            if limit is None:
+                self.assertEqual({p.id for p in found}, {p.id for p in expected})
+
+    def test_bitmaps_follow_link_creation_and_deletion(self):
+        links = [("p1", "wifi"), ("p1", "pool"), ("p2", "wifi"), ("p2", "pool"), ("p2", "parking"), ("p3", "pool")]
+        self.store.load({"placeamenity": [PlaceAmenity(place, amenity) for place, amenity in links]})
+        self.assertEqual(self.store.owners_with_all("placeamenity", ["wifi", "pool"]), {"p1", "p2"})
+        self.assertEqual(self.store.owners_with_all("placeamenity", ["parking", "pool"]), {"p2"})
+        self.assertEqual(self.store.owners_with_all("placeamenity", ["sauna"]), set())
+        # Saving a link again replaces it and keeps the bit set until it is removed
+        self.store.add("placeamenity", PlaceAmenity("p1", "wifi"))
+        self.assertEqual(self.store.owners_with_all("placeamenity", ["wifi", "pool"]), {"p1", "p2"})
+        self.store.discard("placeamenity", ("p1", "wifi"))
+        self.assertEqual(self.store.owners_with_all("placeamenity", ["wifi", "pool"]), {"p2"})
+        # The position released by parking is reused by the next new amenity
+        self.store.discard("placeamenity", ("p2", "parking"))
+        self.store.add("placeamenity", PlaceAmenity("p3", "sauna"))
+        self.assertEqual(self.store.owners_with_all("placeamenity", ["sauna", "pool"]), {"p3"})
+        self.assertEqual(self.store.owners_with_all("placeamenity", ["parking"]), set())
+
+    def test_model_key(self):
+        self.assertEqual(model_key("place"), "place")
+        self.assertEqual(model_key(SimpleNamespace), "simplenamespace")
+
+
+if __name__ == "__main__":
+    unittest.main()
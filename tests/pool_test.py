@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError
+from src.persistence.pool import PoolMonitor
+
+
+class TestPoolMonitor(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.monitor = PoolMonitor()
+        self.engine = create_engine(
+            f"sqlite:///{os.path.join(self.directory.name, 'pool.db')}",
+            poolclass=self.monitor.pool_class, pool_size=1, max_overflow=1, pool_timeout=0.1,
+        )
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def test_connections_are_reused_and_counted(self):
+        for _ in range(3):
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        stats = self.monitor.stats()
+        self.assertEqual((stats["checkouts"], stats["checkins"], stats["connects"]), (3, 3, 1))
+        self.assertEqual((stats["size"], stats["checked_out"], stats["checked_in"]), (1, 0, 1))
+        self.assertEqual(sum(stats["wait_ms"]["buckets"].values()), 3)
+
+    def test_exhausted_pool_reports_overflow_and_timeouts(self):
+        first, second = self.engine.connect(), self.engine.connect()
+        stats = self.monitor.stats()
+        self.assertEqual((stats["checked_out"], stats["overflow"]), (2, 1))
+        with self.assertRaises(TimeoutError):
+            self.engine.connect()
+        self.assertEqual(self.monitor.stats()["timeouts"], 1)
+        first.close()
+        second.close()
+        # The overflow connection is closed on checkin, the pooled one kept
+        stats = self.monitor.stats()
+        self.assertEqual((stats["checked_out"], stats["overflow"], stats["closes"]), (0, 0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
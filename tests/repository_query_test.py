@@ -0,0 +1,102 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from src.persistence.indexes import IndexedStore
+from src.persistence.repository import Repository
+
+
+class StoreRepository(Repository):
+    """Minimal repository over an IndexedStore, exercising the query defaults."""
+
+    def __init__(self):
+        self.store = IndexedStore()
+
+    def reload(self):
+        pass
+
+    def get_all(self, model_name):
+        return self.store.all(model_name)
+
+    def get(self, model_name, id):
+        return self.store.get(model_name, id)
+
+    def find_by(self, model_name, **criteria):
+        return self.store.find(model_name, **criteria)
+
+    def save(self, obj):
+        self.store.add("place", obj)
+
+    def update(self, obj):
+        self.store.add("place", obj)
+
+    def delete(self, obj):
+        return self.store.discard("place", obj.id)
+
+
+class TestRepositoryQuery(unittest.TestCase):
+    def setUp(self):
+        self.repo = StoreRepository()
+        for i, (city, price) in enumerate([("c1", 80), ("c1", 120), ("c2", 60), ("c1", None), ("c2", 200)]):
+            self.repo.save(SimpleNamespace(id=f"p{i}", city_id=city, price_per_night=price))
+
+    def ids(self, places):
+        return [place.id for place in places]
+
+    def test_equality_and_range(self):
+        places = self.repo.query("place", where={"city_id": "c1", "price_per_night__gte": 100})
+        self.assertEqual(self.ids(places), ["p1"])
+
+    def test_in_and_ne(self):
+        places = self.repo.query("place", where={"id__in": ["p0", "p2", "p4"], "city_id__ne": "c2"})
+        self.assertEqual(self.ids(places), ["p0"])
+
+    def test_order_limit_offset(self):
+        places = self.repo.query("place", order_by="-price_per_night", limit=2, offset=1)
+        self.assertEqual(self.ids(places), ["p1", "p0"])
+        places = self.repo.query("place", order_by=["city_id", "price_per_night"])
+        self.assertEqual(self.ids(places), ["p3", "p0", "p1", "p2", "p4"])
+
+    def test_order_by_mixed_timestamps(self):
+        # Timestamps read back from JSON are strings, the ones created since are datetimes
+        for i, place in enumerate(self.repo.get_all("place")):
+            place.updated_at = datetime(2024, 1, 5 - i) if i % 2 else f"2024-01-0{5 - i}T00:00:00"
+        places = self.repo.query("place", order_by="updated_at")
+        self.assertEqual(self.ids(places), ["p4", "p3", "p2", "p1", "p0"])
+
+    def test_unknown_operator(self):
+        with self.assertRaises(ValueError):
+            self.repo.query("place", where={"price_per_night__like": 1})
+
+
+    def test_default_page_is_keyset_ordered(self):
+        for i, place in enumerate(self.repo.get_all("place")):
+            place.created_at = f"2024-01-0{5 - i}T00:00:00"
+        first = self.repo.page("place", 2, where={"city_id": "c1"})
+        self.assertEqual(self.ids(first), ["p3", "p1"])
+        after = (first[-1].created_at, first[-1].id)
+        self.assertEqual(self.ids(self.repo.page("place", 2, after, {"city_id": "c1"})), ["p0"])
+
+    def test_iter_all_walks_every_page(self):
+        for i, place in enumerate(self.repo.get_all("place")):
+            place.created_at = f"2024-01-0{i + 1}T00:00:00"
+        self.assertEqual(self.ids(self.repo.iter_all("place", chunk_size=2)), ["p0", "p1", "p2", "p3", "p4"])
+        self.assertEqual(self.ids(self.repo.iter_all("place", chunk_size=2, where={"city_id": "c2"})), ["p2", "p4"])
+
+    def test_iter_all_queries_once(self):
+        for i, place in enumerate(self.repo.get_all("place")):
+            place.created_at = f"2024-01-0{5 - i}T00:00:00"
+        calls = []
+        query = self.repo.query
+        self.repo.query = lambda *args, **kwargs: calls.append(args) or query(*args, **kwargs)
+        self.assertEqual(self.ids(self.repo.iter_all("place", chunk_size=2)), ["p4", "p3", "p2", "p1", "p0"])
+        self.assertEqual(len(calls), 1)
+
+    def test_increment_treats_missing_values_as_zero(self):
+        self.repo.increment("place", "p0", {"review_count": 1, "price_per_night": -5})
+        self.repo.increment("place", "p0", {"review_count": 1})
+        place = self.repo.get("place", "p0")
+        self.assertEqual((place.review_count, place.price_per_night), (2, 75))
+        self.repo.increment("place", "missing", {"review_count": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from src.serializers import Serializer, SerializerRegistry
+
+FIELDS = [("id", "column"), ("name", "column"), ("created_at", "datetime"), ("score", "method")]
+
+
+class Item(SimpleNamespace):
+    """Stand-in model with a computed field."""
+
+    def score(self):
+        return len(self.name)
+
+
+class Column(SimpleNamespace):
+    """Stand-in table column."""
+
+
+class Rated(SimpleNamespace):
+    """Stand-in model with a field computed from two columns."""
+
+    __table__ = SimpleNamespace(columns=[Column(key="id"), Column(key="total"), Column(key="count")])
+    __serializer_depends__ = {"average": ("total", "count")}
+
+
+class TestSerializer(unittest.TestCase):
+    def setUp(self):
+        self.serializer = Serializer(Item, FIELDS)
+        self.created_at = datetime(2024, 5, 1, 12, 30, 0, 250)
+        self.items = [Item(id="i1", name="wifi", created_at=self.created_at),
+                      Item(id="i2", name="pool", created_at=None)]
+
+    def test_dump_matches_a_hand_written_to_dict(self):
+        self.assertEqual(self.serializer.dump(self.items[0]), {
+            "id": "i1", "name": "wifi", "created_at": self.created_at.isoformat(), "score": 4,
+        })
+        self.assertEqual(self.serializer.dump_many(self.items),
+                         [self.serializer.dump(item) for item in self.items])
+        self.assertIsNone(self.serializer.dump_many(self.items)[1]["created_at"])
+
+    def test_native_variant_leaves_datetimes_to_the_encoder(self):
+        self.assertIs(self.serializer.dump_native(self.items[0])["created_at"], self.created_at)
+        self.assertEqual(len(self.serializer.dump_many_native(self.items)), 2)
+
+    def test_sparse_fieldset_keeps_only_the_requested_fields(self):
+        sparse = Serializer(Item, [field for field in FIELDS if field[0] in ("id", "score")])
+        self.assertEqual(sparse.dump_many(self.items), [{"id": "i1", "score": 4}, {"id": "i2", "score": 4}])
+
+    def test_columns_follow_the_dependencies_of_computed_fields(self):
+        registry = SerializerRegistry()
+        self.assertEqual(registry.columns(Rated, ["id", "average"]), ["id", "total", "count"])
+        self.assertEqual(registry.columns(Rated, ["count", "average"]), ["count", "total"])
+
+    def test_rejects_fields_that_are_not_identifiers(self):
+        with self.assertRaises(ValueError):
+            Serializer(Item, [("id); import os; (", "column")])
+
+
+if __name__ == "__main__":
+    unittest.main()
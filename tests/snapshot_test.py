@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from src.persistence.snapshot import SnapshotError, SnapshotReader, write_snapshot
+
+
+class TestBinarySnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "data.snap")
+        self.rows = [
+            {
+                "id": f"place-{i}",
+                "name": None if i == 3 else f"Place {i}",
+                "price_per_night": i * 10,
+                "latitude": i / 4,
+                "is_listed": i % 2 == 0,
+                "created_at": datetime(2024, 5, 1, 12, 0, i),
+                "histogram": [0, i, 0, 0, 0],
+            }
+            for i in range(50)
+        ]
+        write_snapshot(self.path, {"place": self.rows, "review": []})
+        self.reader = SnapshotReader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+        self.directory.cleanup()
+
+    def test_models_and_counts(self):
+        self.assertEqual(self.reader.models(), ["place", "review"])
+        self.assertEqual(self.reader.count("place"), 50)
+        self.assertEqual(self.reader.count("review"), 0)
+
+    def test_get_by_id_round_trips_every_type(self):
+        self.assertEqual(self.reader.get("place", "place-3"), self.rows[3])
+        self.assertEqual(self.reader.get("place", "place-42"), self.rows[42])
+        self.assertIsNone(self.reader.get("place", "missing"))
+
+    def test_rows_in_write_order(self):
+        self.assertEqual(list(self.reader.rows("place")), self.rows)
+
+    def test_rejects_other_files(self):
+        other = os.path.join(self.directory.name, "data.json")
+        with open(other, "w") as file:
+            file.write("{}")
+        with self.assertRaises(SnapshotError):
+            SnapshotReader(other)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of the serializer registry against the hand-written to_dict()
+methods.
+
+Serializes a list of transient places, 10k by default, and prints the best
+time of several runs for every path a collection response can take:
+
+    python -m utils.benchmark_serializers [--count 10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from src.models.place import Place
+from src.serializers import SerializerRegistry, orjson
+
+
+def make_places(count: int) -> list:
+    """Build transient places with every serialized attribute set."""
+    created_at = datetime(2024, 1, 1, 12, 0, 0)
+    places = []
+    for i in range(count):
+        place = Place(data={
+            "name": f"Place {i}",
+            "description": "A quiet place near the center",
+            "address": f"{i} Main Street",
+            "city_id": f"city-{i % 100}",
+            "host_id": f"user-{i % 1000}",
+            "latitude": 48.85 + i / 100000,
+            "longitude": 2.35 - i / 100000,
+            "price_per_night": 50 + i % 200,
+            "number_of_rooms": 1 + i % 5,
+            "number_of_bathrooms": 1 + i % 3,
+            "max_guests": 2 + i % 6,
+        })
+        place.id = f"place-{i}"
+        place.review_count, place.rating_sum = i % 20, (i % 20) * 4.2
+        place.created_at = created_at + timedelta(seconds=i)
+        place.updated_at = place.created_at + timedelta(microseconds=i)
+        places.append(place)
+    return places
+
+
+def best_of(repeat: int, function) -> float:
+    """Return the fastest of several runs of a function, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main() -> None:
+    """Run the benchmark and print one line per serialization path."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--count", type=int, default=10000,
+                        help="number of places serialized")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per path, the best one is reported")
+    args = parser.parse_args()
+
+    places = make_places(args.count)
+    # A fresh registry, so the first generation is not hidden by a warm cache
+    registry = SerializerRegistry()
+    serializer = registry.serializer(Place)
+    sample = places[:100]
+    assert serializer.dump_many(sample) == [obj.to_dict() for obj in sample]
+
+    # (path, path it is compared with, function)
+    paths = [
+        ("to_dict() per object", None,
+         lambda: [place.to_dict() for place in places]),
+        ("registry, many=True", "to_dict() per object",
+         lambda: serializer.dump_many(places)),
+        ("to_dict() + json.dumps", None,
+         lambda: json.dumps([place.to_dict() for place in places])),
+        ("registry + json.dumps", "to_dict() + json.dumps",
+         lambda: json.dumps(serializer.dump_many(places))),
+    ]
+    if orjson is not None:
+        paths.append(("registry + orjson.dumps", "to_dict() + json.dumps",
+                      lambda: orjson.dumps(serializer.dump_many(places))))
+        # What the app runs with orjson installed: datetimes are left to the
+        # encoder
+        paths.append(("native datetimes + orjson", "to_dict() + json.dumps",
+                      lambda: orjson.dumps(
+                          serializer.dump_many_native(places)
+                      )))
+    else:
+        print("orjson is not installed, its path is skipped")
+
+    timings = {}
+    print(f"{args.count} places, best of {args.repeat} runs")
+    for name, baseline, function in paths:
+        timings[name] = best_of(args.repeat, function)
+        speedup = ""
+        if baseline:
+            ratio = timings[baseline] / timings[name]
+            speedup = f"  x{ratio:.1f} vs {baseline}"
+        print(f"  {name:<28} {timings[name]:9.1f} ms{speedup}")
+
+
+if __name__ == "__main__":
+    main()
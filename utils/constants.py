@@ -1,3 +1,7 @@
+"""
+This module exports the storage settings read from the environment.
+"""
+
 import os
 import logging
 
@@ -13,6 +17,26 @@ class Config:
         REPOSITORY_ENV_VAR (str): Environment variable to determine the repository type.
         FILE_STORAGE_FILENAME (str): Filename for storing data in JSON format, configurable via environment.
         PICKLE_STORAGE_FILENAME (str): Filename for storing data using Pickle, configurable via environment.
+        FILE_STORAGE_MODE (str): 'snapshot' rewrites the JSON file on every
+            change, 'journal' appends to a log.
+        FILE_JOURNAL_COMPACT_THRESHOLD (int): Journal entries after which the
+            journal is folded into the snapshot.
+        FILE_STORAGE_FORMAT (str): 'json' or 'binary' (mmap-backed, lazily
+            materialized) snapshot format.
+        PICKLE_SHARD_BUCKETS (int): Id-hash buckets each model is split into by
+            the pickle repository.
+        STORAGE_DURABILITY (str): When file-backed repositories flush: always,
+            interval=<ms> or batch=<n>.
+        REPOSITORY_CACHE (str): 'on' wraps the repository in a read-through
+            cache of lookups by id.
+        REPOSITORY_CACHE_SIZE (int): Default maximum number of cached objects
+            per model.
+        REPOSITORY_CACHE_TTL (float): Default seconds a cached object is
+            served, 0 for no expiry.
+        REPOSITORY_CACHE_POLICIES (str): Per-model overrides, e.g.
+            'place=2048:600,user=off'.
+        REPOSITORY_IDENTITY_MAP (str): 'on' loads each object at most once per
+            request.
     """
     REPOSITORY_ENV_VAR = "REPOSITORY"
 
@@ -38,10 +62,41 @@ class Config:
     FILE_STORAGE_FILENAME = validate_filename(get_env_variable('FILE_STORAGE_FILENAME', 'data.json'))
     PICKLE_STORAGE_FILENAME = validate_filename(get_env_variable('PICKLE_STORAGE_FILENAME', 'data.pkl'))
 
+    # Log-structured persistence for the JSON file repository
+    FILE_STORAGE_MODE = get_env_variable('FILE_STORAGE_MODE', 'snapshot')
+    FILE_JOURNAL_COMPACT_THRESHOLD = int(
+        get_env_variable('FILE_JOURNAL_COMPACT_THRESHOLD', '1000')
+    )
+    FILE_STORAGE_FORMAT = get_env_variable('FILE_STORAGE_FORMAT', 'json')
+
+    # Sharded persistence for the pickle repository
+    PICKLE_SHARD_BUCKETS = int(get_env_variable('PICKLE_SHARD_BUCKETS', '1'))
+
+    # Flush policy shared by the file and pickle repositories
+    STORAGE_DURABILITY = get_env_variable('STORAGE_DURABILITY', 'always')
+
+    # Read-through cache in front of the selected repository
+    REPOSITORY_CACHE = get_env_variable('REPOSITORY_CACHE', 'off')
+    REPOSITORY_CACHE_SIZE = int(
+        get_env_variable('REPOSITORY_CACHE_SIZE', '1024')
+    )
+    REPOSITORY_CACHE_TTL = float(
+        get_env_variable('REPOSITORY_CACHE_TTL', '300')
+    )
+    # Blank by default: every model uses the size and ttl above
+    REPOSITORY_CACHE_POLICIES = get_env_variable(
+        'REPOSITORY_CACHE_POLICIES', ' '
+    )
+
+    # Request-scoped identity map in front of the repository and its cache
+    REPOSITORY_IDENTITY_MAP = get_env_variable('REPOSITORY_IDENTITY_MAP', 'on')
+
 def main():
     """ Main function to display current configuration. """
     logger.info(f"Using JSON storage file: {Config.FILE_STORAGE_FILENAME}")
     logger.info(f"Using Pickle storage file: {Config.PICKLE_STORAGE_FILENAME}")
+    logger.info(f"Using JSON storage mode: {Config.FILE_STORAGE_MODE}")
+    logger.info(f"Repository cache: {Config.REPOSITORY_CACHE}")
 
 if __name__ == "__main__":
     main()
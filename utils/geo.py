@@ -0,0 +1,44 @@
+"""
+Geographic helpers shared by the spatial indexes and the nearby search.
+"""
+
+import math
+from typing import List, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Return the great-circle distance between two points, in kilometers."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (math.sin(d_phi / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(
+    lat: float, lon: float, radius_km: float
+) -> Tuple[float, float, List[Tuple[float, float]]]:
+    """
+    Return (min_lat, max_lat, lon_ranges) enclosing every point within
+    radius_km. Longitudes are split in two ranges when the box crosses the
+    antimeridian, and cover the whole circle when it reaches a pole.
+    """
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+    # Widest longitude span of the circle, reached at the latitude of its
+    # tangent points
+    d_lon = math.degrees(math.asin(min(
+        1.0,
+        math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)),
+    )))
+    min_lon, max_lon = lon - d_lon, lon + d_lon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
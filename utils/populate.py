@@ -1,3 +1,8 @@
+"""
+This module seeds a repository with the countries of pycountry.
+"""
+
+import hashlib
 import logging
 from src.persistence.repository import Repository
 import pycountry
@@ -23,21 +28,51 @@ def populate_db(repo: Repository, data_set='countries') -> None:
     except Exception as e:
         logger.error("Failed to populate the database: %s", e)
 
+
+def seed_fingerprint(entries: dict) -> str:
+    """
+    Computes a stable fingerprint of the entries of a data set.
+
+    Parameters:
+    entries: dict - Mapping of unique codes to the values seeded for them.
+    """
+    digest = hashlib.sha256()
+    for code in sorted(entries):
+        digest.update(f"{code}\t{entries[code]}\n".encode())
+    return digest.hexdigest()
+
 def populate_countries(repo: Repository):
     """
-    Populates the database with country data using batch insertion to improve performance.
+    Populates the database with country data using batch insertion to improve
+    performance. Existing codes are fetched at once and only the missing
+    countries are inserted. Seeding is skipped when the repository recorded the
+    fingerprint of the same data set. The fingerprint is only recorded once
+    every country is read back from the repository.
 
     Parameters:
     repo: Repository - Repository object capable of database transactions.
     """
-    new_countries = []
-    for c in pycountry.countries:
-        if repo.get_by_code(Country, c.alpha_2) is None:
-            new_countries.append(Country(c.name, c.alpha_2))
+    countries = {c.alpha_2: c.name for c in pycountry.countries}
+    fingerprint = seed_fingerprint(countries)
+    if repo.get_seed_fingerprint('countries') == fingerprint:
+        logger.info("Countries already seeded, skipping.")
+        return
+
+    existing_codes = repo.distinct_values(Country, 'code')
+    new_countries = [
+        Country(name, code) for code, name in countries.items()
+        if code not in existing_codes
+    ]
 
     if new_countries:
-        repo.save_all(new_countries)  # Assuming 'save_all' is a batch operation method in the repository
+        repo.save_all(new_countries)
         logger.info("Added %d new countries to the database.", len(new_countries))
+        missing = set(countries) - repo.distinct_values(Country, 'code')
+        if missing:
+            logger.error("%d countries were not saved, seeding will be "
+                         "retried.", len(missing))
+            return
+    repo.set_seed_fingerprint('countries', fingerprint)
 
 if __name__ == "__main__":
     # Example usage